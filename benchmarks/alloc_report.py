@@ -0,0 +1,172 @@
+"""
+统计游戏每画一帧新建了多少张Surface(包括mask)、多少MB，以及blit/scale一共拷贝了多少MB像素
+用法(在项目根目录)：python -m benchmarks.alloc_report [--frames 300] [--outline screen sprite] [--json out.json]
+"""
+import argparse
+import json
+
+import pygame
+
+import benchmarks.common  # noqa: F401 设置无窗口模式
+from game import Game, WIDTH, HEIGHT, FPS
+from scripts.utils import Outlines
+
+MB = 1024 * 1024
+
+
+class Stats:
+    def __init__(self):
+        self.allocs = 0
+        self.alloc_bytes = 0
+        self.copy_bytes = 0
+
+    def alloc(self, surf):
+        self.allocs += 1
+        self.alloc_bytes += surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+    def copy(self, dest, rect):
+        self.copy_bytes += rect[2] * rect[3] * dest.get_bytesize()
+
+
+stats = Stats()
+
+
+class CountingSurface(pygame.Surface):
+    """
+    自己新建和往自己身上blit的时候都记一笔
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        stats.alloc(self)
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        rect = super().blit(source, dest, area, special_flags)
+        stats.copy(self, rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn=True):
+        rects = super().blits(blit_sequence, doreturn=True)
+        for rect in rects:
+            stats.copy(self, rect)
+        return rects if doreturn else None
+
+
+class CountingMask(pygame.mask.Mask):
+    def to_surface(self, *args, **kwargs):
+        surf = super().to_surface(*args, **kwargs)
+        # 传了surface参数就是画到已有的图上
+        if not args and kwargs.get('surface') is None:
+            stats.alloc(surf)
+        return surf
+
+
+def counting_copy(surf):
+    """
+    把已有的Surface换成会记账的同样的Surface
+    """
+    new = CountingSurface(surf.get_size(), surf.get_flags(), surf)
+    pygame.Surface.blit(new, surf, (0, 0))
+    return new
+
+
+def patch():
+    """
+    换掉会新建Surface的函数，返回恢复用的列表
+    """
+    saved = [(pygame, 'Surface', pygame.Surface),
+             (pygame.transform, 'scale', pygame.transform.scale),
+             (pygame.transform, 'flip', pygame.transform.flip),
+             (pygame.mask, 'from_surface', pygame.mask.from_surface)]
+    scale, flip, from_surface = pygame.transform.scale, pygame.transform.flip, pygame.mask.from_surface
+
+    def counting_scale(surface, size, dest_surface=None):
+        if dest_surface is None:
+            result = scale(surface, size)
+            stats.alloc(result)
+        else:
+            result = scale(surface, size, dest_surface)
+        stats.copy(result, result.get_rect())
+        return result
+
+    def counting_flip(surface, flip_x, flip_y):
+        result = flip(surface, flip_x, flip_y)
+        stats.alloc(result)
+        return result
+
+    def counting_from_surface(surface, threshold=127):
+        mask = CountingMask(surface.get_size())
+        mask.draw(from_surface(surface, threshold), (0, 0))
+        # Mask每个像素1位
+        stats.allocs += 1
+        stats.alloc_bytes += surface.get_width() * surface.get_height() // 8
+        return mask
+
+    pygame.Surface = CountingSurface
+    pygame.transform.scale = counting_scale
+    pygame.transform.flip = counting_flip
+    pygame.mask.from_surface = counting_from_surface
+    return saved
+
+
+def unpatch(saved):
+    for module, name, value in saved:
+        setattr(module, name, value)
+
+
+def report(game, outline_mode, frames):
+    game.load_level(0)
+    game.outlines = None
+    if outline_mode == 'sprite':
+        game.outlines = Outlines(game.displayer_2)
+        game.outlines.preload(game.assets)
+    # 先跑一段让区块和描边缓存好，开场的关卡切换动画也放进来
+    for _ in range(5):
+        game.update()
+        game.render()
+
+    saved = patch()
+    for name in ['displayer', 'displayer_2', 'scaled', 'transition_surf', 'silhouette', 'screen']:
+        if hasattr(game, name):
+            setattr(game, name, counting_copy(getattr(game, name)))
+    if game.outlines:
+        game.outlines.layer = game.displayer_2
+    stats.__init__()
+    try:
+        for _ in range(frames):
+            game.update()
+            game.render()
+    finally:
+        unpatch(saved)
+    result = {
+        'outline': outline_mode,
+        'frames': frames,
+        'allocs_per_frame': stats.allocs / frames,
+        'alloc_mb_per_frame': stats.alloc_bytes / MB / frames,
+        'copy_mb_per_frame': stats.copy_bytes / MB / frames,
+    }
+    print('outline={outline:<7} surfaces/frame {allocs_per_frame:8.1f} | allocated {alloc_mb_per_frame:7.3f} MB/frame | '
+          'copied {copy_mb_per_frame:7.3f} MB/frame'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--outline', nargs='*', default=['screen', 'sprite'], choices=['screen', 'sprite'])
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.outline:
+        game = Game(WIDTH, HEIGHT, FPS, headless=True, seed=0)
+        results.append(report(game, mode, args.frames))
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
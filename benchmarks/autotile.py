@@ -0,0 +1,83 @@
+"""
+自动补全：原来整张地图每个tile拼邻居集合、排序成元组再查AUTOTILE_MAP，现在拼4位掩码查表；
+以及编辑器放下一格以后只补全这一格和四个邻居要多久
+用法(在项目根目录)：python -m benchmarks.autotile [--sizes 10000 100000 1000000] [--json out.json]
+"""
+import argparse
+import json
+import random
+
+from benchmarks.common import AssetHolder, synthetic_map, timeit
+from scripts.tilemap import TileMap, AUTOTILE_MAP, AUTOTILE_TYPES, pack_loc, unpack_loc
+
+EDITS = 1000
+
+
+def legacy_auto_tile(tilemap):
+    # 原来的TileMap.auto_tile
+    type_ids = {tilemap.type_ids[t] for t in AUTOTILE_TYPES if t in tilemap.type_ids}
+    for key, code in tilemap.grid.items():
+        x, y = unpack_loc(key)
+        neighbors = set()
+        for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
+            check_code = tilemap.grid.get(pack_loc(x + shift[0], y + shift[1]))
+            if check_code is not None and check_code >> 8 == code >> 8:
+                neighbors.add(shift)
+        neighbors = tuple(sorted(neighbors))
+        if (code >> 8 in type_ids) and (neighbors in AUTOTILE_MAP):
+            tilemap.grid[key] = (code & ~0xFF) | AUTOTILE_MAP[neighbors]
+    tilemap.invalidate()
+
+
+def blocky_map(tile_count, seed=0):
+    # synthetic_map一行草一行石头，上下不是同一种就补全不了，这里按7列一段换类型
+    map_data = synthetic_map(tile_count, seed)
+    for tile in map_data['tilemap'].values():
+        tile['type'] = 'stone' if tile['pos'][0] // 7 % 2 else 'grass'
+    return map_data
+
+
+def compare(tile_count, holder):
+    map_data = blocky_map(tile_count)
+    legacy = TileMap(holder)
+    legacy.load_data(map_data)
+    tilemap = TileMap(holder)
+    tilemap.load_data(map_data)
+    result = {'tiles': tile_count, 'legacy_full_ms': timeit(lambda: legacy_auto_tile(legacy), repeat=1) * 1000}
+    # 第一遍会改很多tile，第二遍是已经补全好的地图
+    result['full_ms'] = timeit(tilemap.auto_tile, repeat=1) * 1000
+    assert tilemap.grid == legacy.grid
+    result['full_again_ms'] = timeit(tilemap.auto_tile, repeat=1) * 1000
+
+    rng = random.Random(0)
+    side = int(tile_count ** 0.5)
+    edits = [(rng.randint(0, side), rng.randint(0, side)) for _ in range(EDITS)]
+
+    def edit():
+        for pos in edits:
+            tilemap.set_tile(pos, 'stone', 0)
+            tilemap.auto_tile_at(pos)
+
+    result['edit_us'] = timeit(edit, repeat=1) / EDITS * 1e6
+    print('{tiles:>8} tiles | full pass {legacy_full_ms:9.1f} -> {full_ms:8.1f} ms (again {full_again_ms:8.1f} ms) | '
+          'place + autotile {edit_us:7.1f} us'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10000, 100000, 1000000])
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    results = [compare(size, holder) for size in args.sizes]
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+挨个检查所有物体 vs 调度器(ActivityScheduler)按位置分好的格子：物体两两之间的邻近检查，以及范围、点、半径查询
+用法(在项目根目录)：python -m benchmarks.broad_phase [--counts 10 100 1000 10000] [--queries 1000]
+                   [--dash-enemies 10 100 1000 5000] [--json out.json]
+物体的密度保持和关卡里差不多，平均每个物体占64x64像素；格子在游戏里一直留着，物体动了才换格子，
+build是把所有物体放进格子的时间，查询的时间里不包括它。
+另外在游戏里量玩家冲刺时找附近的敌人：挨个比和用调度器的格子，每步要和几个敌人比Rect、花多久
+"""
+import argparse
+import json
+import random
+
+import pygame
+
+from benchmarks.common import timeit
+from benchmarks.lod import floors_map, FLOOR_GAP
+from game import Game, WIDTH, HEIGHT, FPS, DASH_MARGIN
+from scripts.entities import Enemy
+from scripts.scheduler import ActivityScheduler
+
+# 每个物体平均占的面积(像素)
+AREA_PER_BODY = 64 * 64
+# 邻近检查时每个物体的范围每边放大多少
+NEIGHBOUR_MARGIN = 8
+QUERY_RADIUS = 24
+# 冲刺找敌人的测试里玩家在关卡里站多少个位置
+DASH_STEPS = 200
+
+
+class Body:
+    """
+    只有位置和大小的物体，放进调度器的格子里
+    """
+
+    def __init__(self, index, rect):
+        self.index = index
+        self.pos = [rect.x, rect.y]
+        self.size = rect.size
+
+    def rect(self):
+        return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
+
+
+def brute_radius(rects, center, radius):
+    found = []
+    for i, rect in enumerate(rects):
+        dx = center[0] - max(rect.left, min(center[0], rect.right))
+        dy = center[1] - max(rect.top, min(center[1], rect.bottom))
+        if dx * dx + dy * dy <= radius * radius:
+            found.append(i)
+    return found
+
+
+def compare(count, query_count, seed=0):
+    rng = random.Random(seed)
+    side = int((count * AREA_PER_BODY) ** 0.5)
+    rects = [pygame.Rect(rng.random() * side, rng.random() * side, 8, 15) for _ in range(count)]
+    areas = [rect.inflate(NEIGHBOUR_MARGIN * 2, NEIGHBOUR_MARGIN * 2) for rect in rects]
+    points = [(rng.random() * side, rng.random() * side) for _ in range(query_count)]
+    query_rects = [pygame.Rect(x, y, 32, 32) for x, y in points]
+    bodies = [Body(i, rect) for i, rect in enumerate(rects)]
+    grid = ActivityScheduler()
+
+    def build():
+        grid.reset(bodies, 0)
+
+    def indices(found):
+        return [body.index for body in found]
+
+    def brute_pairs():
+        return [area.collidelistall(rects) for area in areas]
+
+    def grid_pairs():
+        return [indices(grid.query_rect(area)) for area in areas]
+
+    def brute_rect():
+        return [rect.collidelistall(rects) for rect in query_rects]
+
+    def grid_rect():
+        return [indices(grid.query_rect(rect)) for rect in query_rects]
+
+    def brute_point():
+        return [[i for i, rect in enumerate(rects) if rect.collidepoint(pos)] for pos in points]
+
+    def grid_point():
+        return [indices(grid.query_point(pos)) for pos in points]
+
+    def brute_circle():
+        return [brute_radius(rects, pos, QUERY_RADIUS) for pos in points]
+
+    def grid_circle():
+        return [indices(grid.query_radius(pos, QUERY_RADIUS)) for pos in points]
+
+    # 两种方法的结果必须一样
+    build()
+    for brute, fast in [(brute_pairs, grid_pairs), (brute_rect, grid_rect), (brute_point, grid_point),
+                        (brute_circle, grid_circle)]:
+        assert brute() == fast(), brute.__name__
+
+    repeat = 3 if count <= 1000 else 1
+    result = {'count': count, 'queries': query_count, 'build_ms': timeit(build, repeat) * 1000}
+    for name, brute, fast in [('pairs', brute_pairs, grid_pairs), ('rect', brute_rect, grid_rect),
+                              ('point', brute_point, grid_point), ('radius', brute_circle, grid_circle)]:
+        result[name + '_brute_ms'] = timeit(brute, repeat) * 1000
+        result[name + '_grid_ms'] = timeit(fast, repeat) * 1000
+    print('{count:>6} bodies | build {build_ms:7.2f} ms | pairs {pairs_brute_ms:9.2f} -> {pairs_grid_ms:8.2f} ms | '
+          'rect {rect_brute_ms:8.2f} -> {rect_grid_ms:6.2f} | point {point_brute_ms:8.2f} -> {point_grid_ms:6.2f} | '
+          'radius {radius_brute_ms:8.2f} -> {radius_grid_ms:6.2f} ms'.format(**result))
+    return result
+
+
+def dash_compare(game, enemy_count, repeat=3):
+    """
+    玩家在一排排敌人中间从左冲到右，每个位置找一次冲刺可能撞到的敌人
+    """
+    map_data, spots = floors_map(enemy_count)
+    game.tilemap.load_data(map_data)
+    game.enemies = [Enemy(game, pos, (8, 15)) for pos in spots]
+    game.scheduler.reset(game.enemies, game.frame)
+    game.player.dashing = 60
+    width = max(x for x, _ in spots) + 32
+    positions = [(width * i // DASH_STEPS, FLOOR_GAP * 16 * 3 - 12) for i in range(DASH_STEPS)]
+    checks = {'brute': 0, 'scheduler': 0}
+
+    def areas():
+        for pos in positions:
+            game.player.pos = list(pos)
+            yield game.player.rect().inflate(DASH_MARGIN * 2, DASH_MARGIN * 2)
+
+    def brute():
+        # 原来的做法：冲刺时每个敌人都和玩家比一次
+        checks['brute'] = 0
+        found = []
+        for area in areas():
+            found.append({enemy for enemy in game.enemies if enemy.rect().colliderect(area)})
+            checks['brute'] += len(game.enemies)
+        return found
+
+    def scheduler():
+        # 游戏现在的做法
+        checks['scheduler'] = 0
+        found = []
+        for _ in areas():
+            game.find_dash_targets()
+            found.append(game.dash_targets)
+            checks['scheduler'] += game.dash_checks
+        return found
+
+    assert brute() == scheduler()
+    result = {'enemies': enemy_count, 'steps': len(positions)}
+    for name, func in [('brute', brute), ('scheduler', scheduler)]:
+        result[name + '_ms'] = timeit(func, repeat) * 1000 / len(positions)
+        result[name + '_checks'] = checks[name] / len(positions)
+    print('dash {enemies:>6} enemies | per step: brute {brute_checks:8.1f} checks {brute_ms:7.3f} ms | '
+          'scheduler cells {scheduler_checks:5.1f} checks {scheduler_ms:7.3f} ms'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counts', type=int, nargs='*', default=[10, 100, 1000, 10000])
+    parser.add_argument('--queries', type=int, default=1000, help='范围、点、半径查询各做多少次')
+    parser.add_argument('--dash-enemies', type=int, nargs='*', default=[10, 100, 1000, 5000],
+                        help='冲刺找敌人的测试里放多少个敌人')
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    results = [compare(count, args.queries) for count in args.counts]
+    game = Game(WIDTH, HEIGHT, FPS, headless=True, seed=0)
+    results += [dash_compare(game, enemy_count) for enemy_count in args.dash_enemies]
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
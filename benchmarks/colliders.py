@@ -0,0 +1,135 @@
+"""
+合并碰撞体：每张地图有多少实心格子、读地图时找出实心格子花多久、按区块合并成多少个碰撞体、全部合并一遍花多久，
+以及周围9格每格新建Rect(原来的physics_rects_around)和直接返回合并好的碰撞体的速度对比，
+编辑器改一格(包括下次用到时重新合并那个区块)花多久。最后在一大块实心的石头中间挖掉一格再放回去
+用法(在项目根目录)：python -m benchmarks.colliders [--sizes 10000 100000] [--block 1000 300] [--json out.json]
+"""
+import argparse
+import json
+import random
+
+import pygame
+
+from benchmarks.common import AssetHolder, synthetic_map, timeit
+from scripts.tilemap import TileMap, NEIGHBOUR_OFFSETS, LOC_MASK, unpack_loc
+
+PROBES = 20000
+EDITS = 1000
+
+
+def tile_rects_around(tilemap, pos):
+    # 原来的physics_rects_around：周围9格每个实心格子新建一个Rect
+    rects = []
+    tile_x = int(pos[0] // tilemap.tile_size)
+    tile_y = int(pos[1] // tilemap.tile_size)
+    for offset in NEIGHBOUR_OFFSETS:
+        x = tile_x + offset[0]
+        y = tile_y + offset[1]
+        code = tilemap.grid.get((x << 32) | (y & LOC_MASK))
+        if code is not None and code >> 8 in tilemap.physics_ids:
+            rects.append(pygame.Rect(x * tilemap.tile_size, y * tilemap.tile_size, tilemap.tile_size,
+                                     tilemap.tile_size))
+    return rects
+
+
+def area_around(tilemap, pos):
+    # 和原来一样的周围9格
+    size = tilemap.tile_size
+    return pygame.Rect((int(pos[0] // size) - 1) * size, (int(pos[1] // size) - 1) * size, size * 3, size * 3)
+
+
+def mesh_all(tilemap):
+    tilemap.collider_chunks = {}
+    for x, y in map(unpack_loc, tilemap.solid):
+        if (x // tilemap.chunk_size, y // tilemap.chunk_size) not in tilemap.collider_chunks:
+            tilemap.chunk_colliders((x // tilemap.chunk_size, y // tilemap.chunk_size))
+
+
+def edit_cost(tilemap, cells):
+    """
+    :return: 每次改一格再把附近的碰撞体查出来(那个区块要重新合并)平均多少微秒
+    """
+    size = tilemap.tile_size
+
+    def edit():
+        for pos in cells:
+            world_pos = (pos[0] * size, pos[1] * size)
+            tilemap.set_tile(pos, 'stone', 1)
+            tilemap.colliders_in(area_around(tilemap, world_pos))
+            tilemap.remove_tile(pos)
+            tilemap.colliders_in(area_around(tilemap, world_pos))
+
+    return timeit(edit, repeat=1) / (len(cells) * 2) * 1e6
+
+
+def compare(name, map_data, holder):
+    tilemap = TileMap(holder)
+    tilemap.load_data(map_data)
+    rng = random.Random(0)
+    xs = [tile['pos'][0] for tile in map_data['tilemap'].values()]
+    ys = [tile['pos'][1] for tile in map_data['tilemap'].values()]
+    size = tilemap.tile_size
+    probes = [(rng.uniform(min(xs), max(xs) + 1) * size, rng.uniform(min(ys), max(ys) + 1) * size)
+              for _ in range(PROBES)]
+    areas = [area_around(tilemap, pos) for pos in probes]
+    edits = [(rng.randint(min(xs), max(xs)), rng.randint(min(ys), max(ys))) for _ in range(EDITS)]
+
+    result = {
+        'map': name,
+        'solid_cells': len(tilemap.solid),
+        'solid_ms': timeit(tilemap.build_solid, repeat=3) * 1000,
+        'mesh_ms': timeit(lambda: mesh_all(tilemap), repeat=3) * 1000,
+        'colliders': sum(len({id(rect) for rect in colliders.values()})
+                         for colliders in tilemap.collider_chunks.values()),
+        'tile_rects_per_s': PROBES / timeit(lambda: [tile_rects_around(tilemap, pos) for pos in probes], repeat=3),
+        'colliders_per_s': PROBES / timeit(lambda: [tilemap.colliders_in(area) for area in areas], repeat=3),
+    }
+    # 编辑会改地图，放在最后
+    result['edit_us'] = edit_cost(tilemap, edits)
+    print('{map:>12} | {solid_cells:>8} solid cells in {solid_ms:7.2f} ms -> {colliders:>7} colliders '
+          'in {mesh_ms:8.2f} ms | rects_around {tile_rects_per_s:>9,.0f} -> {colliders_per_s:>9,.0f}/s | '
+          'edit {edit_us:7.1f} us'.format(**result))
+    return result
+
+
+def block(width, height, holder):
+    """
+    一大块实心的石头，中间挖掉一格再放回去
+    """
+    tilemap = TileMap(holder)
+    tilemap.load_data({'tilemap': {str(x) + ';' + str(y): {'type': 'stone', 'variant': 1, 'pos': [x, y]}
+                                   for x in range(width) for y in range(height)},
+                       'tile_size': 16, 'offgrid': []})
+    mesh_all(tilemap)
+    result = {'map': 'block %dx%d' % (width, height), 'solid_cells': len(tilemap.solid),
+              'edit_us': edit_cost(tilemap, [(width // 2, height // 2)] * 10)}
+    print('{map:>12} | {solid_cells:>8} solid cells | remove and re-add a cell in the middle {edit_us:7.1f} us'
+          .format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10000, 100000])
+    parser.add_argument('--block', type=int, nargs=2, default=[1000, 300], help='实心石头块的宽和高(格)')
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    results = []
+    for map_id in range(3):
+        f = open('assets/maps/' + str(map_id) + '.json', 'r')
+        results.append(compare(str(map_id) + '.json', json.load(f), holder))
+        f.close()
+    for size in args.sizes:
+        results.append(compare('synthetic', synthetic_map(size), holder))
+    results.append(block(args.block[0], args.block[1], holder))
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
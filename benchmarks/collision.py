@@ -0,0 +1,131 @@
+"""
+对比原来的碰撞处理(每个轴查左上角周围3x3个tile的Rect)和TileMap.sweep：每步耗时，以及不同速度下结果不一样的次数
+用法(在项目根目录)：python -m benchmarks.collision [--speeds 1 4 8 16 32] [--bodies 2000] [--json out.json]
+结果不一样基本都是原来的方法穿墙或者漏掉了实体右下角的tile
+"""
+import argparse
+import json
+import math
+import random
+
+import pygame
+
+from benchmarks.colliders import tile_rects_around
+from benchmarks.common import AssetHolder, timeit
+from scripts.tilemap import TileMap
+
+# 地图边长多少个tile，每格有SOLID_RATIO的概率是石头
+MAP_SIDE = 150
+SOLID_RATIO = 0.2
+BODY_SIZES = [(8, 15), (12, 12), (24, 30)]
+
+
+def legacy_move(tilemap, pos, size, movement):
+    """
+    原来PhysicsEntity.update里的碰撞处理
+    :return: (新位置, 撞到的方向)
+    """
+    pos = list(pos)
+    hits = set()
+    pos[0] += movement[0]
+    entity_rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
+    for rect in tile_rects_around(tilemap, pos):
+        if entity_rect.colliderect(rect):
+            if movement[0] > 0:
+                entity_rect.right = rect.left
+                hits.add('right')
+            if movement[0] < 0:
+                entity_rect.left = rect.right
+                hits.add('left')
+            pos[0] = entity_rect.x
+    pos[1] += movement[1]
+    entity_rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
+    for rect in tile_rects_around(tilemap, pos):
+        if entity_rect.colliderect(rect):
+            if movement[1] > 0:
+                entity_rect.bottom = rect.top
+                hits.add('down')
+            if movement[1] < 0:
+                entity_rect.top = rect.bottom
+                hits.add('up')
+            pos[1] = entity_rect.y
+    return pos, hits
+
+
+def sweep_move(tilemap, pos, size, movement):
+    pos = list(pos)
+    hits = set()
+    pos[0], hit = tilemap.sweep(pos, size, 0, movement[0])
+    if hit:
+        hits.add('right' if movement[0] > 0 else 'left')
+    pos[1], hit = tilemap.sweep(pos, size, 1, movement[1])
+    if hit:
+        hits.add('down' if movement[1] > 0 else 'up')
+    return pos, hits
+
+
+def scattered_map(seed=0):
+    rng = random.Random(seed)
+    tilemap = {}
+    for x in range(MAP_SIDE):
+        for y in range(MAP_SIDE):
+            if rng.random() < SOLID_RATIO:
+                tilemap[str(x) + ';' + str(y)] = {'type': 'stone', 'variant': 0, 'pos': [x, y]}
+    return {'tilemap': tilemap, 'tile_size': 16, 'offgrid': []}
+
+
+def free_spot(tilemap, rng, size, side):
+    # 找一个实体不和任何实心tile重叠的位置
+    while True:
+        pos = (rng.random() * side, rng.random() * side)
+        # 原地移动0不会碰撞，随便沿一个轴移动1像素就能看出占的格子里有没有实心tile
+        if not tilemap.sweep(pos, size, 0, 1)[1] and not tilemap.sweep(pos, size, 0, -1)[1]:
+            return pos
+
+
+def compare(tilemap, side, speed, body_count, seed=0):
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(body_count):
+        size = BODY_SIZES[i % len(BODY_SIZES)]
+        angle = rng.random() * math.pi * 2
+        bodies.append((free_spot(tilemap, rng, size, side), size, (math.cos(angle) * speed, math.sin(angle) * speed)))
+
+    def run(move):
+        return [move(tilemap, pos, size, movement) for pos, size, movement in bodies]
+
+    legacy = run(legacy_move)
+    swept = run(sweep_move)
+    result = {
+        'speed': speed,
+        'bodies': body_count,
+        'mismatches': sum(1 for a, b in zip(legacy, swept) if a != b),
+        'legacy_us': timeit(lambda: run(legacy_move), repeat=3) / body_count * 1e6,
+        'sweep_us': timeit(lambda: run(sweep_move), repeat=3) / body_count * 1e6,
+    }
+    print('speed {speed:>5} px/step | {mismatches:>5}/{bodies} different | '
+          'per body step {legacy_us:6.2f} -> {sweep_us:6.2f} us'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--speeds', type=float, nargs='*', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--bodies', type=int, default=2000)
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    tilemap = TileMap(holder)
+    tilemap.load_data(scattered_map())
+    side = MAP_SIDE * tilemap.tile_size
+    results = [compare(tilemap, side, speed, args.bodies) for speed in args.speeds]
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+# 没有显示器也能跑，必须在import pygame之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+from scripts.utils import load_images
+
+
+class AssetHolder:
+    """
+    只有assets的假game，给TileMap之类只需要图片的类用
+    """
+
+    def __init__(self):
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        self.assets = {
+            'decor': load_images("tiles/decor"),
+            'grass': load_images("tiles/grass"),
+            'large_decor': load_images("tiles/large_decor"),
+            'stone': load_images("tiles/stone"),
+            'spawners': load_images("tiles/spawners")
+        }
+
+
+def synthetic_map(tile_count, seed=0):
+    """
+    生成一个差不多是正方形的地图，一半草一半石头，每隔几格留空，装饰物按tile数的1%放
+    :param tile_count: 网格tile的数量
+    :param seed: 随机种子
+    :return: 和json地图一样格式的字典
+    """
+    import random
+    rng = random.Random(seed)
+    side = int(tile_count ** 0.5) + 1
+    tilemap = {}
+    x = y = 0
+    while len(tilemap) < tile_count:
+        tilemap[str(x) + ';' + str(y)] = {'type': 'grass' if y % 2 else 'stone', 'variant': rng.randint(0, 8),
+                                          'pos': [x, y]}
+        x += 1 if rng.random() < 0.9 else 2
+        if x >= side:
+            x = 0
+            y += 1
+    offgrid = [{'type': 'decor', 'variant': rng.randint(0, 3),
+                'pos': [rng.random() * side * 16, rng.random() * (y + 1) * 16]} for _ in range(tile_count // 100)]
+    return {'tilemap': tilemap, 'tile_size': 16, 'offgrid': offgrid}
+
+
+def timeit(func, repeat=5, number=1):
+    """
+    跑repeat轮，每轮调用number次，返回单次调用最快的秒数
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
@@ -0,0 +1,102 @@
+"""
+编辑器画图的时候每帧要多久：按住鼠标一笔画过去(每帧放一格再画一帧)，改过的区块扔掉重新新建Surface(原来的做法)
+和画回原来的Surface对比，以及在大地图上滚动时不提前画画面外的区块和每帧提前画几个的最大卡顿、render当场要画几个区块
+用法(在项目根目录)：python -m benchmarks.editor_render [--size 100000] [--frames 300] [--json out.json]
+"""
+import argparse
+import json
+import time
+
+import pygame
+
+from benchmarks.common import AssetHolder, synthetic_map
+from scripts.tilemap import TileMap, PREFETCH_BUDGET
+
+# 编辑器的画面大小
+VIEW_SIZE = (640, 480)
+
+
+def stroke(tilemap, frames, reuse):
+    """
+    一笔从左往右画过去，每帧放一格
+    :param reuse: False的话改过的区块直接扔掉，和原来一样下次新建一张Surface
+    """
+    surf = pygame.Surface(VIEW_SIZE)
+    tilemap.invalidate(None)
+    tilemap.render(surf)
+    times = []
+    created = 0
+    for i in range(frames):
+        start = time.perf_counter()
+        tilemap.set_tile((i % 40, 10 + i // 40), 'grass' if i % 2 else 'stone', 1)
+        if not reuse:
+            for chunk_loc in tilemap.dirty_chunks:
+                tilemap.chunks.pop(chunk_loc)
+            tilemap.dirty_chunks.clear()
+        before = {loc: id(chunk_surf) for loc, chunk_surf in tilemap.chunks.items()}
+        tilemap.render(surf)
+        times.append(time.perf_counter() - start)
+        created += sum(1 for loc, chunk_surf in tilemap.chunks.items()
+                       if chunk_surf is not None and before.get(loc) != id(chunk_surf))
+    result = {'case': 'stroke', 'reuse': reuse, 'mean_ms': sum(times) / frames * 1000,
+              'max_ms': max(times) * 1000, 'surfaces_per_frame': created / frames}
+    print('stroke  reuse={reuse!s:<5}       | mean {mean_ms:7.3f} ms | max {max_ms:7.3f} ms | '
+          '{surfaces_per_frame:5.2f} new chunk surfaces/frame'.format(**result))
+    return result
+
+
+def scroll(tilemap, frames, budget):
+    """
+    从地图左上往右下斜着滚，每帧滚4像素
+    :param budget: 每帧提前画几个画面外的区块
+    """
+    surf = pygame.Surface(VIEW_SIZE)
+    tilemap.invalidate(None)
+    # 第一帧整个画面都要画，不算
+    tilemap.render(surf)
+    times = []
+    # 每帧render当场画了几个区块
+    baked = []
+    for i in range(1, frames + 1):
+        offset = (i * 4, i * 2)
+        start = time.perf_counter()
+        cached = len(tilemap.chunks)
+        tilemap.render(surf, offset)
+        baked.append(len(tilemap.chunks) - cached)
+        if budget:
+            tilemap.prefetch(offset, VIEW_SIZE, budget)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    result = {'case': 'scroll', 'budget': budget, 'mean_ms': sum(times) / frames * 1000,
+              'p99_ms': times[int(frames * 0.99) - 1] * 1000, 'max_ms': times[-1] * 1000,
+              'max_baked': max(baked)}
+    print('scroll  prefetch budget={budget} | mean {mean_ms:7.3f} ms | max {max_ms:7.3f} ms | '
+          'p99 {p99_ms:7.3f} ms | at most {max_baked} chunks baked during render'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=100000, help='滚动用的地图有多少tile')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    tilemap = TileMap(holder)
+    results = []
+    for reuse in [False, True]:
+        tilemap.load_data(synthetic_map(2000))
+        results.append(stroke(tilemap, args.frames, reuse))
+    tilemap.load_data(synthetic_map(args.size))
+    for budget in [0, PREFETCH_BUDGET]:
+        results.append(scroll(tilemap, args.frames, budget))
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+编辑器存地图会卡多久：直接在主线程里存(原来按O的做法) vs 主线程只复制一份、后台线程存，
+后台存的时候主线程照常每帧画图，看最长一帧多久；以及撤销记录每个格子占多少内存、撤销一大笔要多久
+用法(在项目根目录)：python -m benchmarks.editor_save [--sizes 10000 100000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pygame
+
+from benchmarks.common import AssetHolder, synthetic_map
+from scripts.autosave import BackgroundSaver, save_atomic
+from scripts.journal import EditJournal
+from scripts.tilemap import TileMap
+
+# 编辑器的画面大小
+VIEW_SIZE = (640, 480)
+FPS = 60
+# 撤销测试一笔改多少格
+STROKE_CELLS = 10000
+
+
+def frame(tilemap, surf, i):
+    # 编辑器的一帧：改一格再画出来
+    tilemap.set_tile((i % 40, 5), 'grass' if i % 2 else 'stone', 1)
+    tilemap.render(surf, (i % 64, 0))
+
+
+def compare(name, map_data, holder, out_dir):
+    tilemap = TileMap(holder)
+    tilemap.load_data(map_data)
+    surf = pygame.Surface(VIEW_SIZE)
+    path = os.path.join(out_dir, 'map.json')
+    tiles = len(tilemap.grid)
+
+    start = time.perf_counter()
+    save_atomic(tilemap, path)
+    sync_ms = (time.perf_counter() - start) * 1000
+
+    saver = BackgroundSaver()
+    start = time.perf_counter()
+    saver.save(tilemap, path)
+    snapshot_ms = (time.perf_counter() - start) * 1000
+    clock = pygame.time.Clock()
+    frames = []
+    while saver.busy():
+        frame_start = time.perf_counter()
+        frame(tilemap, surf, len(frames))
+        frames.append(time.perf_counter() - frame_start)
+        # 和编辑器一样每帧等到1/60秒，等的时候后台线程在存
+        clock.tick(FPS)
+    background_ms = (time.perf_counter() - start) * 1000
+    saver.poll()
+
+    journal = EditJournal()
+    tilemap.journal = journal
+    # 一笔涂出一大块石头
+    for i in range(STROKE_CELLS):
+        tilemap.set_tile((i % 100, -10 - i // 100), 'stone', 1)
+    journal.commit()
+    edit = journal.done[-1]
+    bytes_per_cell = (sys.getsizeof(edit.keys) + sys.getsizeof(edit.before) + sys.getsizeof(edit.after)) / len(edit)
+    start = time.perf_counter()
+    journal.undo(tilemap)
+    undo_ms = (time.perf_counter() - start) * 1000
+    tilemap.journal = None
+
+    result = {'map': name, 'tiles': tiles, 'sync_save_ms': sync_ms, 'snapshot_ms': snapshot_ms,
+              'background_save_ms': background_ms, 'frames_during_save': len(frames),
+              'max_frame_ms': max(frames) * 1000 if frames else 0.0, 'journal_bytes_per_cell': bytes_per_cell,
+              'undo_ms': undo_ms}
+    print('{map:>12} {tiles:>7} tiles | O blocks {sync_save_ms:8.1f} ms -> {snapshot_ms:6.1f} ms '
+          '(background {background_save_ms:8.1f} ms, {frames_during_save} frames, max {max_frame_ms:6.1f} ms) | '
+          'journal {journal_bytes_per_cell:4.1f} B/cell, undo {undo_ms:6.1f} ms'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10000, 100000])
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    out_dir = tempfile.mkdtemp()
+    results = []
+    for map_id in range(3):
+        f = open('assets/maps/' + str(map_id) + '.json', 'r')
+        results.append(compare(str(map_id) + '.json', json.load(f), holder, out_dir))
+        f.close()
+    for size in args.sizes:
+        results.append(compare('synthetic', synthetic_map(size), holder, out_dir))
+    os.remove(os.path.join(out_dir, 'map.json'))
+    os.rmdir(out_dir)
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
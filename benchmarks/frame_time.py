@@ -0,0 +1,302 @@
+"""
+每个子系统每帧花多少时间，地图从10^3到10^6个tile，实体从1到10000个
+用法(在项目根目录)：
+python -m benchmarks.frame_time [--quick] [--json out.json] [--csv out.csv]
+python -m benchmarks.frame_time --save-baseline benchmarks/baseline.json   保存基准
+python -m benchmarks.frame_time --baseline benchmarks/baseline.json        和基准比较，变慢超过容差就返回1
+"""
+import argparse
+import csv
+import json
+import math
+import random
+import statistics
+import sys
+import time
+
+import pygame
+
+from benchmarks.common import synthetic_map
+from game import Game, WIDTH, HEIGHT, FPS
+from scripts.entities import PhysicsEntity, Enemy
+from scripts.tilemap import TileMap
+from scripts.utils import Outlines
+
+TILE_COUNTS = [1000, 10000, 100000, 1000000]
+ENTITY_COUNTS = [1, 10, 100, 1000, 10000]
+QUICK_TILE_COUNTS = [1000, 10000]
+QUICK_ENTITY_COUNTS = [1, 10, 100]
+# 实体相关的测试都用这个大小的地图
+ENTITY_MAP_TILES = 10000
+# 每个测试最多跑多久(秒)和最多多少帧
+TIME_BUDGET = 0.5
+MAX_FRAMES = 120
+# 比基准慢不到这么多毫秒的不算变慢，避免很小的数被噪声放大
+NOISE_FLOOR_MS = 0.05
+
+
+def measure(step, setup=None):
+    """
+    反复调用step，setup在每帧之前调用且不计时
+    :return: 每帧毫秒数的中位数
+    """
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < 3 or (len(samples) < MAX_FRAMES and time.perf_counter() - start < TIME_BUDGET):
+        if setup:
+            setup()
+        t = time.perf_counter()
+        step()
+        samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+
+class Bench:
+    def __init__(self, game):
+        self.game = game
+        self.rng = random.Random(0)
+        self.maps = {}
+        self.surf = pygame.Surface((640, 480), pygame.SRCALPHA)
+
+    def tilemap(self, tiles):
+        if tiles not in self.maps:
+            tilemap = TileMap(self.game)
+            tilemap.load_data(synthetic_map(tiles))
+            self.maps[tiles] = tilemap
+        return self.maps[tiles]
+
+    def random_pos(self, tilemap):
+        side = int(len(tilemap.grid) ** 0.5) * tilemap.tile_size
+        return [self.rng.random() * side, self.rng.random() * side]
+
+    def use_map(self, tiles):
+        self.game.tilemap = self.tilemap(tiles)
+        self.game.projectiles.clear()
+        self.game.sparks.clear()
+        self.game.particles.clear()
+        return self.game.tilemap
+
+    def tilemap_render(self, tiles):
+        tilemap = self.use_map(tiles)
+        camera = [0, 0]
+
+        def step():
+            # 镜头每帧移动一点，大部分区块已经画好了
+            camera[0] = (camera[0] + 3) % 2000
+            camera[1] = (camera[1] + 2) % 1500
+            tilemap.render(self.surf, offset=(camera[0], camera[1]))
+
+        return measure(step)
+
+    def tilemap_bake(self, tiles):
+        tilemap = self.use_map(tiles)
+        # 清空缓存，测第一次画满一屏的时间
+        return measure(lambda: tilemap.render(self.surf, offset=(100, 100)), setup=tilemap.invalidate)
+
+    def physics(self, count):
+        tilemap = self.use_map(ENTITY_MAP_TILES)
+        entities = [PhysicsEntity(self.game, 'enemy', self.random_pos(tilemap), (8, 15)) for _ in range(count)]
+
+        def step():
+            for entity in entities:
+                entity.update(tilemap)
+
+        return measure(step)
+
+    def enemy_ai(self, count):
+        tilemap = self.use_map(ENTITY_MAP_TILES)
+        self.game.player.dashing = 0
+        enemies = [Enemy(self.game, self.random_pos(tilemap), (8, 15)) for _ in range(count)]
+
+        def setup():
+            self.game.projectiles.clear()
+            self.game.sparks.clear()
+            self.game.particles.clear()
+
+        def step():
+            for enemy in enemies:
+                enemy.update(tilemap, (0, 0))
+
+        return measure(step, setup)
+
+    def entity_render(self, count):
+        tilemap = self.use_map(ENTITY_MAP_TILES)
+        enemies = [Enemy(self.game, [self.rng.random() * 640, self.rng.random() * 480], (8, 15))
+                   for _ in range(count)]
+
+        def step():
+            for enemy in enemies:
+                enemy.render(self.surf)
+
+        return measure(step)
+
+    def projectiles(self, count):
+        tilemap = self.use_map(ENTITY_MAP_TILES)
+        self.game.player.dashing = 0
+
+        def setup():
+            self.game.projectiles.clear()
+            for _ in range(count):
+                self.game.projectiles.spawn(self.random_pos(tilemap), self.rng.choice([-1.5, 1.5]))
+            self.game.sparks.clear()
+            self.game.particles.clear()
+            self.game.lives = self.game.maxlives
+
+        def step():
+            self.game.update_projectiles()
+            self.game.render_projectiles(self.game.scroll)
+
+        return measure(step, setup)
+
+    def sparks(self, count):
+        self.use_map(ENTITY_MAP_TILES)
+
+        def setup():
+            self.game.sparks.clear()
+            for _ in range(count):
+                self.game.sparks.spawn((self.rng.random() * 640, self.rng.random() * 480),
+                                       self.rng.random() * math.pi * 2, 2 + self.rng.random())
+
+        def step():
+            self.game.update_sparks()
+            self.game.sparks.render(self.surf)
+
+        return measure(step, setup)
+
+    def particles(self, count):
+        self.use_map(ENTITY_MAP_TILES)
+
+        def setup():
+            particles = self.game.particles
+            particles.clear()
+            for _ in range(count):
+                particles.spawn(self.rng.choice(['leaf', 'particle']),
+                                (self.rng.random() * 640, self.rng.random() * 480),
+                                velocity=[self.rng.random() - 0.5, self.rng.random() - 0.5])
+
+        def step():
+            self.game.update_particles()
+            self.game.particles.render(self.surf)
+
+        return measure(step, setup)
+
+    def outline(self):
+        self.game.load_level(0)
+        # 先画一帧，让displayer上面有东西
+        self.game.render()
+        return measure(self.game.render_outline)
+
+    def present(self):
+        return measure(self.game.present)
+
+    def frame(self, outline_mode):
+        """
+        画完整一帧(不含present)，outline_mode和settings.json里的outline一样
+        """
+        self.game.load_level(0)
+        saved = self.game.outlines
+        if outline_mode == 'sprite':
+            self.game.outlines = Outlines(self.game.displayer_2)
+            self.game.outlines.preload(self.game.assets)
+        else:
+            self.game.outlines = None
+        present = self.game.present
+        self.game.present = lambda *args: None
+        # 第一帧要画区块和描边，不算
+        self.game.render()
+        ms = measure(self.game.render)
+        self.game.present = present
+        self.game.outlines = saved
+        return ms
+
+    def frame_screen_outline(self):
+        return self.frame('screen')
+
+    def frame_sprite_outline(self):
+        return self.frame('sprite')
+
+
+def run_cases(bench, tile_counts, entity_counts, cases):
+    results = []
+
+    def record(case, tiles, entities, ms):
+        results.append({'case': case, 'tiles': tiles, 'entities': entities, 'ms': round(ms, 4)})
+        print('%-20s tiles=%-8d entities=%-6d %10.3f ms' % (case, tiles, entities, ms))
+        sys.stdout.flush()
+
+    for case in ['tilemap_render', 'tilemap_bake']:
+        if case in cases:
+            for tiles in tile_counts:
+                record(case, tiles, 0, getattr(bench, case)(tiles))
+    for case in ['physics', 'enemy_ai', 'entity_render', 'projectiles', 'sparks', 'particles']:
+        if case in cases:
+            for count in entity_counts:
+                record(case, ENTITY_MAP_TILES, count, getattr(bench, case)(count))
+    for case in ['outline', 'present', 'frame_screen_outline', 'frame_sprite_outline']:
+        if case in cases:
+            record(case, 0, 0, getattr(bench, case)())
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    和基准比较
+    :return: 变慢的测试列表
+    """
+    old = {(r['case'], r['tiles'], r['entities']): r['ms'] for r in baseline}
+    regressions = []
+    for r in results:
+        key = (r['case'], r['tiles'], r['entities'])
+        if key not in old:
+            continue
+        ratio = r['ms'] / old[key] if old[key] else float('inf')
+        flag = ''
+        if r['ms'] > old[key] * (1 + tolerance) and r['ms'] - old[key] > NOISE_FLOOR_MS:
+            regressions.append(r)
+            flag = '  <-- REGRESSION'
+        print('%-20s tiles=%-8d entities=%-6d %10.3f -> %10.3f ms (x%.2f)%s' % (
+            r['case'], r['tiles'], r['entities'], old[key], r['ms'], ratio, flag))
+    return regressions
+
+
+def main():
+    all_cases = ['tilemap_render', 'tilemap_bake', 'physics', 'enemy_ai', 'entity_render', 'projectiles', 'sparks',
+                 'particles', 'outline', 'present', 'frame_screen_outline', 'frame_sprite_outline']
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quick', action='store_true', help='只跑小规模，适合CI')
+    parser.add_argument('--cases', nargs='*', default=all_cases, choices=all_cases)
+    parser.add_argument('--json', help='结果写成json')
+    parser.add_argument('--csv', help='结果写成csv')
+    parser.add_argument('--baseline', help='和这个基准文件比较')
+    parser.add_argument('--save-baseline', help='把结果保存成基准文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='比基准慢多少比例算变慢')
+    args = parser.parse_args()
+
+    game = Game(WIDTH, HEIGHT, FPS, headless=True, seed=0)
+    bench = Bench(game)
+    if args.quick:
+        results = run_cases(bench, QUICK_TILE_COUNTS, QUICK_ENTITY_COUNTS, args.cases)
+    else:
+        results = run_cases(bench, TILE_COUNTS, ENTITY_COUNTS, args.cases)
+
+    for path in [args.json, args.save_baseline]:
+        if path:
+            f = open(path, 'w')
+            json.dump(results, f, indent=2)
+            f.close()
+    if args.csv:
+        f = open(args.csv, 'w', newline='')
+        writer = csv.DictWriter(f, fieldnames=['case', 'tiles', 'entities', 'ms'])
+        writer.writeheader()
+        writer.writerows(results)
+        f.close()
+    if args.baseline:
+        f = open(args.baseline, 'r')
+        baseline = json.load(f)
+        f.close()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
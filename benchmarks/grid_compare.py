@@ -0,0 +1,123 @@
+"""
+对比原来"x;y"字符串key的字典地图和现在整数key的grid：内存占用和查询速度
+用法(在项目根目录)：python -m benchmarks.grid_compare [--sizes 1000 100000 1000000] [--json out.json]
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+import pygame
+
+from benchmarks.colliders import tile_rects_around
+from benchmarks.common import AssetHolder, synthetic_map, timeit
+from scripts.tilemap import TileMap, PHYSICS_TILES
+
+PROBES = 20000
+
+
+class LegacyTileMap:
+    """
+    原来的存法和查询，只留下要对比的部分
+    """
+
+    def __init__(self, map_data):
+        self.tile_size = map_data['tile_size']
+        self.tilemap = map_data['tilemap']
+
+    def solid_check(self, pos):
+        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
+        if tile_loc in self.tilemap:
+            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
+                return self.tilemap[tile_loc]
+
+    def physics_rects_around(self, pos):
+        rects = []
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        for offset in [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]:
+            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
+            if check_loc in self.tilemap:
+                tile = self.tilemap[check_loc]
+                if tile['type'] in PHYSICS_TILES:
+                    rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size,
+                                             self.tile_size, self.tile_size))
+        return rects
+
+
+def retained_memory(build):
+    """
+    build()返回的对象常驻占用多少字节
+    """
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def compare(name, map_text, holder):
+    legacy, legacy_mem = retained_memory(lambda: LegacyTileMap(json.loads(map_text)))
+
+    def build_grid():
+        tilemap = TileMap(holder)
+        tilemap.load_data(json.loads(map_text))
+        # 只算网格，装饰物两边一样
+        tilemap.offgrid_tiles = []
+        return tilemap
+
+    grid, grid_mem = retained_memory(build_grid)
+
+    # 查询点都落在地图范围里面
+    xs = [int(loc.split(';')[0]) for loc in legacy.tilemap]
+    ys = [int(loc.split(';')[1]) for loc in legacy.tilemap]
+    rng = random.Random(0)
+    points = [(rng.uniform(min(xs), max(xs) + 1) * 16, rng.uniform(min(ys), max(ys) + 1) * 16) for _ in range(PROBES)]
+
+    def probe(func):
+        return lambda: [func(p) for p in points]
+
+    result = {
+        'map': name,
+        'tiles': len(legacy.tilemap),
+        'legacy_bytes': legacy_mem,
+        'grid_bytes': grid_mem,
+        'legacy_solid_check_per_s': PROBES / timeit(probe(legacy.solid_check), repeat=3),
+        'grid_solid_check_per_s': PROBES / timeit(probe(grid.solid_check), repeat=3),
+        'grid_is_solid_per_s': PROBES / timeit(probe(grid.is_solid), repeat=3),
+        'legacy_rects_around_per_s': PROBES / timeit(probe(legacy.physics_rects_around), repeat=3),
+        'grid_rects_around_per_s': PROBES / timeit(probe(lambda pos: tile_rects_around(grid, pos)), repeat=3),
+    }
+    print('{map:>12} {tiles:>8} tiles | memory {legacy_bytes:>12,} -> {grid_bytes:>12,} B | '
+          'solid_check {legacy_solid_check_per_s:>10,.0f} -> {grid_solid_check_per_s:>10,.0f}/s '
+          '(is_solid {grid_is_solid_per_s:>10,.0f}/s) | '
+          'physics_rects_around {legacy_rects_around_per_s:>9,.0f} -> {grid_rects_around_per_s:>9,.0f}/s'
+          .format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1000, 100000, 1000000])
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    results = []
+    for map_id in range(3):
+        f = open('assets/maps/' + str(map_id) + '.json', 'r')
+        results.append(compare(str(map_id) + '.json', f.read(), holder))
+        f.close()
+    for size in args.sizes:
+        results.append(compare('synthetic', json.dumps(synthetic_map(size)), holder))
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
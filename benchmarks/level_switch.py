@@ -0,0 +1,84 @@
+"""
+切关时load_level在主线程里卡多久：不预读 vs 后台预读
+用法(在项目根目录)：python -m benchmarks.level_switch [--tiles 0 10000 100000] [--formats json map] [--json out.json]
+tiles为0表示用assets/maps里的地图，否则用这么多tile的生成地图，存成json或者二进制.map
+json.load整个解析过程都拿着GIL，大的json地图在后台解析时主线程还是会卡一下，.map没有这个问题
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import synthetic_map
+from game import Game, WIDTH, HEIGHT, FPS
+from scripts.mapfile import write_map_data, MAP_EXT
+
+
+def measure(game, levels):
+    """
+    :return: 每次load_level花的毫秒数
+    """
+    costs = []
+    for map_id in levels:
+        # 模拟玩了一会儿，后台已经读完
+        game.level_loader.wait()
+        start = time.perf_counter()
+        game.load_level(map_id)
+        costs.append((time.perf_counter() - start) * 1000)
+    return costs
+
+
+def run(tiles, map_format, map_dir, preload):
+    game = Game(WIDTH, HEIGHT, FPS, headless=True, seed=0, preload=preload)
+    game.level_loader.map_dir = map_dir
+    game.level_loader.clear()
+    game.level_loader.prepare(0)
+    levels = list(range(game.total_levels + 1))
+    # 关卡切换和在最后一关死了重开都算
+    costs = measure(game, levels + levels[-1:] + levels[-1:])
+    game.level_loader.wait()
+    result = {'tiles': tiles, 'format': map_format, 'preload': preload, 'max_ms': max(costs),
+              'mean_ms': sum(costs) / len(costs)}
+    print('tiles={tiles:<8} {format:<4} preload={preload!s:<5} hitch max {max_ms:9.2f} ms, mean {mean_ms:9.2f} ms'
+          .format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tiles', type=int, nargs='*', default=[0, 10000, 100000])
+    parser.add_argument('--formats', nargs='*', default=['json', 'map'], choices=['json', 'map'])
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    results = []
+    for tiles in args.tiles:
+        for map_format in args.formats if tiles else ['json']:
+            map_dir = 'assets/maps/'
+            tmp_dir = None
+            if tiles:
+                tmp_dir = tempfile.mkdtemp()
+                map_dir = tmp_dir + '/'
+                for map_id in range(3):
+                    if map_format == 'map':
+                        write_map_data(map_dir + str(map_id) + MAP_EXT, synthetic_map(tiles, seed=map_id))
+                    else:
+                        f = open(map_dir + str(map_id) + '.json', 'w')
+                        json.dump(synthetic_map(tiles, seed=map_id), f)
+                        f.close()
+            for preload in [False, True]:
+                results.append(run(tiles, map_format, map_dir, preload))
+            if tmp_dir:
+                for name in os.listdir(tmp_dir):
+                    os.remove(os.path.join(tmp_dir, name))
+                os.rmdir(tmp_dir)
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
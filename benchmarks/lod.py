@@ -0,0 +1,88 @@
+"""
+关卡越大敌人越多时每帧(模拟一步+画一帧)花多少时间：所有敌人每步都模拟 vs 按离画面的距离降频、睡觉
+用法(在项目根目录)：python -m benchmarks.lod [--enemies 10 100 1000 5000] [--frames 120] [--json out.json]
+敌人的密度不变，敌人越多关卡越宽，玩家站在关卡左边
+"""
+import argparse
+import json
+import time
+
+# 无窗口运行、切到项目根目录，要在import pygame之前
+import benchmarks.common  # noqa: F401
+from game import Game, WIDTH, HEIGHT, FPS
+from scripts.entities import Enemy
+from scripts.scheduler import ActivityScheduler, DEFAULT_TIERS
+
+# 每隔几行一层地面，一共几层
+FLOOR_GAP = 6
+FLOORS = 6
+# 同一层地面上相邻两个敌人隔多少像素
+ENEMY_SPACING = 48
+
+
+def floors_map(enemy_count):
+    """
+    :return: 能站下enemy_count个敌人的地图和敌人的位置
+    """
+    width = max(60, enemy_count * ENEMY_SPACING // 16 // FLOORS + 2)
+    tilemap = {}
+    for floor in range(FLOORS):
+        y = (floor + 1) * FLOOR_GAP
+        for x in range(width):
+            tilemap[str(x) + ';' + str(y)] = {'type': 'stone', 'variant': 1, 'pos': [x, y]}
+    spots = [((i // FLOORS) * ENEMY_SPACING + 16, ((i % FLOORS) + 1) * FLOOR_GAP * 16 - 15)
+             for i in range(enemy_count)]
+    return {'tilemap': tilemap, 'tile_size': 16, 'offgrid': []}, spots
+
+
+def run(game, enemy_count, frames, lod):
+    map_data, spots = floors_map(enemy_count)
+    game.tilemap.load_data(map_data)
+    game.enemies = [Enemy(game, pos, (8, 15)) for pos in spots]
+    game.scheduler = ActivityScheduler(DEFAULT_TIERS if lod else None)
+    game.scheduler.reset(game.enemies, game.frame)
+    game.player.pos = [32, FLOOR_GAP * 16 - 12]
+    game.player.velocity = [0, 0]
+    game.scroll = [0, 0]
+    game.prev_scroll = [0, 0]
+    game.lives = 999
+    game.projectiles.clear()
+    game.sparks.clear()
+    game.particles.clear()
+    # 让镜头先停下来
+    for _ in range(30):
+        game.update()
+    start = time.perf_counter()
+    awake = 0
+    for _ in range(frames):
+        game.update()
+        game.render()
+        awake += game.scheduler.stepped
+    result = {'enemies': enemy_count, 'lod': lod, 'frame_ms': (time.perf_counter() - start) * 1000 / frames,
+              'awake': awake / frames}
+    print('{enemies:>6} enemies lod={lod!s:<5} | {frame_ms:8.2f} ms/frame | '
+          '{awake:8.1f} enemies simulated per step'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--enemies', type=int, nargs='*', default=[10, 100, 1000, 5000])
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    game = Game(WIDTH, HEIGHT, FPS, headless=True, seed=0)
+    results = []
+    for enemy_count in args.enemies:
+        for lod in [False, True]:
+            results.append(run(game, enemy_count, args.frames, lod))
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
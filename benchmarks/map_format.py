@@ -0,0 +1,62 @@
+"""
+对比json地图和二进制.map地图的文件大小和TileMap.load的时间
+用法(在项目根目录)：python -m benchmarks.map_format [--sizes 1000 100000 1000000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.common import AssetHolder, synthetic_map, timeit
+from scripts.mapfile import write_map_data
+from scripts.tilemap import TileMap
+
+
+def compare(name, map_data, holder, tmp_dir):
+    json_path = os.path.join(tmp_dir, 'map.json')
+    map_path = os.path.join(tmp_dir, 'map.map')
+    f = open(json_path, 'w')
+    json.dump(map_data, f)
+    f.close()
+    write_map_data(map_path, map_data)
+    tilemap = TileMap(holder)
+    result = {
+        'map': name,
+        'tiles': len(map_data['tilemap']),
+        'json_bytes': os.path.getsize(json_path),
+        'map_bytes': os.path.getsize(map_path),
+        'json_load_ms': timeit(lambda: tilemap.load(json_path), repeat=3) * 1000,
+        'map_load_ms': timeit(lambda: tilemap.load(map_path), repeat=3) * 1000,
+    }
+    print('{map:>12} {tiles:>8} tiles | size {json_bytes:>12,} -> {map_bytes:>11,} B | '
+          'load {json_load_ms:9.2f} -> {map_load_ms:8.2f} ms'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1000, 100000, 1000000])
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    results = []
+    tmp_dir = tempfile.mkdtemp()
+    for map_id in range(3):
+        f = open('assets/maps/' + str(map_id) + '.json', 'r')
+        results.append(compare(str(map_id) + '.json', json.load(f), holder, tmp_dir))
+        f.close()
+    for size in args.sizes:
+        results.append(compare('synthetic', synthetic_map(size), holder, tmp_dir))
+    for name in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, name))
+    os.rmdir(tmp_dir)
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+子弹：原来的做法(每颗子弹一个[[x, y], 方向, 计时]列表，遍历副本、撞墙超时打中就list.remove，一颗一颗blit)
+vs Projectiles(几个预先分配好的列表，一次循环移动和判断，死掉的位置被后面的子弹覆盖，一次blits画完)
+用法(在项目根目录)：python -m benchmarks.projectiles [--counts 10 100 1000 10000] [--steps 60] [--json out.json]
+子弹随机放在一个有围墙、每隔几行一层地面的空地上，一部分会撞墙、超时、打中玩家，两种做法每一步剩下的子弹必须一样
+"""
+import argparse
+import json
+import random
+import time
+
+import pygame
+
+from benchmarks.common import AssetHolder
+from scripts.projectile import Projectiles, PROJECTILE_LIFETIME
+from scripts.tilemap import TileMap
+from scripts.utils import load_image
+
+# 空地多宽多高(格)，每隔几行一层地面
+ARENA_SIZE = (200, 60)
+FLOOR_GAP = 6
+
+
+def baseline_step(projectiles, tilemap, target, surf=None, img=None):
+    """
+    原来game.py里的子弹循环，去掉了火花和音效；surf是None就只更新不画
+    """
+    for projectile in projectiles.copy():
+        projectile[0][0] += projectile[1]
+        projectile[2] += 1
+        if surf is not None:
+            surf.blit(img, (projectile[0][0] - img.get_width() / 2, projectile[0][1] - img.get_height() / 2))
+        if tilemap.solid_check(projectile[0]):
+            projectiles.remove(projectile)
+        elif projectile[2] > PROJECTILE_LIFETIME:
+            projectiles.remove(projectile)
+        elif target.collidepoint(projectile[0]):
+            projectiles.remove(projectile)
+
+
+def arena_map():
+    width, height = ARENA_SIZE
+    tilemap = {}
+    for x in range(width):
+        for y in range(0, height, FLOOR_GAP):
+            tilemap[str(x) + ';' + str(y)] = {'type': 'stone', 'variant': 1, 'pos': [x, y]}
+    for y in range(height):
+        for x in [0, width - 1]:
+            tilemap[str(x) + ';' + str(y)] = {'type': 'stone', 'variant': 1, 'pos': [x, y]}
+    return {'tilemap': tilemap, 'tile_size': 16, 'offgrid': []}
+
+
+def spawn_list(rng, tilemap, count):
+    width, height = ARENA_SIZE
+    size = tilemap.tile_size
+    projectiles = []
+    for _ in range(count):
+        # 两层地面之间的空中，计时随机，跑的过程中有一部分会超时
+        floor = rng.randrange(0, height - FLOOR_GAP, FLOOR_GAP)
+        pos = [size + rng.random() * (width - 2) * size, (floor + 1 + rng.random() * (FLOOR_GAP - 1)) * size]
+        projectiles.append([pos, rng.choice([-1.5, 1.5]), rng.randint(0, PROJECTILE_LIFETIME)])
+    return projectiles
+
+
+def run(spawned, tilemap, target, steps, surf=None, img=None):
+    """
+    两种做法各跑steps步，surf是None就只量更新
+    :return: (原来的做法每步毫秒数, Projectiles每步毫秒数, 最后剩几颗)
+    """
+    baseline = [[list(pos), direction, timer] for pos, direction, timer in spawned]
+    pooled = Projectiles()
+    for pos, direction, timer in spawned:
+        pooled.spawn(pos, direction)
+        pooled.timer[pooled.count - 1] = timer
+    baseline_time = pooled_time = 0.0
+    for _ in range(steps):
+        start = time.perf_counter()
+        baseline_step(baseline, tilemap, target, surf, img)
+        baseline_time += time.perf_counter() - start
+        start = time.perf_counter()
+        pooled.update(tilemap, target)
+        if surf is not None:
+            pooled.render(surf, img)
+        pooled_time += time.perf_counter() - start
+        n = pooled.count
+        assert [tuple(p[0]) for p in baseline] == list(zip(pooled.x[:n], pooled.y[:n]))
+    return baseline_time * 1000 / steps, pooled_time * 1000 / steps, pooled.count
+
+
+def compare(tilemap, img, count, steps, seed=0):
+    spawned = spawn_list(random.Random(seed), tilemap, count)
+    target = pygame.Rect(tilemap.tile_size * 10, tilemap.tile_size * 7, 64, 64)
+    surf = pygame.Surface((640, 480))
+    result = {'count': count, 'steps': steps}
+    result['baseline_update_ms'], result['pooled_update_ms'], result['alive_after'] = run(spawned, tilemap, target,
+                                                                                         steps)
+    result['baseline_total_ms'], result['pooled_total_ms'], _ = run(spawned, tilemap, target, steps, surf, img)
+    print('{count:>6} projectiles | update: list of lists {baseline_update_ms:8.3f} ms -> Projectiles '
+          '{pooled_update_ms:8.3f} ms | update+render {baseline_total_ms:8.3f} -> {pooled_total_ms:8.3f} ms | '
+          '{alive_after} left after {steps} steps'.format(**result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counts', type=int, nargs='*', default=[10, 100, 1000, 10000])
+    parser.add_argument('--steps', type=int, default=60)
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    tilemap = TileMap(holder)
+    tilemap.load_data(arena_map())
+    img = load_image('projectile.png')
+    results = [compare(tilemap, img, count, args.steps) for count in args.counts]
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
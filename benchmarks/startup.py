@@ -0,0 +1,80 @@
+"""
+对比一张张读散图片和读打包好的图集，游戏启动要多久、打开了多少个图片文件
+每次启动都在新的进程里跑
+用法(在项目根目录，先python -m scripts.build_atlas)：python -m benchmarks.startup [--runs 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import ROOT
+
+
+def child(mode):
+    """
+    在子进程里启动一次游戏，把结果用json打印出来
+    """
+    start = time.perf_counter()
+    import pygame
+    from game import Game, WIDTH, HEIGHT, FPS
+    # 打开了几个图片文件，解码一共花了多久
+    opened = [0, 0.0]
+    load = pygame.image.load
+
+    def counting_load(*args, **kwargs):
+        t = time.perf_counter()
+        img = load(*args, **kwargs)
+        opened[0] += 1
+        opened[1] += time.perf_counter() - t
+        return img
+
+    pygame.image.load = counting_load
+    import_done = time.perf_counter()
+    Game(WIDTH, HEIGHT, FPS, headless=True, seed=0, atlas=(mode == 'atlas'))
+    end = time.perf_counter()
+    print(json.dumps({'mode': mode, 'import_ms': (import_done - start) * 1000,
+                      'init_ms': (end - import_done) * 1000, 'image_files': opened[0],
+                      'image_load_ms': opened[1] * 1000}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='结果写到这个json文件')
+    parser.add_argument('--child', choices=['loose', 'atlas'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    if not os.path.exists(os.path.join(ROOT, 'assets', 'atlas.png')):
+        print('没有图集，先运行 python -m scripts.build_atlas')
+        sys.exit(1)
+    results = []
+    for mode in ['loose', 'atlas']:
+        runs = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child', mode], cwd=ROOT,
+                                 capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        result = {'mode': mode, 'runs': args.runs,
+                  'init_ms': statistics.median(r['init_ms'] for r in runs),
+                  'image_load_ms': statistics.median(r['image_load_ms'] for r in runs),
+                  'image_files': runs[0]['image_files']}
+        results.append(result)
+        print('{mode:>6}: Game() {init_ms:8.1f} ms (median of {runs}), {image_files} image files opened '
+              'in {image_load_ms:6.1f} ms'
+              .format(**result))
+
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
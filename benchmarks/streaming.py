@@ -0,0 +1,159 @@
+"""
+很大的关卡：整张json读进内存(原来的做法) vs 切成块的流式关卡(.world)只读画面附近的块，
+比较读关卡的时间和内存，以及镜头从关卡一头走到另一头时每步读块、丢块的耗时和内存里最多有多少块
+用法(在项目根目录)：python -m benchmarks.streaming [--width 4000] [--height 120] [--json out.json]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+
+from benchmarks.common import AssetHolder
+from scripts.tilemap import TileMap
+from scripts.world import WorldStream, write_world
+
+# 编辑器和游戏的画面大小
+VIEW_SIZE = (640, 480)
+# 镜头每步走多少像素
+SCROLL_SPEED = 16
+
+
+def big_level(width, height, seed=0):
+    """
+    很宽的关卡：每隔几行一层地面，地面上有随机的台阶、装饰、树和敌人
+    :return: 和json地图一样格式的字典
+    """
+    rng = random.Random(seed)
+    tilemap = {}
+    offgrid = [{'type': 'spawners', 'variant': 0, 'pos': [32.0, 80.0]}]
+    for y in range(6, height, 6):
+        for x in range(width):
+            tilemap[str(x) + ';' + str(y)] = {'type': 'stone' if y % 12 else 'grass', 'variant': 1, 'pos': [x, y]}
+            if rng.random() < 0.2:
+                tilemap[str(x) + ';' + str(y - 1)] = {'type': 'grass', 'variant': rng.randint(0, 8),
+                                                      'pos': [x, y - 1]}
+            roll = rng.random()
+            if roll < 0.05:
+                offgrid.append({'type': 'decor', 'variant': rng.randint(0, 3), 'pos': [x * 16.0, (y - 1) * 16.0]})
+            elif roll < 0.052:
+                offgrid.append({'type': 'large_decor', 'variant': 2, 'pos': [x * 16.0, (y - 3) * 16.0]})
+            elif roll < 0.056:
+                offgrid.append({'type': 'spawners', 'variant': 1, 'pos': [x * 16.0, (y - 1) * 16.0]})
+    return {'tilemap': tilemap, 'tile_size': 16, 'offgrid': offgrid}
+
+
+def traced(func):
+    """
+    :return: (func的返回值, 跑完以后还占着的MB, 峰值MB)
+    """
+    tracemalloc.start()
+    value = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current / 1e6, peak / 1e6
+
+
+def load_json(holder, path):
+    tilemap = TileMap(holder)
+    tilemap.load(path)
+    return tilemap
+
+
+def open_world(holder, path):
+    tilemap = TileMap(holder)
+    stream = WorldStream(tilemap, path)
+    view = pygame.Rect((0, 0), VIEW_SIZE)
+    stream.update(view, view, budget=-1)
+    return stream
+
+
+def traverse(stream, width_px, surf=None):
+    """
+    镜头从左走到右
+    :return: (每步耗时列表, 最多读进来几块, 最多缓存几个区块图片, 一共读了几次块)
+    """
+    times = []
+    max_loaded = max_chunks = loads = 0
+    for x in range(0, width_px - VIEW_SIZE[0], SCROLL_SPEED):
+        view = pygame.Rect((x, 0), VIEW_SIZE)
+        start = time.perf_counter()
+        loaded, _ = stream.update(view, view)
+        if surf is not None:
+            stream.tilemap.render(surf, (x, 0))
+        times.append(time.perf_counter() - start)
+        loads += len(loaded)
+        max_loaded = max(max_loaded, len(stream.loaded))
+        max_chunks = max(max_chunks, len(stream.tilemap.chunks))
+    return times, max_loaded, max_chunks, loads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=4000, help='关卡宽多少格')
+    parser.add_argument('--height', type=int, default=120, help='关卡高多少格')
+    parser.add_argument('--json', help='结果写到这个json文件')
+    args = parser.parse_args()
+
+    holder = AssetHolder()
+    out_dir = tempfile.mkdtemp()
+    json_path = os.path.join(out_dir, 'big.json')
+    world_path = os.path.join(out_dir, 'big.world')
+    map_data = big_level(args.width, args.height)
+    f = open(json_path, 'w')
+    json.dump(map_data, f)
+    f.close()
+    write_world(world_path, map_data)
+    del map_data
+
+    start = time.perf_counter()
+    tilemap = load_json(holder, json_path)
+    json_ms = (time.perf_counter() - start) * 1000
+    tiles = len(tilemap.grid)
+    del tilemap
+    _, json_mb, json_peak_mb = traced(lambda: load_json(holder, json_path))
+
+    start = time.perf_counter()
+    stream = open_world(holder, world_path)
+    world_ms = (time.perf_counter() - start) * 1000
+    surf = pygame.Surface(VIEW_SIZE)
+    times, max_loaded, max_chunks, loads = traverse(stream, args.width * 16, surf)
+    stream.close()
+
+    # 内存单独量一遍，tracemalloc会让所有分配变慢
+    def walk():
+        world = open_world(holder, world_path)
+        traverse(world, args.width * 16)
+        return world
+
+    stream, world_mb, world_peak_mb = traced(walk)
+    stream.close()
+
+    result = {'tiles': tiles, 'json_bytes': os.path.getsize(json_path), 'world_bytes': os.path.getsize(world_path),
+              'json_load_ms': json_ms, 'json_mb': json_mb, 'json_peak_mb': json_peak_mb,
+              'world_open_ms': world_ms, 'world_mb': world_mb, 'world_peak_mb': world_peak_mb,
+              'step_mean_ms': sum(times) / len(times) * 1000, 'step_max_ms': max(times) * 1000,
+              'max_loaded_chunks': max_loaded, 'max_cached_chunk_images': max_chunks, 'chunk_loads': loads}
+    print('{tiles} tiles, json {json_bytes:,} bytes, world {world_bytes:,} bytes'.format(**result))
+    print('json : load {json_load_ms:9.1f} ms | {json_mb:7.1f} MB held, {json_peak_mb:7.1f} MB peak'.format(**result))
+    print('world: open {world_open_ms:9.1f} ms | {world_mb:7.1f} MB held, {world_peak_mb:7.1f} MB peak '
+          'after crossing the level'.format(**result))
+    print('crossing: update+render {step_mean_ms:6.2f} ms mean, {step_max_ms:6.2f} ms max | '
+          '{chunk_loads} chunk loads, at most {max_loaded_chunks} chunks and '
+          '{max_cached_chunk_images} chunk images in memory'.format(**result))
+
+    os.remove(json_path)
+    os.remove(world_path)
+    os.rmdir(out_dir)
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(result, f, indent=2)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
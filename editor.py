@@ -1,9 +1,12 @@
+import os
 import sys
 from tkinter import messagebox
 
 import pygame
-from scripts.utils import load_images
+from scripts.utils import load_images, use_atlas
 from scripts.tilemap import TileMap
+from scripts.journal import EditJournal
+from scripts.autosave import BackgroundSaver
 
 RENDER_SCALE = 2.0
 
@@ -12,6 +15,12 @@ WIDTH = 1280
 HEIGHT = 960
 FPS = 60
 
+MAP_PATH = 'map.json'
+# 自动保存存到另一个文件，不覆盖手动存的map.json
+AUTOSAVE_PATH = 'map.autosave.json'
+# 有没存的改动时每隔多久自动保存一次(毫秒)
+AUTOSAVE_INTERVAL = 30000
+
 
 class Editor:
     def __init__(self, width, height, fps):
@@ -23,6 +32,8 @@ class Editor:
         pygame.display.set_caption("编辑器")
         # 设置窗口
         self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        # 有打包好的图集就从图集读图片
+        use_atlas()
         # Surface功能创建一个空的图片
         self.displayer = pygame.Surface((640, 480))
         self.clock = pygame.time.Clock()
@@ -38,12 +49,28 @@ class Editor:
 
         self.tilemap = TileMap(self, tile_size=16)
 
-        try:
-            self.tilemap.load('map.json')
-            messagebox.showinfo(title="提示", message="成功读取map.json")
-        except FileNotFoundError:
-            messagebox.showinfo(title="提示", message="未找到map.json，已重新创建(map.json应该放在与执行文件同目录下)")
-            pass
+        if self.newer_autosave() and messagebox.askyesno(title="提示", message="发现比map.json新的自动保存，是否读取"):
+            self.tilemap.load(AUTOSAVE_PATH)
+        else:
+            try:
+                self.tilemap.load(MAP_PATH)
+                messagebox.showinfo(title="提示", message="成功读取map.json")
+            except FileNotFoundError:
+                messagebox.showinfo(title="提示", message="未找到map.json，已重新创建(map.json应该放在与执行文件同目录下)")
+                pass
+
+        # 撤销/重做记录，Ctrl+Z撤销，Ctrl+Y重做
+        self.journal = EditJournal()
+        self.tilemap.journal = self.journal
+        # 按O和自动保存都在后台线程里存
+        self.saver = BackgroundSaver()
+        # 上次自动保存的时候journal的version，一样就说明没有新的改动
+        self.autosaved_version = self.journal.version
+        # 按O的时候journal的version，存成功了这个version之前的改动都在map.json里了
+        self.saving_version = None
+        self.last_autosave = pygame.time.get_ticks()
+        # 窗口标题后面显示的保存状态
+        self.save_status = ""
 
         self.scroll = [0, 0]
 
@@ -57,6 +84,85 @@ class Editor:
         self.right_clicking = False
         self.shift = False
         self.ongrid = True
+        # 边画边自动补全，L键开关
+        self.live_autotile = False
+        # 上一帧鼠标按着的格子，鼠标没换格子就什么都不用改
+        self.last_cell = None
+        # 鼠标下面半透明的预览图，(组, 第几张) -> 图片，不每帧复制
+        self.previews = {}
+
+    @staticmethod
+    def newer_autosave():
+        if not os.path.exists(AUTOSAVE_PATH):
+            return False
+        return not os.path.exists(MAP_PATH) or os.path.getmtime(AUTOSAVE_PATH) > os.path.getmtime(MAP_PATH)
+
+    def update_caption(self):
+        caption = "编辑器"
+        if self.live_autotile:
+            caption += " - 自动补全"
+        if self.save_status:
+            caption += " - " + self.save_status
+        pygame.display.set_caption(caption)
+
+    def autosave(self):
+        now = pygame.time.get_ticks()
+        if now - self.last_autosave < AUTOSAVE_INTERVAL:
+            return
+        self.last_autosave = now
+        if self.journal.version != self.autosaved_version:
+            self.autosaved_version = self.journal.version
+            self.saver.save(self.tilemap, AUTOSAVE_PATH)
+
+    def check_saves(self):
+        # 后台存完的结果，手动保存的显示在标题上，出错了才弹窗
+        for path, error in self.saver.poll():
+            if error is not None:
+                if path == MAP_PATH:
+                    # 没存进map.json，下次自动保存要把这些改动存下来
+                    self.autosaved_version = None
+                self.save_status = "保存失败"
+                messagebox.showerror(title="提示", message="保存" + path + "失败：" + str(error))
+            elif path == MAP_PATH:
+                # 自动保存比map.json旧了，删掉免得下次启动问要不要读。
+                # 按O以后又有改动、又自动保存了的话那份是新的，留着
+                if self.autosaved_version is None or self.autosaved_version <= self.saving_version:
+                    self.autosaved_version = self.saving_version
+                    if os.path.exists(AUTOSAVE_PATH):
+                        os.remove(AUTOSAVE_PATH)
+                self.save_status = "保存成功"
+            else:
+                continue
+            self.update_caption()
+
+    def quit(self):
+        # 没自动保存过的改动退出前存一下，等后台存完再退出
+        self.journal.commit()
+        if self.journal.version != self.autosaved_version:
+            self.saver.save(self.tilemap, AUTOSAVE_PATH)
+        self.saver.wait()
+        pygame.quit()
+        sys.exit()
+
+    def preview(self):
+        key = (self.tile_group, self.tile_variant)
+        if key not in self.previews:
+            img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
+            img.set_alpha(100)
+            self.previews[key] = img
+        return self.previews[key]
+
+    def paint(self, tile_pos):
+        tile_type = self.tile_list[self.tile_group]
+        if self.live_autotile:
+            # 按住鼠标时每帧都会调用，同一种tile已经在这里就不再放，不然放下的variant和补全的variant会来回改
+            tile = self.tilemap.get_tile(tile_pos)
+            if tile is not None and tile['type'] == tile_type:
+                return
+            if self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant):
+                self.tilemap.auto_tile_at(tile_pos)
+            return
+        self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant)
 
     def run(self):
         while True:
@@ -68,9 +174,10 @@ class Editor:
             render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
 
             self.tilemap.render(self.displayer, offset=render_scroll)
+            # 画面外一圈的区块趁这一帧先画几个，滚动的时候不会一下子画一整列
+            self.tilemap.prefetch(render_scroll, self.displayer.get_size())
 
-            current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
-            current_tile_img.set_alpha(100)
+            current_tile_img = self.preview()
 
             mpos = pygame.mouse.get_pos()
             # 因为实际上都是放大了两倍，所以实际的坐标要转换一下
@@ -83,34 +190,40 @@ class Editor:
             else:
                 self.displayer.blit(current_tile_img, mpos)
 
-            if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {
-                    'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
+            if (self.clicking and self.ongrid) or self.right_clicking:
+                if tile_pos != self.last_cell:
+                    if self.right_clicking:
+                        if self.tilemap.remove_tile(tile_pos) and self.live_autotile:
+                            self.tilemap.auto_tile_at(tile_pos)
+                    else:
+                        self.paint(tile_pos)
+                    self.last_cell = tile_pos
+            else:
+                self.last_cell = None
+                # 松开鼠标这一笔就算一次操作
+                self.journal.commit()
 
             if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                # 特殊删除off_grid_tile
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_img = self.assets[tile['type']][tile['variant']]
-                    tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1],
-                                         tile_img.get_width(), tile_img.get_height())
-                    if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                # 特殊删除off_grid_tile，只查鼠标所在的索引格子
+                for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                    self.tilemap.remove_offgrid(tile)
 
             self.displayer.blit(current_tile_img, (5, 5))
 
+            self.autosave()
+            self.check_saves()
+
             for event in pygame.event.get():
                 # 按窗口上的X
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
+                    self.quit()
                 if event.type == pygame.MOUSEBUTTONDOWN:
+                    # 换了笔刷或者重新按下，同一格也要再放一次
+                    self.last_cell = None
                     if event.button == 1:
                         self.clicking = True
                         if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append(
+                            self.tilemap.add_offgrid(
                                 {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant,
                                  'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
                     if event.button == 3:
@@ -148,11 +261,24 @@ class Editor:
                     if event.key == pygame.K_g:
                         self.ongrid = not self.ongrid
                     if event.key == pygame.K_t:
+                        self.journal.commit()
                         self.tilemap.auto_tile()
+                        self.journal.commit()
+                    if event.key == pygame.K_l:
+                        self.live_autotile = not self.live_autotile
+                        self.update_caption()
                     if event.key == pygame.K_o:
-                        self.tilemap.save('map.json')
-                        msg = messagebox.showinfo(title="提示", message="保存成功")
-                        print(msg)
+                        self.journal.commit()
+                        # 这个version已经在存map.json了，自动保存和退出的时候不用再存一份
+                        self.saving_version = self.journal.version
+                        self.autosaved_version = self.journal.version
+                        self.saver.save(self.tilemap, MAP_PATH)
+                        self.save_status = "保存中"
+                        self.update_caption()
+                    if event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        self.journal.undo(self.tilemap)
+                    if event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        self.journal.redo(self.tilemap)
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
                 if event.type == pygame.KEYUP:
@@ -167,7 +293,8 @@ class Editor:
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
 
-            self.screen.blit(pygame.transform.scale(self.displayer, self.screen.get_size()), (0, 0))
+            # 直接放大到窗口上，不每帧新建一张大图
+            pygame.transform.scale(self.displayer, self.screen.get_size(), self.screen)
             # 更新窗口上的东西，把东西画出来
             pygame.display.update()
             self.clock.tick(FPS)
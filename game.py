@@ -1,5 +1,9 @@
+import argparse
+import hashlib
 import json
+import os
 import sys
+import time
 
 import pygame.display
 
@@ -7,33 +11,96 @@ from scripts.entities import *
 from scripts.utils import *
 from scripts.tilemap import TileMap
 from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.particle import Particles
+from scripts.spark import Sparks
+from scripts.projectile import Projectiles
+from scripts.level_loader import LevelLoader
+from scripts.profiler import Profiler, alloc_counter
+from scripts.scheduler import ActivityScheduler, DEFAULT_TIERS, MAX_CATCH_UP
+from scripts.replay import Recorder, Replay
 import random
 
 # 界面大小
 WIDTH = 1280
 HEIGHT = 960
 FPS = 60
+# 模拟固定每秒60步，和画面帧数无关
+TICK_RATE = 60
+# 一帧最多补多少秒的模拟，卡太久就让游戏变慢，免得越补越卡
+MAX_FRAME_TIME = 0.25
+# 找冲刺目标时玩家的范围每边放大多少像素，敌人一步最多横走0.5、下落3.5像素
+DASH_MARGIN = 8
+# 画面外多远以内的敌人还要画
+CULL_MARGIN = 24
+# 无输入：左，右，跳，冲刺
+NO_INPUT = (False, False, False, False)
 
 
 class Game:
-    def __init__(self, width, height, fps):
+    def __init__(self, width, height, fps, headless=False, seed=None, atlas=True, preload=True, settings=None):
+        """
+        :param headless: 无窗口无声音模式，用于跑模拟、测性能、检查关卡
+        :param seed: 随机种子，同一个种子加同样的输入，模拟结果完全一样
+        :param settings: 设置字典，None就读settings.json，回放录像的时候用录像里的设置
+        :param atlas: 有打包好的图集就从图集读图片，False则一张张读散文件
+        :param preload: 玩的时候在后台线程里提前读下一关，切关时不卡
+        :param fps: 'capped'模式下画面帧数上限
+        """
+        self.headless = headless
+        if headless:
+            # 必须在pygame.init之前设置
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
         pygame.init()
         self.WIDTH = width
         self.HEIGHT = height
         # 帧数
         self.FPS = fps
+        # 所有影响游戏状态的随机数都从这里取，不用全局的random
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # 模拟了多少帧
+        self.frame = 0
+        self.maxlives = 3
+        self.lives = self.maxlives
+        self.level = 0
+        self.total_levels = 2
+        self.load_settings(settings)
         pygame.display.set_caption("Ninja_frog")
         pygame.display.set_icon(pygame.image.load("assets/images/icon.png"))
         # 设置窗口
-        self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        self.screen = None
+        if self.render_mode == 'vsync' and not headless:
+            # 用SDL的缩放模式，窗口逻辑大小就是640x480，放大交给SDL，画面跟着显示器刷新
+            try:
+                self.screen = pygame.display.set_mode((640, 480), pygame.SCALED, vsync=1)
+            except pygame.error:
+                self.render_mode = 'uncapped'
+        if self.screen is None:
+            self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        use_atlas(ATLAS_IMAGE_PATH if atlas else None)
         # Surface功能创建一个空的图片
         self.displayer = pygame.Surface((640, 480), pygame.SRCALPHA)
         self.displayer_2 = pygame.Surface((640, 480))
+        # 放大到窗口大小的画面，有画面振动的时候先放大到这里再偏移着贴到窗口上，每帧重复用
+        self.scaled = pygame.Surface(self.screen.get_size())
+        # 关卡切换时的圆形遮罩，每帧重复用
+        self.transition_surf = pygame.Surface(self.displayer.get_size())
+        self.transition_surf.set_colorkey((255, 255, 255))
+        # screen描边模式的剪影，每帧重复用
+        self.silhouette = pygame.Surface(self.displayer.get_size(), pygame.SRCALPHA)
 
         self.clock = pygame.time.Clock()
         self.movement = [False, False]
+        # 还没跑的模拟时间(秒)，和还没用掉的跳跃、冲刺
+        self.accumulator = 0.0
+        self.pending_jump = False
+        self.pending_dash = False
+        # 录像(Recorder)和回放(Replay)，每模拟一步记下输入或者对一下状态
+        self.recorder = None
+        self.replay = None
+        # F3打开，每个阶段的耗时
+        self.profiler = Profiler()
 
         self.assets = {
             "player": load_image("entities/player.png"),
@@ -61,13 +128,20 @@ class Game:
             "projectile": load_image("projectile.png"),
             "heart": load_image("heart.png")
         }
-        self.sfx = {
-            "jump": pygame.mixer.Sound("assets/sfx/jump.wav"),
-            "dash": pygame.mixer.Sound("assets/sfx/dash.wav"),
-            "hit": pygame.mixer.Sound("assets/sfx/hit.wav"),
-            "shoot": pygame.mixer.Sound("assets/sfx/shoot.wav"),
-            "ambience": pygame.mixer.Sound("assets/sfx/ambience.wav"),
-        }
+        # 敌人朝左时用的枪，不每帧翻转
+        self.assets["gun/flip"] = pygame.transform.flip(self.assets["gun"], True, False)
+        # 背景只在加载的时候放大一次
+        self.background = pygame.transform.scale(self.assets["background"], self.displayer.get_size())
+        if headless:
+            self.sfx = {name: SilentSound() for name in ["jump", "dash", "hit", "shoot", "ambience"]}
+        else:
+            self.sfx = {
+                "jump": pygame.mixer.Sound("assets/sfx/jump.wav"),
+                "dash": pygame.mixer.Sound("assets/sfx/dash.wav"),
+                "hit": pygame.mixer.Sound("assets/sfx/hit.wav"),
+                "shoot": pygame.mixer.Sound("assets/sfx/shoot.wav"),
+                "ambience": pygame.mixer.Sound("assets/sfx/ambience.wav"),
+            }
         self.music = load_musics("assets/music/")
         # 音量大小
         self.sfx['ambience'].set_volume(0.2)
@@ -75,22 +149,32 @@ class Game:
         self.sfx['hit'].set_volume(0.8)
         self.sfx['dash'].set_volume(0.3)
         self.sfx['jump'].set_volume(0.5)
-        self.clouds = Clouds(self.assets["clouds"], count=16)
+        self.clouds = Clouds(self.assets["clouds"], count=16, rng=self.rng)
 
         self.player = Player(self, (400, 100), (12, 12))
 
         self.tilemap = TileMap(self, tile_size=16)
+        self.level_loader = LevelLoader(self, threaded=preload)
+        # 流式关卡(.world)读块用的，普通关卡是None
+        self.stream = None
         self.leaf_spawners = []
+        # 流式关卡每一块里的树，块丢掉的时候树也不掉叶子了
+        self.leaf_chunks = {}
         self.enemies = []
-        self.projectiles = []
-        self.particles = []
-        self.sparks = []
+        # 这一步玩家冲刺时可能撞到的敌人，以及为了找它们和几个敌人比了Rect
+        self.dash_targets = set()
+        self.dash_checks = 0
+        self.scheduler = ActivityScheduler(self.lod_tiers, self.lod_catch_up)
+        self.projectiles = Projectiles(on_spawn=self.projectile_spawned, on_expire=self.projectile_expired)
+        self.particles = Particles(self)
+        self.sparks = Sparks()
         self.scroll = [0, 0]
-        self.maxlives = 3
-        self.lives = self.maxlives
-        self.level = 0
-        self.total_levels = 2
-        self.load_settings()
+        # 上一次模拟时的镜头位置，用来插值
+        self.prev_scroll = [0, 0]
+        self.outlines = None
+        if self.outline_mode == 'sprite':
+            self.outlines = Outlines(self.displayer_2)
+            self.outlines.preload(self.assets)
         self.screen_shake = 0
         self.transition = -30
         self.text_font = pygame.font.Font("assets/font/Uranus_Pixel_11Px.ttf", 30)
@@ -98,26 +182,47 @@ class Game:
         self.game_over_text = self.text_font.render("Thank you for playing!", True, (255, 0, 0))
         self.load_level(self.level)
 
-    def load_settings(self):
-        f = open("settings.json", "r")
-        game_settings = json.load(f)
+    def load_settings(self, game_settings=None):
+        if game_settings is None:
+            f = open("settings.json", "r")
+            game_settings = json.load(f)
+            f.close()
+        # 录像的时候原样存下来
+        self.settings = game_settings
         self.total_levels = game_settings['total_levels'] - 1
         self.maxlives = game_settings['lives']
+        # 描边方式：'screen'每帧对整个画面做mask，'sprite'用每张图片提前算好的描边
+        self.outline_mode = game_settings.get('outline', 'screen')
+        # 画面帧数：'capped'最多fps帧，'uncapped'不限帧数，'vsync'跟着显示器刷新。模拟总是每秒TICK_RATE步
+        self.render_mode = game_settings.get('render', 'capped')
+        # 离画面远的敌人降频或者睡觉：true用默认档位，false每个敌人每步都模拟，
+        # 也可以写{"tiers": [[距离, 间隔], ...], "catch_up": 最多补跑几步}
+        lod = game_settings.get('lod', True)
+        if lod is True:
+            lod = {}
+        self.lod_tiers = None if lod is False else lod.get('tiers', DEFAULT_TIERS)
+        self.lod_catch_up = MAX_CATCH_UP if lod is False else lod.get('catch_up', MAX_CATCH_UP)
 
     def load_level(self, map_id):
-        pygame.mixer.music.stop()
-        music_index = self.level % len(self.music)
-        pygame.mixer.music.load(self.music[music_index])
-        pygame.mixer.music.set_volume(0.2)
-        pygame.mixer.music.play(-1)
-        self.tilemap.load('assets/maps/' + str(map_id) + '.json')
+        # 地图解析、建索引、提取出生点、读音乐文件都在level_loader的后台线程里提前做好了，这里直接换上
+        level = self.level_loader.take(map_id)
+        if not self.headless:
+            pygame.mixer.music.stop()
+            pygame.mixer.music.load(level.music, level.music_hint)
+            pygame.mixer.music.set_volume(0.2)
+            pygame.mixer.music.play(-1)
+        self.tilemap = level.tilemap
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = level.stream
         self.leaf_spawners = []
-        for tree in self.tilemap.extract([("large_decor", 2)], keep=True):
+        self.leaf_chunks = {}
+        for tree in level.trees:
             self.leaf_spawners.append(
                 pygame.Rect(4 + tree["pos"][0], 4 + tree["pos"][1], 23, 13)
             )
         self.enemies = []
-        for spawner in self.tilemap.extract([("spawners", 0), ("spawners", 1)], keep=False):
+        for spawner in level.spawners:
             if spawner['variant'] == 0:
                 self.player.pos = spawner['pos']
                 self.player.air_time = 0
@@ -125,195 +230,497 @@ class Game:
                 self.player.hit = 0
             else:
                 self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
+        self.scheduler.reset(self.enemies, self.frame)
 
-        self.projectiles = []
-        self.particles = []
+        self.projectiles.clear()
+        self.particles.clear()
         self.scroll = [0, 0]
+        if self.stream is not None:
+            # 流式关卡可能很大，镜头直接对准玩家，不从左上角一路滑过去把沿路的块都读一遍
+            self.scroll = [self.player.rect().centerx - self.displayer.get_width() / 2,
+                           self.player.rect().centery - self.displayer.get_height() / 2]
+            # 出生点附近的块后台已经读好了，里面的敌人和树现在加进来
+            self.add_chunks(list(self.stream.loaded))
+        self.prev_scroll = list(self.scroll)
+        self.player.prev_pos = list(self.player.pos)
         self.lives = self.maxlives
         self.transition = -40
+        # 死了会重开这一关，过关会进下一关，两个都先在后台读着，之前的关卡读好的不要了
+        self.level_loader.keep([map_id, map_id + 1])
+        self.level_loader.prepare(map_id)
+        if map_id < self.total_levels:
+            self.level_loader.prepare(map_id + 1)
+
+    def handle_events(self):
+        """
+        处理窗口事件，把键盘变成这一帧的输入
+        :return: (左, 右, 跳, 冲刺)
+        """
+        jump = False
+        dash = False
+        for event in pygame.event.get():
+            # 按窗口上的X
+            if event.type == pygame.QUIT:
+                self.quit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_a or event.key == pygame.K_LEFT:
+                    self.movement[0] = True
+                if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
+                    self.movement[1] = True
+                if event.key == pygame.K_UP or event.key == pygame.K_w:
+                    jump = True
+                if event.key == pygame.K_x or event.key == pygame.K_j:
+                    dash = True
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle()
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_a or event.key == pygame.K_LEFT:
+                    self.movement[0] = False
+                if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
+                    self.movement[1] = False
+        return self.movement[0], self.movement[1], jump, dash
+
+    def quit(self):
+        if self.recorder is not None:
+            self.recorder.save()
+        if self.replay is not None:
+            print(self.replay.summary())
+        pygame.quit()
+        sys.exit()
+
+    def step(self, frame_input):
+        """
+        用这个输入模拟一步，录像的时候记下来，回放的时候对一下状态哈希
+        """
+        self.apply_input(frame_input)
+        self.update()
+        if self.recorder is not None:
+            self.recorder.record(self, frame_input)
+        if self.replay is not None:
+            self.replay.verify(self)
+
+    def frame_counts(self, sim_steps):
+        """
+        :return: 性能分析每帧要记的数量
+        """
+        return {'sim_steps': sim_steps, 'enemy_count': len(self.enemies), 'awake_count': self.scheduler.stepped,
+                'dash_checks': self.dash_checks,
+                'chunk_count': len(self.stream.loaded) if self.stream else 0,
+                'projectile_count': len(self.projectiles), 'spark_count': len(self.sparks),
+                'particle_count': len(self.particles)}
+
+    def apply_input(self, frame_input):
+        left, right, jump, dash = frame_input
+        self.movement = [left, right]
+        if jump:
+            if self.player.jump():
+                self.sfx['jump'].play()
+        if dash:
+            self.player.dash()
+
+    def update(self):
+        """
+        模拟一帧，这里面不画任何东西，无窗口模式只调用这个
+        :return: None
+        """
+        self.frame += 1
+        self.prev_scroll[0] = self.scroll[0]
+        self.prev_scroll[1] = self.scroll[1]
+        # 屏幕振动逐渐减少
+        self.screen_shake = max(0, self.screen_shake - 1)
+
+        if not len(self.enemies) and (self.stream is None or not self.stream.unspawned) and self.game_over is False:
+            self.transition += 1
+            if self.transition > 40:
+                self.level += 1
+                if self.level > self.total_levels:
+                    self.game_over = True
+                else:
+                    self.load_level(self.level)
+        if self.transition < 0:
+            self.transition += 1
+
+        if self.lives <= 0 and not self.game_over:
+            self.lives -= 1
+            self.transition += 1
+            # 也相当于一个计时的功能，让玩家看到自己死
+            if self.lives < -40:
+                self.load_level(self.level)
+        self.scroll[0] += (
+                                  self.player.rect().centerx
+                                  - self.displayer.get_width() / 2
+                                  - self.scroll[0]
+                          ) / 30
+        self.scroll[1] += (
+                                  self.player.rect().centery
+                                  - self.displayer.get_height() / 2
+                                  - self.scroll[1]
+                          ) / 30
+
+        for rect in self.leaf_spawners:
+            # 不乘以一个大数字，会一直生成叶子，我们不想这样
+            if self.rng.random() * 49999 < rect.width * rect.height:
+                pos = (
+                    rect.x + self.rng.random() * rect.width,
+                    rect.y + self.rng.random() * rect.height,
+                )
+                self.particles.spawn("leaf", pos, velocity=[-0.1, 0.3], frame=self.rng.randint(0, 20))
+
+        self.clouds.update()
+        self.profiler.lap('sim_world')
+
+        if self.stream is not None:
+            self.stream_world()
+            self.profiler.lap('sim_stream')
+
+        if self.lives > 0:
+            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
+        self.profiler.lap('sim_player')
+
+        self.find_dash_targets()
+        stream = self.stream
+        for enemy, steps in self.scheduler.plan(self.view_rect(self.scroll), self.frame):
+            # 流式关卡里脚下的块还没读进来的敌人先不动，不然会掉下去
+            if stream is not None and not stream.covers(enemy.rect()):
+                continue
+            for _ in range(steps):
+                kill = enemy.update(self.tilemap, (0, 0))
+                if kill:
+                    self.enemies.remove(enemy)
+                    self.scheduler.remove(enemy)
+                    break
+        self.profiler.lap('sim_enemies')
+
+        self.update_projectiles()
+        self.profiler.lap('sim_projectiles')
+        self.update_sparks()
+        self.profiler.lap('sim_sparks')
+        self.update_particles()
+        self.profiler.lap('sim_particles')
+
+    def stream_world(self):
+        """
+        流式关卡：按画面和玩家的位置读进附近的块、丢掉远的块。画面里和玩家碰到的块马上读，
+        跳得快或者传送以后画面里也不会有块晚几步才出来
+        """
+        view = self.view_rect(self.scroll)
+        loaded, evicted = self.stream.update(view, view.union(self.player.rect()))
+        for chunk_loc in evicted:
+            self.leaf_chunks.pop(chunk_loc, None)
+        self.add_chunks(loaded)
+        if evicted:
+            self.leaf_spawners = [rect for rects in self.leaf_chunks.values() for rect in rects]
+
+    def add_chunks(self, chunk_locs):
+        """
+        新读进来的块里的树开始掉叶子，第一次读进来的块生成里面的敌人
+        """
+        for chunk_loc in chunk_locs:
+            trees = [pygame.Rect(4 + tile["pos"][0], 4 + tile["pos"][1], 23, 13)
+                     for tile in self.stream.offgrid_of(chunk_loc)
+                     if tile['type'] == 'large_decor' and tile['variant'] == 2]
+            if trees:
+                self.leaf_chunks[chunk_loc] = trees
+            for spawner in self.stream.take_spawners(chunk_loc):
+                enemy = Enemy(self, spawner['pos'], (8, 15))
+                self.enemies.append(enemy)
+                self.scheduler.add(enemy, self.frame)
+        if chunk_locs:
+            self.leaf_spawners = [rect for rects in self.leaf_chunks.values() for rect in rects]
+
+    def view_rect(self, scroll):
+        """
+        :return: 画面在世界里的Rect
+        """
+        return pygame.Rect(scroll[0], scroll[1], self.displayer.get_width(), self.displayer.get_height())
+
+    def find_dash_targets(self):
+        """
+        冲刺的时候先挑出玩家附近的敌人，只有这些敌人在自己的update里和玩家做精确的碰撞判断。
+        调度器已经按位置把敌人分在格子里、敌人动了才换格子，直接按Rect查，不用每步重建一遍
+        """
+        if abs(self.player.dashing) < 50:
+            self.dash_targets = set()
+            self.dash_checks = 0
+            return
+        # 敌人在这一步里还会移动，每边多留DASH_MARGIN像素
+        area = self.player.rect().inflate(DASH_MARGIN * 2, DASH_MARGIN * 2)
+        self.dash_targets = set(self.scheduler.query_rect(area))
+        self.dash_checks = self.scheduler.checks
+
+    def update_projectiles(self):
+        # 只要不是在冲刺过程中就判断是否击中，冲刺时是不会被击中的
+        target = self.player.rect() if abs(self.player.dashing) < 50 else None
+        # 流式关卡里飞进没读进来的块的子弹先停着，不然会穿过还没读进来的墙
+        covers = self.stream.covers_point if self.stream is not None else None
+        self.projectiles.update(self.tilemap, target, covers)
+
+    def projectile_spawned(self, x, y, direction):
+        self.sfx['shoot'].play()
+        for i in range(4):
+            self.sparks.spawn((x, y), self.rng.random() - 0.5 + (math.pi if direction < 0 else 0),
+                              2 + self.rng.random())
+
+    def projectile_expired(self, reason, x, y, direction):
+        if reason == 'wall':
+            for i in range(4):
+                self.sparks.spawn((x, y), self.rng.random() - 0.5 + (math.pi if direction > 0 else 0),
+                                  2 + self.rng.random())
+        elif reason == 'hit':
+            self.sfx['hit'].play()
+            self.player.hit = direction
+            self.screen_shake = max(16, self.screen_shake)
+            self.lives -= 1
+            for i in range(15):
+                angle = self.rng.random() * math.pi * 2
+                speed = self.rng.random() * 5
+                self.sparks.spawn(self.player.rect().center, angle, 2 + self.rng.random())
+                self.particles.spawn('particle', self.player.rect().center,
+                                     velocity=[math.cos(angle + math.pi) * speed * 0.5,
+                                               math.sin(angle + math.pi) * speed * 0.5],
+                                     frame=self.rng.randint(0, 7))
+
+    def update_sparks(self):
+        self.sparks.update()
+
+    def update_particles(self):
+        self.particles.update()
+
+    def render(self, alpha=1.0):
+        """
+        :param alpha: 距离上一次模拟过了几分之一步，镜头和人物在上一次和这一次模拟的位置之间插值
+        """
+        self.displayer.fill((0, 0, 0, 0))
+        self.displayer_2.blit(self.background, (0, 0))
+        # 展示剩余的生命值
+        for i in range(self.lives):
+            self.displayer_2.blit(self.assets["heart"], (8 + i * 16, 0))
+
+        render_scroll = (int(lerp(self.prev_scroll[0], self.scroll[0], alpha)),
+                         int(lerp(self.prev_scroll[1], self.scroll[1], alpha)))
+        self.profiler.lap('background')
+
+        # sprite描边模式下每个东西画的时候顺便把描边贴到displayer_2上，不用最后整个画面再做一次
+        outlines = self.outlines
+        self.clouds.render(self.displayer, offset=render_scroll, outlines=outlines)
+        self.profiler.lap('clouds')
+
+        self.tilemap.render(self.displayer, offset=render_scroll, outlines=outlines)
+        self.profiler.lap('tilemap')
+        if self.lives > 0:
+            self.player.render(self.displayer, offset=render_scroll, outlines=outlines, alpha=alpha)
+
+        # 画面外的敌人不画，多留出动画偏移和枪的位置
+        view = self.view_rect(render_scroll).inflate(CULL_MARGIN * 2, CULL_MARGIN * 2)
+        for enemy in self.scheduler.near(view):
+            enemy.render(self.displayer, offset=render_scroll, outlines=outlines, alpha=alpha)
+        self.profiler.lap('entities')
+
+        self.render_projectiles(render_scroll)
+        self.profiler.lap('projectiles')
+        self.sparks.render(self.displayer, offset=render_scroll, outlines=outlines)
+        self.profiler.lap('sparks')
+        if outlines is None:
+            self.render_outline()
+            self.profiler.lap('outline')
+
+        self.particles.render(self.displayer, offset=render_scroll)
+        self.profiler.lap('particles')
+
+        if self.transition:
+            self.transition_surf.fill((0, 0, 0))
+            pygame.draw.circle(self.transition_surf, (255, 255, 255),
+                               (self.displayer.get_width() // 2, self.displayer.get_height() // 2),
+                               (30 - abs(self.transition)) * 8)
+            self.displayer.blit(self.transition_surf, (0, 0))
+        # 画面振动只是视觉效果，不用self.rng，免得影响模拟的结果
+        screen_shake_offset = (random.random() * self.screen_shake - self.screen_shake / 2,
+                               random.random() * self.screen_shake - self.screen_shake / 2)
+        # 游戏结束打出结束文字
+        if self.game_over:
+            self.displayer.blit(self.game_over_text,
+                                (self.displayer.get_width() // 2 - self.game_over_text.get_width() // 2,
+                                 self.displayer.get_height() // 2 - self.game_over_text.get_height() // 2))
+            pygame.display.flip()
+        self.profiler.lap('transition')
+        self.profiler.draw(self.displayer)
+        self.profiler.lap('overlay')
+
+        self.present(screen_shake_offset)
+        self.profiler.lap('present')
+
+    def render_projectiles(self, offset=(0, 0)):
+        self.projectiles.render(self.displayer, self.assets['projectile'], offset=offset, outlines=self.outlines)
+
+    def render_outline(self):
+        # 把displayer转换成黑白，即2种颜色的图片二进制
+        display_mask = pygame.mask.from_surface(self.displayer)
+        alloc_counter.add()
+        display_mask.to_surface(surface=self.silhouette, setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
+        for offset in [(-1, 0), (0, -1), (1, 0), (0, 1)]:
+            self.displayer_2.blit(self.silhouette, offset)
+
+    def present(self, screen_shake_offset=(0, 0)):
+        self.displayer_2.blit(self.displayer, (0, 0))
+
+        if self.screen.get_size() == self.displayer_2.get_size():
+            # vsync模式下窗口就是640x480，放大交给SDL，振动幅度也跟着缩小，看起来和原来一样大
+            ratio = self.displayer_2.get_width() / self.WIDTH
+            self.screen.blit(self.displayer_2, (screen_shake_offset[0] * ratio, screen_shake_offset[1] * ratio))
+            pygame.display.flip()
+            return
+        # 直接放大到窗口上(或者重复用的self.scaled)，不每帧新建一张大图
+        if screen_shake_offset == (0, 0):
+            pygame.transform.scale(self.displayer_2, self.screen.get_size(), self.screen)
+        else:
+            pygame.transform.scale(self.displayer_2, self.screen.get_size(), self.scaled)
+            self.screen.blit(self.scaled, screen_shake_offset)
+        # 更新窗口上的东西，把东西画出来
+        pygame.display.update()
 
     def run(self):
         # 参数里面是循环次数，
         pygame.mixer.music.play(-1)
         self.sfx["ambience"].play(-1)
+        self.clock.tick()
+        dt = 0.0
         while True:
-            self.displayer.fill((0, 0, 0, 0))
-            self.displayer_2.blit(
-                pygame.transform.scale(
-                    self.assets["background"], self.displayer.get_size()
-                ),
-                (0, 0),
-            )
-            # 屏幕振动逐渐减少
-
-            self.screen_shake = max(0, self.screen_shake - 1)
-
-            if not len(self.enemies) and self.game_over is False:
-                self.transition += 1
-                if self.transition > 40:
-                    self.level += 1
-                    if self.level > self.total_levels:
-                        self.game_over = True
-                    else:
-                        self.load_level(self.level)
-            if self.transition < 0:
-                self.transition += 1
-
-            if self.lives <= 0 and not self.game_over:
-                self.lives -= 1
-                self.transition += 1
-                # 也相当于一个计时的功能，让玩家看到自己死
-                if self.lives < -40:
-                    self.load_level(self.level)
+            self.profiler.begin_frame()
+            frame = self.frame
+            frame_input = self.handle_events()
+            self.profiler.lap('events')
+            self.render(self.advance(dt, frame_input))
+            # 'capped'模式在这里等到帧数上限，其他模式tick只是量一下这一帧花了多久
+            dt = self.clock.tick(self.FPS if self.render_mode == 'capped' else 0) / 1000
+            self.profiler.lap('wait')
+            if self.profiler.enabled:
+                self.profiler.end_frame(self.frame_counts(self.frame - frame))
+            # 录像放完了就退出
+            if self.replay is not None and self.replay.finished(self.frame):
+                self.quit()
+
+    def advance(self, dt, frame_input):
+        """
+        画面过了dt秒，按固定步长跑够这段时间的模拟，画面卡了就多跑几步，画面快了可能一步都不跑
+        :param dt: 这一帧的秒数
+        :param frame_input: 这一帧的输入(左, 右, 跳, 冲刺)，回放录像的时候不用，每一步用录像里的输入
+        :return: 剩下不够一步的时间占一步的比例，画的时候用来插值
+        """
+        step = 1 / TICK_RATE
+        self.accumulator += min(dt, MAX_FRAME_TIME)
+        left, right, jump, dash = frame_input
+        # 跳和冲刺留到下一次模拟才用掉，画面帧比模拟帧多的时候不会丢
+        self.pending_jump = self.pending_jump or jump
+        self.pending_dash = self.pending_dash or dash
+        while self.accumulator >= step:
+            if self.replay is not None:
+                if self.replay.finished(self.frame):
+                    break
+                step_input = self.replay.input(self.frame)
             else:
-                # 展示剩余的生命值
-                for i in range(self.lives):
-                    self.displayer_2.blit(self.assets["heart"], (8 + i * 16, 0))
-            self.scroll[0] += (
-                                      self.player.rect().centerx
-                                      - self.displayer.get_width() / 2
-                                      - self.scroll[0]
-                              ) / 30
-            self.scroll[1] += (
-                                      self.player.rect().centery
-                                      - self.displayer.get_height() / 2
-                                      - self.scroll[1]
-                              ) / 30
-
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-            for rect in self.leaf_spawners:
-                # 不乘以一个大数字，会一直生成叶子，我们不想这样
-                if random.random() * 49999 < rect.width * rect.height:
-                    pos = (
-                        rect.x + random.random() * rect.width,
-                        rect.y + random.random() * rect.height,
-                    )
-                    self.particles.append(
-                        Particle(
-                            self,
-                            "leaf",
-                            pos,
-                            velocity=[-0.1, 0.3],
-                            frame=random.randint(0, 20),
-                        )
-                    )
-
-            self.clouds.update()
-            self.clouds.render(self.displayer, offset=render_scroll)
-
-            self.tilemap.render(self.displayer, offset=render_scroll)
-            if self.lives > 0:
-                self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-                self.player.render(self.displayer, offset=render_scroll)
-
-            for enemy in self.enemies.copy():
-                kill = enemy.update(self.tilemap, (0, 0))
-                if kill:
-                    self.enemies.remove(enemy)
-                enemy.render(self.displayer, offset=render_scroll)
-
-            # projectile的格式： [[x,y],direction,timer]
-            for projectile in self.projectiles.copy():
-                projectile[0][0] += projectile[1]
-                projectile[2] += 1
-                img = self.assets['projectile']
-                self.displayer.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0],
-                                          projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                if self.tilemap.solid_check(projectile[0]):
-                    self.projectiles.remove(projectile)
-                    for i in range(4):
-                        self.sparks.append(
-                            Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0),
-                                  2 + random.random()))
-                elif projectile[2] > 240:
-                    self.projectiles.remove(projectile)
-                # 只要不是在冲刺过程中就判断是否击中，冲刺时是不会被击中的
-                elif abs(self.player.dashing) < 50:
-                    if self.player.rect().collidepoint(projectile[0]):
-                        self.sfx['hit'].play()
-                        self.player.hit = projectile[1]
-                        self.screen_shake = max(16, self.screen_shake)
-                        self.lives -= 1
-                        self.projectiles.remove(projectile)
-                        for i in range(15):
-                            angle = random.random() * math.pi * 2
-                            speed = random.random() * 5
-                            self.sparks.append(Spark(self.player.rect().center, angle, 2 + random.random()))
-                            self.particles.append(Particle(self, 'particle', self.player.rect().center,
-                                                           velocity=[math.cos(angle + math.pi) * speed * 0.5,
-                                                                     math.sin(angle + math.pi) * speed * 0.5],
-                                                           frame=random.randint(0, 7)))
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.displayer, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-            # 把displayer转换成黑白，即2种颜色的图片二进制
-            display_mask = pygame.mask.from_surface(self.displayer)
-            display_sillhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-            for offset in [(-1, 0), (0, -1), (1, 0), (0, 1)]:
-                self.displayer_2.blit(display_sillhouette, offset)
-
-            for particle in self.particles.copy():
-                kill = particle.update()
-                particle.render(self.displayer, offset=render_scroll)
-                if particle.type == 'leaf':
-                    # 模拟左右摇摆
-                    particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
-                if kill:
-                    self.particles.remove(particle)
-
-            for event in pygame.event.get():
-                # 按窗口上的X
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_a or event.key == pygame.K_LEFT:
-                        self.movement[0] = True
-                    if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
-                        self.movement[1] = True
-                    if event.key == pygame.K_UP or event.key == pygame.K_w:
-                        if self.player.jump():
-                            self.sfx['jump'].play()
-                    if event.key == pygame.K_x or event.key == pygame.K_j:
-                        self.player.dash()
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_a or event.key == pygame.K_LEFT:
-                        self.movement[0] = False
-                    if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
-                        self.movement[1] = False
-
-            if self.transition:
-                transition_surf = pygame.Surface(self.displayer.get_size())
-                pygame.draw.circle(transition_surf, (255, 255, 255),
-                                   (self.displayer.get_width() // 2, self.displayer.get_height() // 2),
-                                   (30 - abs(self.transition)) * 8)
-                transition_surf.set_colorkey((255, 255, 255))
-                self.displayer.blit(transition_surf, (0, 0))
-            screen_shake_offset = (random.random() * self.screen_shake - self.screen_shake / 2,
-                                   random.random() * self.screen_shake - self.screen_shake / 2)
-            # 游戏结束打出结束文字
-            if self.game_over:
-                self.displayer.blit(self.game_over_text,
-                                    (self.displayer.get_width() // 2 - self.game_over_text.get_width() // 2,
-                                     self.displayer.get_height() // 2 - self.game_over_text.get_height() // 2))
-                pygame.display.flip()
-
-            self.displayer_2.blit(self.displayer, (0, 0))
-
-            self.screen.blit(
-                pygame.transform.scale(self.displayer_2, self.screen.get_size()), screen_shake_offset
-            )
-            # 更新窗口上的东西，把东西画出来
-            pygame.display.update()
-            self.clock.tick(FPS)
+                step_input = (left, right, self.pending_jump, self.pending_dash)
+                self.pending_jump = self.pending_dash = False
+            self.step(step_input)
+            self.accumulator -= step
+        return self.accumulator / step
+
+    def simulate(self, frames, inputs=None):
+        """
+        无窗口模式下不限帧数地跑模拟，固定每次一帧的步长
+        :param frames: 跑多少帧
+        :param inputs: 函数，参数是帧号，返回这一帧的输入(左, 右, 跳, 冲刺)，None就是没有输入
+        :return: None
+        """
+        for _ in range(frames):
+            # 打开了性能分析就每一步算一帧，快进回放的时候也能导出每个阶段的耗时
+            self.profiler.begin_frame()
+            self.step(inputs(self.frame) if inputs else NO_INPUT)
+            if self.profiler.enabled:
+                self.profiler.end_frame(self.frame_counts(1))
+
+    def state_hash(self):
+        """
+        把影响模拟的状态算成一个哈希，用来检查两次模拟是不是完全一样
+        :return: 十六进制字符串
+        """
+        projectiles = self.projectiles
+        n = len(projectiles)
+        state = (
+            self.frame, self.level, self.lives, self.transition, self.game_over, self.screen_shake,
+            tuple(self.scroll), tuple(self.player.pos), tuple(self.player.velocity), self.player.dashing,
+            self.player.air_time, self.player.hit,
+            tuple((tuple(enemy.pos), enemy.walking, enemy.flip) for enemy in self.enemies),
+            tuple(zip(zip(projectiles.x[:n], projectiles.y[:n]), projectiles.direction[:n], projectiles.timer[:n])),
+            tuple(zip(self.sparks.x, self.sparks.y)),
+            tuple(self.particles.positions()),
+            self.rng.getstate(),
+        )
+        return hashlib.sha1(repr(state).encode()).hexdigest()
+
+
+def seed_arg(text):
+    # 录像里种子存成u64
+    seed = int(text)
+    if not 0 <= seed < 1 << 64:
+        raise argparse.ArgumentTypeError('种子要在0到2^64-1之间')
+    return seed
 
 
 def main():
-    game = Game(WIDTH, HEIGHT, FPS)
-    game.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headless', action='store_true', help='无窗口无声音，不限帧数跑模拟')
+    parser.add_argument('--frames', type=int, default=3600, help='无窗口模式跑多少帧')
+    parser.add_argument('--seed', type=seed_arg, default=None, help='随机种子(0到2^64-1)')
+    parser.add_argument('--profile', help='一开始就打开性能分析，每300帧把最近300帧写到这个文件(.csv或.json)')
+    parser.add_argument('--record', help='把这一局的种子和每一步的输入录到这个文件，加--headless录的是无窗口跑的那几帧')
+    parser.add_argument('--replay', help='回放录像，加--headless就不开窗口快进回放')
+    args = parser.parse_args()
+
+    replay = None
+    seed = args.seed
+    settings = None
+    if args.replay:
+        replay = Replay(args.replay)
+        seed = replay.seed
+        settings = replay.settings
+    elif args.record and seed is None:
+        # 录像一定要有种子，不然回放不出一样的随机数
+        seed = random.randrange(1 << 32)
+
+    if args.headless:
+        game = Game(WIDTH, HEIGHT, FPS, headless=True, seed=seed, settings=settings)
+        if args.profile:
+            game.profiler.export_path = args.profile
+            game.profiler.set_enabled(True)
+        if args.record:
+            game.recorder = Recorder(args.record, seed, game.settings)
+        frames = args.frames
+        inputs = None
+        if replay is not None:
+            game.replay = replay
+            frames = replay.steps
+            inputs = replay.input
+        start = time.perf_counter()
+        game.simulate(frames, inputs)
+        cost = time.perf_counter() - start
+        print('simulated %d frames in %.3fs (%.0f frames/s), state %s' % (
+            frames, cost, frames / cost, game.state_hash()))
+        if args.profile:
+            game.profiler.export(args.profile)
+        if game.recorder is not None:
+            game.recorder.save()
+        if replay is not None:
+            print(replay.summary())
+            sys.exit(0 if replay.diverged is None else 1)
+    else:
+        game = Game(WIDTH, HEIGHT, FPS, seed=seed, settings=settings)
+        game.replay = replay
+        if args.record:
+            game.recorder = Recorder(args.record, seed, game.settings)
+        if args.profile:
+            game.profiler.export_path = args.profile
+            game.profiler.set_enabled(True)
+        game.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import os
+import threading
+
+
+def save_atomic(tilemap, path):
+    """
+    先存到旁边的临时文件再换过去，存到一半退出或者出错也不会把原来的文件弄坏
+    """
+    base, ext = os.path.splitext(path)
+    # 后缀要留着，save按后缀决定存成json还是.map
+    tmp_path = base + '.saving' + ext
+    try:
+        tilemap.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class BackgroundSaver:
+    """
+    在后台线程里存地图，主线程只复制一份网格(TileMap.snapshot)，转json、写文件都不卡编辑器
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        # 正在存的时候又要存，path -> 最新的副本，存完接着存，同一个文件只存最新的
+        self.queued = {}
+        # 存完的 [(path, 出错的异常或者None)]，主线程poll拿走
+        self.results = []
+
+    def save(self, tilemap, path):
+        snapshot = tilemap.snapshot()
+        with self.lock:
+            if self.thread is not None:
+                self.queued.pop(path, None)
+                self.queued[path] = snapshot
+                return
+            self.thread = threading.Thread(target=self.work, args=(snapshot, path), daemon=True)
+            thread = self.thread
+        thread.start()
+
+    def work(self, snapshot, path):
+        while True:
+            error = None
+            try:
+                save_atomic(snapshot, path)
+            except Exception as e:
+                error = e
+            with self.lock:
+                self.results.append((path, error))
+                if not self.queued:
+                    self.thread = None
+                    return
+                path = next(iter(self.queued))
+                snapshot = self.queued.pop(path)
+
+    def busy(self):
+        with self.lock:
+            return self.thread is not None
+
+    def poll(self):
+        """
+        :return: 上次poll以后存完的 [(path, 出错的异常或者None)]
+        """
+        with self.lock:
+            results = self.results
+            self.results = []
+        return results
+
+    def wait(self):
+        """
+        等排着的都存完，退出之前用
+        """
+        with self.lock:
+            thread = self.thread
+        if thread is not None:
+            thread.join()
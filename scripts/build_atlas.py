@@ -0,0 +1,110 @@
+"""
+把assets/images下面所有图片打包成一张图集和一个索引，游戏启动时只要读这两个文件
+用法(在项目根目录)：python -m scripts.build_atlas [--width 512] [--check]
+改过assets/images里的图片以后要重新跑一遍
+"""
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from scripts import utils
+from scripts.utils import BASE_IMG_PATH, ATLAS_IMAGE_PATH, ATLAS_INDEX_PATH, load_image
+
+# 图片之间空1像素，免得以后缩放的时候串色
+PADDING = 1
+
+
+def collect():
+    """
+    :return: (所有图片的路径列表, 目录->排好序的路径列表)，路径都是相对BASE_IMG_PATH的，和load_image的参数一样
+    """
+    paths = []
+    dirs = {}
+    for root, sub_dirs, files in os.walk(BASE_IMG_PATH):
+        rel = os.path.relpath(root, BASE_IMG_PATH).replace(os.sep, '/')
+        prefix = '' if rel == '.' else rel + '/'
+        files = [prefix + name for name in sorted(files)]
+        paths.extend(files)
+        # 只有没有子目录的目录才能用load_images读
+        if files and not sub_dirs and rel != '.':
+            dirs[rel] = files
+    return paths, dirs
+
+
+def pack(sizes, width):
+    """
+    按高度从高到低一行一行地放
+    :param sizes: 路径->(w, h)
+    :param width: 图集宽度
+    :return: (路径->[x, y, w, h], 图集高度)
+    """
+    rects = {}
+    x = y = shelf_h = 0
+    for path in sorted(sizes, key=lambda p: (-sizes[p][1], -sizes[p][0], p)):
+        w, h = sizes[path]
+        if w > width:
+            raise ValueError(path + ' 比图集还宽，加大--width')
+        if x + w > width:
+            x = 0
+            y += shelf_h + PADDING
+            shelf_h = 0
+        rects[path] = [x, y, w, h]
+        x += w + PADDING
+        shelf_h = max(shelf_h, h)
+    return rects, y + shelf_h
+
+
+def build(width):
+    paths, dirs = collect()
+    images = {path: load_image(path) for path in paths}
+    rects, height = pack({path: img.get_size() for path, img in images.items()}, width)
+    # 透明的地方都是黑色，和单独读进来设colorkey的效果一样
+    surface = pygame.Surface((width, height))
+    surface.fill((0, 0, 0))
+    surface.blits([(images[path], rects[path][:2]) for path in paths], doreturn=False)
+    pygame.image.save(surface, ATLAS_IMAGE_PATH)
+    f = open(ATLAS_INDEX_PATH, 'w')
+    json.dump({'size': [width, height], 'images': rects, 'dirs': dirs}, f, indent=1)
+    f.close()
+    print('%d images -> %s (%dx%d), %s' % (len(paths), ATLAS_IMAGE_PATH, width, height, ATLAS_INDEX_PATH))
+
+
+def check():
+    """
+    图集里每张图和散文件逐像素比较
+    :return: 不一样的路径列表
+    """
+    paths, dirs = collect()
+    loose = {path: load_image(path) for path in paths}
+    if not utils.use_atlas():
+        return paths
+    bad = [path for path in paths if path not in utils.atlas.rects or
+           pygame.image.tobytes(utils.atlas.image(path), 'RGB') != pygame.image.tobytes(loose[path], 'RGB')]
+    bad += [path for path in dirs if utils.atlas.dirs.get(path) != dirs[path]]
+    utils.atlas = None
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=512, help='图集宽度')
+    parser.add_argument('--check', action='store_true', help='只检查图集和散文件是否一致，不一致返回1')
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    if args.check:
+        bad = check()
+        for path in bad:
+            print('out of date: ' + path)
+        sys.exit(1 if bad else 0)
+    build(args.width)
+
+
+if __name__ == '__main__':
+    main()
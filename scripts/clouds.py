@@ -11,20 +11,23 @@ class Cloud:
     def update(self):
         self.pos[0] += self.speed
 
-    def render(self, surf, offset=(0, 0)):
+    def render(self, surf, offset=(0, 0), outlines=None):
         render_pos = (self.pos[0] - offset[0] * self.depth, self.pos[1] - offset[1] * self.depth)
-        surf.blit(self.img, (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(),
-                             render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height()))
+        pos = (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(),
+               render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height())
+        surf.blit(self.img, pos)
+        if outlines:
+            outlines.draw(self.img, pos)
 
 
 class Clouds:
-    def __init__(self, cloud_images, count=16):
+    def __init__(self, cloud_images, count=16, rng=random):
         self.clouds = []
 
         for i in range(count):
             self.clouds.append(
-                Cloud((random.random() * 510, random.random() * 510), random.choice(cloud_images),
-                      random.random() * 0.05 + 0.05, random.random() * 0.6 + 0.2))
+                Cloud((rng.random() * 510, rng.random() * 510), rng.choice(cloud_images),
+                      rng.random() * 0.05 + 0.05, rng.random() * 0.6 + 0.2))
 
         self.clouds.sort(key=lambda x: x.depth)
 
@@ -32,6 +35,6 @@ class Clouds:
         for cloud in self.clouds:
             cloud.update()
 
-    def render(self, surf, offset=(0, 0)):
+    def render(self, surf, offset=(0, 0), outlines=None):
         for cloud in self.clouds:
-            cloud.render(surf, offset=offset)
+            cloud.render(surf, offset=offset, outlines=outlines)
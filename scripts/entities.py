@@ -1,7 +1,6 @@
-import random
-
 from scripts.particle import *
 from scripts.spark import *
+from scripts.utils import lerp
 
 
 class PhysicsEntity:
@@ -19,6 +18,8 @@ class PhysicsEntity:
         self.type = e_type
         # 不用元组是因为元组不好更改
         self.pos = list(pos)
+        # 上一次模拟时的位置，画面帧比模拟帧多的时候在两者之间插值
+        self.prev_pos = list(pos)
         self.size = size
         # 位置的改变速度
         self.velocity = [0.0, 0.0]
@@ -46,6 +47,8 @@ class PhysicsEntity:
         :return:
         """
         # 物体的移动取决于强制移动和自身的速度
+        self.prev_pos[0] = self.pos[0]
+        self.prev_pos[1] = self.pos[1]
 
         self.collisions = {"up": False, "down": False, "left": False, "right": False}
         frame_movement = (
@@ -53,31 +56,13 @@ class PhysicsEntity:
             movement[1] + self.velocity[1],
         )
 
-        self.pos[0] += frame_movement[0]
-
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[0] > 0:
-                    entity_rect.right = rect.left
-                    self.collisions["right"] = True
-                if frame_movement[0] < 0:
-                    entity_rect.left = rect.right
-                    self.collisions["left"] = True
-                self.pos[0] = entity_rect.x
-
-        self.pos[1] += frame_movement[1]
-
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[1] > 0:
-                    entity_rect.bottom = rect.top
-                    self.collisions["down"] = True
-                if frame_movement[1] < 0:
-                    entity_rect.top = rect.bottom
-                    self.collisions["up"] = True
-                self.pos[1] = entity_rect.y
+        self.pos[0], hit = tilemap.sweep(self.pos, self.size, 0, frame_movement[0])
+        if hit:
+            self.collisions["right" if frame_movement[0] > 0 else "left"] = True
+
+        self.pos[1], hit = tilemap.sweep(self.pos, self.size, 1, frame_movement[1])
+        if hit:
+            self.collisions["down" if frame_movement[1] > 0 else "up"] = True
 
         if movement[0] > 0:
             self.flip = False
@@ -93,14 +78,26 @@ class PhysicsEntity:
 
         self.animation.update()
 
-    def render(self, surf, offset=(0, 0)):
-        surf.blit(
-            pygame.transform.flip(self.animation.img(), self.flip, False),
-            (
-                self.pos[0] - offset[0] + self.anim_offset[0],
-                self.pos[1] - offset[1] + self.anim_offset[1],
-            ),
+    def render_pos(self, alpha=1.0):
+        """
+        :param alpha: 0是上一次模拟的位置，1是现在的位置
+        :return: 插值后的位置
+        """
+        return lerp(self.prev_pos[0], self.pos[0], alpha), lerp(self.prev_pos[1], self.pos[1], alpha)
+
+    def render(self, surf, offset=(0, 0), outlines=None, alpha=1.0):
+        """
+        :param outlines: Outlines，不是None就顺便画上预先算好的描边
+        :param alpha: 在上一次和这一次模拟的位置之间插值
+        """
+        x, y = self.render_pos(alpha)
+        pos = (
+            x - offset[0] + self.anim_offset[0],
+            y - offset[1] + self.anim_offset[1],
         )
+        surf.blit(self.animation.img(self.flip), pos)
+        if outlines:
+            outlines.draw(self.animation.img(), pos, self.flip)
         # surf.blit(self.game.assets['player'], (self.pos[0] - offset[0], self.pos[1] - offset[1]))
 
 
@@ -113,7 +110,7 @@ class Enemy(PhysicsEntity):
     def update(self, tilemap, movement=(0, 0)):
         if self.walking:
             # 往前后看7个像素，就是判断前方还有没有路，有就继续走，没有就得转向了，敌人
-            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
+            if tilemap.is_solid((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
                 if self.collisions['right'] or self.collisions['left']:
                     self.flip = not self.flip
                 else:
@@ -126,21 +123,14 @@ class Enemy(PhysicsEntity):
                 # 如果在差不多同一行
                 if abs(dis[1]) < 16:
                     # 敌人朝左边，玩家也在敌人左边
+                    # 音效和火花在game.projectile_spawned里面
                     if self.flip and dis[0] < 0:
-                        self.game.sfx['shoot'].play()
-                        self.game.projectiles.append([[self.rect().centerx - 7, self.rect().centery], -1.5, 0])
-                        for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5 + math.pi,
-                                                          2 + random.random()))
+                        self.game.projectiles.spawn((self.rect().centerx - 7, self.rect().centery), -1.5)
                     if not self.flip and dis[0] > 0:
-                        self.game.sfx['shoot'].play()
-                        self.game.projectiles.append([[self.rect().centerx + 7, self.rect().centery], 1.5, 0])
-                        for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5,
-                                                          2 + random.random()))
+                        self.game.projectiles.spawn((self.rect().centerx + 7, self.rect().centery), 1.5)
 
-        elif random.random() < 0.01:
-            self.walking = random.randint(30, 120)
+        elif self.game.rng.random() < 0.01:
+            self.walking = self.game.rng.randint(30, 120)
 
         super().update(tilemap, movement=movement)
 
@@ -148,31 +138,34 @@ class Enemy(PhysicsEntity):
             self.set_action('run')
         else:
             self.set_action('idle')
-        if abs(self.game.player.dashing) >= 50:
+        if self in self.game.dash_targets:
             if self.rect().colliderect(self.game.player.rect()):
                 self.game.sfx['hit'].play()
                 self.game.screen_shake = max(16, self.game.screen_shake)
                 for i in range(15):
-                    angle = random.random() * math.pi * 2
-                    speed = random.random() * 5
-                    self.game.sparks.append(Spark(self.rect().center, angle, 2 + random.random()))
-                    self.game.particles.append(Particle(self.game, 'particle', self.rect().center,
-                                                        velocity=[math.cos(angle + math.pi) * speed * 0.5,
-                                                                  math.sin(angle + math.pi) * speed * 0.5],
-                                                        frame=random.randint(0, 7)))
-                self.game.sparks.append(Spark(self.rect().center, 0, 5 + random.random()))
-                self.game.sparks.append(Spark(self.rect().center, math.pi, 5 + random.random()))
+                    angle = self.game.rng.random() * math.pi * 2
+                    speed = self.game.rng.random() * 5
+                    self.game.sparks.spawn(self.rect().center, angle, 2 + self.game.rng.random())
+                    self.game.particles.spawn('particle', self.rect().center,
+                                              velocity=[math.cos(angle + math.pi) * speed * 0.5,
+                                                        math.sin(angle + math.pi) * speed * 0.5],
+                                              frame=self.game.rng.randint(0, 7))
+                self.game.sparks.spawn(self.rect().center, 0, 5 + self.game.rng.random())
+                self.game.sparks.spawn(self.rect().center, math.pi, 5 + self.game.rng.random())
                 return True
 
-    def render(self, surf, offset=(0, 0)):
-        super().render(surf, offset=offset)
+    def render(self, surf, offset=(0, 0), outlines=None, alpha=1.0):
+        super().render(surf, offset=offset, outlines=outlines, alpha=alpha)
 
+        rect = pygame.Rect(self.render_pos(alpha), self.size)
         if self.flip:
-            surf.blit(pygame.transform.flip(self.game.assets['gun'], True, False), (
-                self.rect().centerx - 2 - self.game.assets['gun'].get_width() - offset[0],
-                self.rect().centery - offset[1]))
+            pos = (rect.centerx - 2 - self.game.assets['gun'].get_width() - offset[0], rect.centery - offset[1])
+            surf.blit(self.game.assets['gun/flip'], pos)
         else:
-            surf.blit(self.game.assets['gun'], (self.rect().centerx + 2 - offset[0], self.rect().centery - offset[1]))
+            pos = (rect.centerx + 2 - offset[0], rect.centery - offset[1])
+            surf.blit(self.game.assets['gun'], pos)
+        if outlines:
+            outlines.draw(self.game.assets['gun'], pos, self.flip)
 
 
 class Player(PhysicsEntity):
@@ -234,20 +227,20 @@ class Player(PhysicsEntity):
         # 产生开始和结束的爆炸粒子效果
         if abs(self.dashing) in {60, 50}:
             for i in range(20):
-                angle = random.random() * 2 * math.pi
-                speed = random.random() * 0.5 + 0.5
+                angle = self.game.rng.random() * 2 * math.pi
+                speed = self.game.rng.random() * 0.5 + 0.5
                 pvelocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-                self.game.particles.append(
-                    Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+                self.game.particles.spawn('particle', self.rect().center, velocity=pvelocity,
+                                          frame=self.game.rng.randint(0, 7))
         if abs(self.dashing) > 50:
             # 用除法取方向然后乘8
             self.velocity[0] = abs(self.dashing) / self.dashing * 8
             # 当冲刺前十帧播放完迅速把速度减下来
             if abs(self.dashing) == 51:
                 self.velocity[0] *= 0.1
-            pvelocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
-            self.game.particles.append(
-                Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+            pvelocity = [abs(self.dashing) / self.dashing * self.game.rng.random() * 3, 0]
+            self.game.particles.spawn('particle', self.rect().center, velocity=pvelocity,
+                                      frame=self.game.rng.randint(0, 7))
         if self.dashing > 0:
             self.dashing = max(0, self.dashing - 1)
         if self.dashing < 0:
@@ -282,9 +275,9 @@ class Player(PhysicsEntity):
             self.air_time = 5
             return True
 
-    def render(self, surf, offset=(0, 0)):
+    def render(self, surf, offset=(0, 0), outlines=None, alpha=1.0):
         if abs(self.dashing) <= 50:
-            super().render(surf, offset=offset)
+            super().render(surf, offset=offset, outlines=outlines, alpha=alpha)
         else:
             pass
 
@@ -0,0 +1,145 @@
+from array import array
+
+from scripts.tilemap import unpack_loc
+
+# 撤销记录最多记多少个格子的改动，超了就从最早的操作开始丢
+JOURNAL_LIMIT = 200000
+# 格子原来是空的/被删掉了
+EMPTY = -1
+
+
+class Edit:
+    """
+    一次操作(按下鼠标到松开、按一次T)改了哪些东西。格子的改动存成三个整数数组，每格只占十几个字节
+    """
+
+    def __init__(self):
+        # 压好的坐标，改之前和改之后的code，EMPTY表示没有tile
+        self.keys = array('q')
+        self.before = array('i')
+        self.after = array('i')
+        # 装饰物的改动 [(tile字典, 序号, True是放下False是删掉)]
+        self.offgrid = []
+
+    def __len__(self):
+        return len(self.keys) + len(self.offgrid)
+
+
+class EditJournal:
+    """
+    编辑器的撤销/重做记录。TileMap每改一格就记一笔(格子, 改之前, 改之后)，
+    commit把记下的改动收成一次操作，撤销的时候整次操作倒着改回去
+    """
+
+    def __init__(self, limit=JOURNAL_LIMIT):
+        """
+        :param limit: 撤销和重做记录加起来最多记多少个改动，至少会留最近的一次操作
+        """
+        self.limit = limit
+        self.done = []
+        self.undone = []
+        # 还没commit的操作
+        self.current = Edit()
+        # 记录里一共有多少个改动
+        self.size = 0
+        # 每commit、撤销、重做一次加一，和存盘时候的比一下就知道有没有没存的改动
+        self.version = 0
+
+    def cell(self, key, before, after):
+        """
+        :param before: 改之前的code，None表示原来是空的
+        :param after: 改之后的code，None表示删掉了
+        """
+        edit = self.current
+        edit.keys.append(key)
+        edit.before.append(EMPTY if before is None else before)
+        edit.after.append(EMPTY if after is None else after)
+
+    def offgrid(self, tile, seq, added):
+        """
+        :param seq: 装饰物在TileMap里画的顺序，撤销的时候放回原来的位置
+        """
+        self.current.offgrid.append((tile, seq, added))
+
+    def commit(self):
+        """
+        把记下的改动收成一次操作，什么都没改就不算
+        :return: 有没有新的操作
+        """
+        edit = self.current
+        if not len(edit):
+            return False
+        self.current = Edit()
+        self.done.append(edit)
+        self.size += len(edit)
+        # 有新的操作以后原来撤销掉的就不能重做了
+        for undone in self.undone:
+            self.size -= len(undone)
+        self.undone = []
+        self.trim()
+        self.version += 1
+        return True
+
+    def trim(self):
+        # 从最早的操作开始丢，最近的一次操作再大也留着
+        drop = 0
+        while self.size > self.limit and drop < len(self.done) - 1:
+            self.size -= len(self.done[drop])
+            drop += 1
+        del self.done[:drop]
+
+    def undo(self, tilemap):
+        """
+        :return: 有没有撤销
+        """
+        self.commit()
+        if not self.done:
+            return False
+        edit = self.done.pop()
+        self.apply(tilemap, edit, True)
+        self.undone.append(edit)
+        self.version += 1
+        return True
+
+    def redo(self, tilemap):
+        """
+        :return: 有没有重做
+        """
+        self.commit()
+        if not self.undone:
+            return False
+        edit = self.undone.pop()
+        self.apply(tilemap, edit, False)
+        self.done.append(edit)
+        self.version += 1
+        return True
+
+    def apply(self, tilemap, edit, reverse):
+        # 改回去的时候不能再记到撤销记录里
+        journal = tilemap.journal
+        tilemap.journal = None
+        if reverse:
+            for tile, seq, added in reversed(edit.offgrid):
+                if added:
+                    tilemap.remove_offgrid(tile)
+                else:
+                    tilemap.add_offgrid(tile, seq)
+            # 同一格可能改了好几次，倒着改回去最后留下的是最早的before
+            for i in range(len(edit.keys) - 1, -1, -1):
+                self.put(tilemap, edit.keys[i], edit.before[i])
+        else:
+            for i in range(len(edit.keys)):
+                self.put(tilemap, edit.keys[i], edit.after[i])
+            for tile, seq, added in edit.offgrid:
+                if added:
+                    tilemap.add_offgrid(tile, seq)
+                else:
+                    tilemap.remove_offgrid(tile)
+        tilemap.journal = journal
+
+    def put(self, tilemap, key, code):
+        tile_pos = unpack_loc(key)
+        if code == EMPTY:
+            tilemap.remove_tile(tile_pos)
+        else:
+            tilemap.set_tile(tile_pos, tilemap.tile_types[code >> 8], code & 0xFF)
@@ -0,0 +1,165 @@
+import io
+import os
+import threading
+
+import pygame
+
+from scripts.tilemap import TileMap
+from scripts.world import WorldStream, WORLD_EXT
+
+
+class PreparedLevel:
+    """
+    读好的一关：地图已经建好索引，树和出生点都已经提取出来，音乐已经读进内存。
+    流式关卡的stream不是None，出生点附近的块已经读好了，树和敌人跟着块读进来
+    """
+
+    def __init__(self, map_id, tilemap, trees, spawners, music, music_hint, stream=None):
+        self.map_id = map_id
+        self.tilemap = tilemap
+        self.trees = trees
+        self.spawners = spawners
+        self.music = music
+        self.music_hint = music_hint
+        self.stream = stream
+
+
+class LevelLoader:
+    """
+    在后台线程里提前读关卡，切关的时候直接拿读好的结果，主线程里只剩创建敌人和换音乐
+    """
+
+    def __init__(self, game, threaded=True, map_dir='assets/maps/'):
+        """
+        :param threaded: False则不预读，take的时候当场读(和原来一样)
+        :param map_dir: 地图目录，里面是0.json(或者0.map、0.world)、1.json...
+        """
+        self.game = game
+        self.threaded = threaded
+        self.map_dir = map_dir
+        # map_id -> PreparedLevel，每份只能用一次(提取出生点会改地图)
+        self.ready = {}
+        # map_id -> 还在读的线程
+        self.pending = {}
+        # 只留着这几关读好的结果，None表示都留着；读完的时候已经不要了的直接丢掉
+        self.wanted = None
+        # 音乐文件只读一次，之后每次用新的BytesIO包一下
+        self.music_bytes = {}
+        self.lock = threading.Lock()
+
+    def map_path(self, map_id):
+        # 有流式关卡.world就读.world，再是二进制的.map，否则读.json
+        path = self.map_dir + str(map_id)
+        for ext in [WORLD_EXT, '.map']:
+            if os.path.exists(path + ext):
+                return path + ext
+        return path + '.json'
+
+    def build(self, map_id):
+        tilemap = TileMap(self.game, tile_size=16)
+        path = self.map_path(map_id)
+        stream = None
+        if path.endswith(WORLD_EXT):
+            stream = WorldStream(tilemap, path)
+            trees = []
+            spawners = stream.player_spawners
+            # 出生点附近的块在后台先读好，切关的时候不用当场读
+            for spawner in spawners:
+                view = pygame.Rect((0, 0), self.game.displayer.get_size())
+                view.center = (spawner['pos'][0] + self.game.player.size[0] // 2,
+                               spawner['pos'][1] + self.game.player.size[1] // 2)
+                stream.update(view, view, budget=-1)
+        else:
+            tilemap.load(path)
+            trees = tilemap.extract([("large_decor", 2)], keep=True)
+            spawners = tilemap.extract([("spawners", 0), ("spawners", 1)], keep=False)
+        music = music_hint = None
+        if not self.game.headless:
+            music_path = self.game.music[map_id % len(self.game.music)]
+            with self.lock:
+                data = self.music_bytes.get(music_path)
+            if data is None:
+                f = open(music_path, 'rb')
+                data = f.read()
+                f.close()
+                with self.lock:
+                    self.music_bytes[music_path] = data
+            music = io.BytesIO(data)
+            music_hint = os.path.splitext(music_path)[1][1:]
+        return PreparedLevel(map_id, tilemap, trees, spawners, music, music_hint, stream)
+
+    def work(self, map_id):
+        try:
+            level = self.build(map_id)
+            with self.lock:
+                if self.wanted is None or map_id in self.wanted:
+                    self.ready[map_id] = level
+                    level = None
+            if level is not None:
+                self.release(level)
+        finally:
+            # 读失败了take的时候会在主线程里再读一次，把错误报出来
+            with self.lock:
+                del self.pending[map_id]
+
+    def prepare(self, map_id):
+        """
+        开始在后台读map_id这一关，已经在读或者读好了就不管
+        """
+        if not self.threaded or not os.path.exists(self.map_path(map_id)):
+            return
+        with self.lock:
+            if map_id in self.pending or map_id in self.ready:
+                return
+            thread = threading.Thread(target=self.work, args=(map_id,), daemon=True)
+            self.pending[map_id] = thread
+        thread.start()
+
+    def wait(self):
+        """
+        等所有后台读取完成
+        """
+        with self.lock:
+            threads = list(self.pending.values())
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def release(level):
+        # 流式关卡开着mmap，不用了要关掉
+        if level.stream is not None:
+            level.stream.close()
+
+    def keep(self, map_ids):
+        """
+        只留着map_ids这几关读好的结果，别的丢掉，比如过关以后上一关重开用的那份
+        """
+        with self.lock:
+            self.wanted = set(map_ids)
+            dropped = [self.ready.pop(map_id) for map_id in list(self.ready) if map_id not in self.wanted]
+        for level in dropped:
+            self.release(level)
+
+    def clear(self):
+        """
+        丢掉所有读好的关卡，比如换了map_dir以后
+        """
+        self.wait()
+        for level in self.ready.values():
+            self.release(level)
+        self.ready = {}
+
+    def take(self, map_id):
+        """
+        拿走读好的一关，还没读完就等它读完，没预读过就当场读
+        :return: PreparedLevel
+        """
+        with self.lock:
+            thread = self.pending.get(map_id)
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            level = self.ready.pop(map_id, None)
+        if level is None:
+            level = self.build(map_id)
+        return level
@@ -0,0 +1,227 @@
+"""
+二进制地图格式(.map)，比json小很多，读的时候用mmap直接把文件里的数组当列表用，不为每个tile建字典。
+mmap只是省掉解析和复制，TileMap.load_binary还是一次把整张网格建成dict，不是用到哪读到哪；
+很大的关卡只读画面附近的块用流式关卡(.world，scripts/world.py)
+文件结构(小端)：
+  头    : magic b'NJMP', 版本 u16, tile_size u16, 类型数 u16, 网格tile数 u32, 装饰物数 u32
+  类型表: 每个类型 u8长度 + utf-8名字，类型编号就是在表里的下标
+  网格  : x int32 * n, y int32 * n, code u16 * n
+  装饰物: x float64 * m, y float64 * m, code u16 * m
+code是 类型编号 << 8 | variant，和TileMap.grid里的一样。每一块都从8字节对齐的位置开始
+用法(在项目根目录)：
+python -m scripts.mapfile to-binary assets/maps/0.json [out.map]
+python -m scripts.mapfile to-json 0.map [out.json]
+python -m scripts.mapfile check assets/maps/*.json     json -> map -> json 来回转换，内容不一样就返回1
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+MAGIC = b'NJMP'
+VERSION = 1
+MAP_EXT = '.map'
+HEADER = struct.Struct('<4sHHHII')
+
+
+def align(n):
+    return (n + 7) & ~7
+
+
+def is_map_file(path):
+    f = open(path, 'rb')
+    magic = f.read(len(MAGIC))
+    f.close()
+    return magic == MAGIC
+
+
+def as_array(view, typecode):
+    """
+    把一段bytes当成typecode类型的数组，小端机器上直接cast不复制
+    """
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    values = array(typecode)
+    values.frombytes(view)
+    values.byteswap()
+    return values
+
+
+def to_bytes(values, typecode):
+    values = array(typecode, values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+class MapFile:
+    """
+    mmap打开的地图，grid_x/grid_y/grid_code/offgrid_x/offgrid_y/offgrid_code都是直接指向文件的数组，
+    用完要close
+    """
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.close()
+        self.view = memoryview(self.buffer)
+        if len(self.buffer) < HEADER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(path + ' 不是地图文件')
+        magic, version, self.tile_size, type_count, grid_count, offgrid_count = HEADER.unpack_from(self.buffer)
+        if version != VERSION:
+            self.close()
+            raise ValueError(path + ' 的版本是%d，只支持%d' % (version, VERSION))
+        self.size = len(self.buffer)
+        try:
+            offset = HEADER.size
+            self.types = []
+            for _ in range(type_count):
+                if offset >= self.size or offset + 1 + self.buffer[offset] > self.size:
+                    raise ValueError(path + ' 被截断了')
+                length = self.buffer[offset]
+                self.types.append(bytes(self.view[offset + 1:offset + 1 + length]).decode('utf-8'))
+                offset += 1 + length
+            offset = align(offset)
+            self.grid_x, offset = self.block(path, offset, grid_count, 'i')
+            self.grid_y, offset = self.block(path, offset, grid_count, 'i')
+            self.grid_code, offset = self.block(path, offset, grid_count, 'H')
+            self.offgrid_x, offset = self.block(path, offset, offgrid_count, 'd')
+            self.offgrid_y, offset = self.block(path, offset, offgrid_count, 'd')
+            self.offgrid_code, offset = self.block(path, offset, offgrid_count, 'H')
+        except ValueError:
+            self.close()
+            raise
+
+    def block(self, path, offset, count, typecode):
+        """
+        :return: (从offset开始count个typecode的数组, 下一块的位置)，文件不够长就抛ValueError
+        """
+        end = offset + count * array(typecode).itemsize
+        if end > self.size:
+            raise ValueError(path + ' 被截断了')
+        return as_array(self.view[offset:end], typecode), align(end)
+
+    def offgrid(self):
+        """
+        :return: 和json里一样的装饰物字典列表
+        """
+        types = self.types
+        return [{'type': types[code >> 8], 'variant': code & 0xFF, 'pos': [x, y]}
+                for x, y, code in zip(self.offgrid_x, self.offgrid_y, self.offgrid_code)]
+
+    def close(self):
+        # cast出来的数组也引用着mmap，要先释放
+        for name in ['grid_x', 'grid_y', 'grid_code', 'offgrid_x', 'offgrid_y', 'offgrid_code']:
+            values = getattr(self, name, None)
+            if isinstance(values, memoryview):
+                values.release()
+        self.view.release()
+        self.buffer.close()
+
+
+def write(path, tile_size, types, grid, offgrid):
+    """
+    :param types: 类型名字列表
+    :param grid: (x列表, y列表, code列表)，按这个顺序写
+    :param offgrid: (x列表, y列表, code列表)
+    """
+    chunks = [HEADER.pack(MAGIC, VERSION, tile_size, len(types), len(grid[0]), len(offgrid[0]))]
+    for name in types:
+        encoded = name.encode('utf-8')
+        chunks.append(bytes([len(encoded)]) + encoded)
+    for values, typecode in zip(grid + offgrid, ['i', 'i', 'H', 'd', 'd', 'H']):
+        size = sum(len(chunk) for chunk in chunks)
+        chunks.append(b'\0' * (align(size) - size))
+        chunks.append(to_bytes(values, typecode))
+    f = open(path, 'wb')
+    f.write(b''.join(chunks))
+    f.close()
+
+
+def write_map_data(path, map_data):
+    """
+    把json格式的地图字典写成二进制，网格tile的顺序和字典里一样
+    """
+    types = []
+    type_ids = {}
+
+    def code(tile):
+        if tile['type'] not in type_ids:
+            type_ids[tile['type']] = len(types)
+            types.append(tile['type'])
+        return type_ids[tile['type']] << 8 | tile['variant']
+
+    tiles = list(map_data['tilemap'].values())
+    grid = ([tile['pos'][0] for tile in tiles], [tile['pos'][1] for tile in tiles], [code(tile) for tile in tiles])
+    offgrid = ([tile['pos'][0] for tile in map_data['offgrid']], [tile['pos'][1] for tile in map_data['offgrid']],
+               [code(tile) for tile in map_data['offgrid']])
+    write(path, map_data['tile_size'], types, grid, offgrid)
+
+
+def read_map_data(path):
+    """
+    :return: 和json格式一样的地图字典
+    """
+    map_file = MapFile(path)
+    types = map_file.types
+    tilemap = {}
+    for x, y, code in zip(map_file.grid_x, map_file.grid_y, map_file.grid_code):
+        tilemap[str(x) + ';' + str(y)] = {'type': types[code >> 8], 'variant': code & 0xFF, 'pos': [x, y]}
+    map_data = {'tilemap': tilemap, 'tile_size': map_file.tile_size, 'offgrid': map_file.offgrid()}
+    map_file.close()
+    return map_data
+
+
+def check(path):
+    """
+    json -> map -> json，比较内容是否一样
+    :return: 一样返回True
+    """
+    f = open(path, 'r')
+    map_data = json.load(f)
+    f.close()
+    fd, tmp = tempfile.mkstemp(suffix=MAP_EXT)
+    os.close(fd)
+    try:
+        write_map_data(tmp, map_data)
+        size = os.path.getsize(tmp)
+        same = read_map_data(tmp) == map_data
+    finally:
+        os.remove(tmp)
+    print('%s %s: %d -> %d bytes' % ('ok  ' if same else 'FAIL', path, os.path.getsize(path), size))
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command in ['to-binary', 'to-json']:
+        p = sub.add_parser(command)
+        p.add_argument('src')
+        p.add_argument('dst', nargs='?')
+    p = sub.add_parser('check')
+    p.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        results = [check(path) for path in args.paths]
+        sys.exit(0 if all(results) else 1)
+    stem = args.src.rsplit('.', 1)[0]
+    if args.command == 'to-binary':
+        f = open(args.src, 'r')
+        map_data = json.load(f)
+        f.close()
+        write_map_data(args.dst or stem + MAP_EXT, map_data)
+    else:
+        f = open(args.dst or stem + '.json', 'w')
+        json.dump(read_map_data(args.src), f)
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,130 @@
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=(0, 0), frame=0):
+import math
+from collections import deque
+from itertools import compress
+
+
+class Particles:
+    """
+    所有粒子放在一起管理，每个属性一个列表(而不是每个粒子一个对象)。
+    粒子只记出生时的位置、速度和出生的时间，之后的位置、动画帧都由年龄(出生后update了几步)查表算出来，
+    update不用挨个碰粒子，只数一下这一步死了几个，死的多了再一次性去掉
+    """
+
+    def __init__(self, game):
         self.game = game
-        self.type = p_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets["particle/" + p_type].copy()
-        self.animation_frame = frame
+        # update了几步
+        self.time = 0
+        self.x = []
+        self.y = []
+        self.vx = []
+        self.vy = []
+        self.birth = []
+        self.kind = []
+        self.kind_ids = {}
+        self.kind_names = []
+        # 每种粒子一张表，下标是年龄，值是(图片, 半宽, 半高)。最后一帧画两次(和原来一样)，年龄超过表的长度就死了
+        self.frame_tables = []
+        # 每种粒子一张表，下标是年龄，值是到这个年龄为止左右摇摆累计挪了多少，只有叶子有
+        self.sway_tables = []
+        # 每种粒子按时间顺序的[出生的time, 这一步出生了几个]，同一种粒子活得一样长，从前面开始死
+        self.births = []
+        # 已经死了但还留在列表里的粒子数
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.x) - self.dead
+
+    def kind_id(self, p_type):
+        if p_type not in self.kind_ids:
+            animation = self.game.assets["particle/" + p_type]
+            last = animation.img_duration * len(animation.images) - 1
+            table = []
+            sway = []
+            offset = 0
+            for age in range(last + 2):
+                # 动画停在最后一帧，停在最后一帧以后的那一步画完就死
+                img = animation.images[min(age, last) // animation.img_duration]
+                table.append((img, img.get_width() // 2, img.get_height() // 2))
+                sway.append(offset)
+                # 模拟左右摇摆：画完以后按这一步的动画帧往旁边挪一点
+                if p_type == 'leaf' and age:
+                    offset += math.sin(min(age, last) * 0.035) * 0.3
+            self.kind_ids[p_type] = len(self.kind_names)
+            self.kind_names.append(p_type)
+            self.frame_tables.append(table)
+            self.sway_tables.append(sway)
+            self.births.append(deque())
+        return self.kind_ids[p_type]
+
+    def spawn(self, p_type, pos, velocity=(0, 0), frame=0):
+        """
+        :param p_type: 粒子类型，对应assets里面的particle/p_type
+        :param frame: 和原来的Particle一样只是记下来，动画都从第0帧开始
+        """
+        kind = self.kind_id(p_type)
+        self.x.append(pos[0])
+        self.y.append(pos[1])
+        self.vx.append(velocity[0])
+        self.vy.append(velocity[1])
+        self.birth.append(self.time)
+        self.kind.append(kind)
+        births = self.births[kind]
+        if births and births[-1][0] == self.time:
+            births[-1][1] += 1
+        else:
+            births.append([self.time, 1])
+
+    def clear(self):
+        for values in [self.x, self.y, self.vx, self.vy, self.birth, self.kind]:
+            values.clear()
+        for births in self.births:
+            births.clear()
+        self.dead = 0
 
     def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+        self.time += 1
+        for kind, births in enumerate(self.births):
+            end = len(self.frame_tables[kind])
+            while births and self.time - births[0][0] >= end:
+                self.dead += births.popleft()[1]
+        if self.dead and self.dead * 2 >= len(self.x):
+            self.compact()
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+    def compact(self):
+        # 去掉死掉的粒子，顺序不变
+        time = self.time
+        ends = [len(table) for table in self.frame_tables]
+        alive = [time - birth < ends[kind] for birth, kind in zip(self.birth, self.kind)]
+        self.x = list(compress(self.x, alive))
+        self.y = list(compress(self.y, alive))
+        self.vx = list(compress(self.vx, alive))
+        self.vy = list(compress(self.vy, alive))
+        self.birth = list(compress(self.birth, alive))
+        self.kind = list(compress(self.kind, alive))
+        self.dead = 0
 
-        self.animation.update()
-        return kill
+    def positions(self):
+        """
+        :return: 活着的粒子现在的位置[(x, y)]，按生成顺序
+        """
+        time = self.time
+        frames, sways = self.frame_tables, self.sway_tables
+        return [(x + vx * (time - birth) + sways[kind][time - birth], y + vy * (time - birth))
+                for x, y, vx, vy, birth, kind in zip(self.x, self.y, self.vx, self.vy, self.birth, self.kind)
+                if time - birth < len(frames[kind])]
 
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        surf.blit(
-            img,
-            (
-                self.pos[0] - offset[0] - img.get_width() // 2,
-                self.pos[1] - offset[1] - img.get_height() // 2
-            )
-        )
+        time = self.time
+        # 每种粒子每个年龄的(图片, x要加的, y要加的)，表很短，每次画之前算一遍，每个粒子只剩乘加
+        tables = [[(img, sway[age] - offset[0] - half_w, -offset[1] - half_h)
+                   for age, (img, half_w, half_h) in enumerate(frames)]
+                  for frames, sway in zip(self.frame_tables, self.sway_tables)]
+        ends = [len(table) for table in tables]
+        blits = []
+        append = blits.append
+        for x, y, vx, vy, birth, kind in zip(self.x, self.y, self.vx, self.vy, self.birth, self.kind):
+            age = time - birth
+            if age < ends[kind]:
+                img, dx, dy = tables[kind][age]
+                append((img, (x + vx * age + dx, y + vy * age + dy)))
+        surf.blits(blits, doreturn=False)
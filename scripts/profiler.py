@@ -0,0 +1,155 @@
+import csv
+import json
+import time
+from collections import deque
+
+import pygame
+
+# 叠加层的颜色
+PANEL_COLOR = (0, 0, 0, 170)
+TEXT_COLOR = (255, 255, 255)
+GRAPH_COLOR = (80, 220, 80)
+SLOW_COLOR = (230, 60, 60)
+# 柱状图里这条线代表60帧的16.7ms
+BUDGET_MS = 1000 / 60
+
+
+class AllocCounter:
+    """
+    新建Surface、Mask的地方调用alloc_counter.add()记一笔(复制、subsurface、翻转、文字、mask转图片都算)，
+    不开性能分析的时候只判断一次enabled就返回。不替换pygame里的类和函数，已经建好的Surface不受影响
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.count = 0
+
+    def add(self, count=1):
+        if self.enabled:
+            self.count += count
+
+
+alloc_counter = AllocCounter()
+
+
+class Profiler:
+    """
+    每帧按顺序在各个阶段结束的时候调用lap(名字)，记下这一段花了多少毫秒，同名的多次调用会累加(比如一帧跑了好几步模拟)。
+    关着的时候每个调用只判断一次enabled就返回
+    """
+
+    def __init__(self, history=300, export_path=None, export_every=300):
+        """
+        :param history: 保留最近多少帧
+        :param export_path: 不是None就每export_every帧把最近history帧写到这个文件，.csv结尾写csv，否则写json
+        """
+        self.enabled = False
+        self.history = deque(maxlen=history)
+        self.export_path = export_path
+        self.export_every = export_every
+        self.frames = 0
+        self.stages = {}
+        # 阶段名按第一次出现的顺序排，叠加层和csv的列都用这个顺序
+        self.stage_names = []
+        self.frame_start = 0.0
+        self.last = 0.0
+        # 一帧中间(比如处理按键的时候)打开的，这一帧前半段没量到，不记
+        self.partial = False
+        self.font = None
+
+    def toggle(self):
+        self.set_enabled(not self.enabled)
+
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        # 这一帧新建了多少Surface，开着的时候才统计
+        alloc_counter.enabled = enabled
+        if enabled:
+            self.stages = {}
+            alloc_counter.count = 0
+            self.frame_start = self.last = time.perf_counter()
+            self.partial = True
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.stages = {}
+        alloc_counter.count = 0
+        self.frame_start = self.last = time.perf_counter()
+        self.partial = False
+
+    def lap(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if name not in self.stages:
+            self.stages[name] = 0.0
+            if name not in self.stage_names:
+                self.stage_names.append(name)
+        self.stages[name] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self, counts):
+        """
+        :param counts: 这一帧要记下来的数量，比如{'enemies': 3}
+        """
+        if not self.enabled:
+            return
+        if self.partial:
+            self.partial = False
+            return
+        row = {'frame': self.frames, 'total_ms': (time.perf_counter() - self.frame_start) * 1000}
+        row.update(self.stages)
+        row['allocs'] = alloc_counter.count
+        row.update(counts)
+        self.history.append(row)
+        self.frames += 1
+        if self.export_path and self.frames % self.export_every == 0:
+            self.export(self.export_path)
+
+    def export(self, path):
+        rows = list(self.history)
+        if not rows:
+            return
+        f = open(path, 'w', newline='')
+        if path.endswith('.csv'):
+            fields = ['frame', 'total_ms'] + self.stage_names + [key for key in rows[-1]
+                                                                 if key not in self.stage_names
+                                                                 and key not in ('frame', 'total_ms')]
+            writer = csv.DictWriter(f, fieldnames=fields, restval=0)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, f)
+        f.close()
+
+    def draw(self, surf):
+        """
+        右上角画最近120帧的帧时间柱状图和上一帧每个阶段的毫秒数、数量
+        """
+        if not self.enabled or not self.history:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font("assets/font/Uranus_Pixel_11Px.ttf", 11)
+        row = self.history[-1]
+        lines = ['frame %6.2f ms' % row['total_ms']]
+        lines += ['%-12s %6.2f' % (name, row[name]) for name in self.stage_names if name in row]
+        lines += ['%-12s %6d' % (key, value) for key, value in row.items()
+                  if key not in self.stage_names and key not in ('frame', 'total_ms')]
+        graph_w, graph_h = 120, 40
+        line_h = self.font.get_linesize()
+        panel = pygame.Rect(surf.get_width() - 140, 20, 136, graph_h + 8 + line_h * len(lines))
+        surf.fill(PANEL_COLOR, panel)
+        # 每帧一根柱子，高度是帧时间，超过BUDGET_MS标红
+        frames = list(self.history)[-graph_w:]
+        for i, frame in enumerate(frames):
+            h = min(graph_h, int(frame['total_ms'] / (BUDGET_MS * 2) * graph_h))
+            color = SLOW_COLOR if frame['total_ms'] > BUDGET_MS else GRAPH_COLOR
+            surf.fill(color, (panel.x + 8 + i, panel.y + 4 + graph_h - h, 1, h))
+        budget_y = panel.y + 4 + graph_h // 2
+        surf.fill(TEXT_COLOR, (panel.x + 8, budget_y, graph_w, 1))
+        alloc_counter.add(len(lines))
+        for i, line in enumerate(lines):
+            surf.blit(self.font.render(line, False, TEXT_COLOR), (panel.x + 4, panel.y + graph_h + 8 + i * line_h))
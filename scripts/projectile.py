@@ -0,0 +1,100 @@
+from scripts.tilemap import LOC_MASK
+
+# 子弹飞多少帧后消失
+PROJECTILE_LIFETIME = 240
+
+
+class Projectiles:
+    """
+    所有子弹放在预先分配好的几个列表里，前count个位置是活着的子弹。
+    每帧一次循环完成移动、撞墙、超时、打中玩家的判断，死掉的位置直接被后面的子弹覆盖重复使用
+    """
+
+    def __init__(self, capacity=64, on_spawn=None, on_expire=None):
+        """
+        :param capacity: 初始容量，不够会翻倍
+        :param on_spawn: 生成子弹时调用 on_spawn(x, y, direction)
+        :param on_expire: 子弹消失时调用 on_expire(reason, x, y, direction)，reason是'wall'，'timeout'或'hit'
+        """
+        self.capacity = capacity
+        self.x = [0.0] * capacity
+        self.y = [0.0] * capacity
+        self.direction = [0.0] * capacity
+        self.timer = [0] * capacity
+        self.count = 0
+        self.on_spawn = on_spawn
+        self.on_expire = on_expire
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        extra = self.capacity
+        for values, fill in [(self.x, 0.0), (self.y, 0.0), (self.direction, 0.0), (self.timer, 0)]:
+            values.extend([fill] * extra)
+        self.capacity += extra
+
+    def spawn(self, pos, direction):
+        if self.count == self.capacity:
+            self.grow()
+        i = self.count
+        self.x[i] = pos[0]
+        self.y[i] = pos[1]
+        self.direction[i] = direction
+        self.timer[i] = 0
+        self.count += 1
+        if self.on_spawn:
+            self.on_spawn(pos[0], pos[1], direction)
+
+    def clear(self):
+        self.count = 0
+
+    def update(self, tilemap, target=None, covers=None):
+        """
+        移动所有子弹并处理碰撞，顺序和生成顺序一样
+        :param tilemap: 地图，撞到物理方块就消失
+        :param target: 能被打中的Rect，None表示这一帧谁都打不中(比如玩家在冲刺)
+        :param covers: covers(x, y)是False的位置地图还没读进来，子弹这一步不动，None表示整张地图都在
+        :return: None
+        """
+        xs, ys, directions, timers = self.x, self.y, self.direction, self.timer
+        solid = tilemap.solid
+        tile_size = tilemap.tile_size
+        on_expire = self.on_expire
+        alive = 0
+        for i in range(self.count):
+            x = xs[i] + directions[i]
+            y = ys[i]
+            timer = timers[i] + 1
+            if covers is not None and not covers(x, y):
+                x = xs[i]
+                timer = timers[i]
+                reason = None
+            elif (int(x // tile_size) << 32) | (int(y // tile_size) & LOC_MASK) in solid:
+                reason = 'wall'
+            elif timer > PROJECTILE_LIFETIME:
+                reason = 'timeout'
+            elif target is not None and target.collidepoint(x, y):
+                reason = 'hit'
+            else:
+                reason = None
+            if reason is None:
+                # 活着的子弹往前挪，覆盖掉死掉的位置
+                xs[alive] = x
+                ys[alive] = y
+                directions[alive] = directions[i]
+                timers[alive] = timer
+                alive += 1
+                continue
+            if on_expire:
+                on_expire(reason, x, y, directions[i])
+        self.count = alive
+
+    def render(self, surf, img, offset=(0, 0), outlines=None):
+        half_w = img.get_width() / 2 + offset[0]
+        half_h = img.get_height() / 2 + offset[1]
+        positions = [(self.x[i] - half_w, self.y[i] - half_h) for i in range(self.count)]
+        surf.blits([(img, pos) for pos in positions], doreturn=False)
+        if outlines:
+            outline = outlines.get(img)
+            outlines.layer.blits([(outline, (int(x) - 1, int(y) - 1)) for x, y in positions], doreturn=False)
@@ -0,0 +1,140 @@
+"""
+录像(.rep)：记下随机种子、影响模拟的设置和每一步模拟的输入，回放的时候同样的种子加同样的输入，模拟结果完全一样。
+每隔CHECK_INTERVAL步记一次状态哈希，回放的时候对一下，不一样就说明模拟改了或者有没管住的随机数
+文件结构(小端)：
+  头    : magic b'NJRP', 版本 u16, 种子 u64, 步数 u32, 每几步一个哈希 u32, 设置长度 u32
+  设置  : settings.json的内容(utf-8 json)
+  哈希  : 每个8字节，第i个是第(i+1)*间隔步模拟完的state_hash前8字节
+  输入  : zlib压缩的每步1字节，bit0左 bit1右 bit2跳 bit3冲刺，长时间按住同一个键压缩以后很小
+用法：python game.py --record session.rep 录像，python game.py --replay session.rep 按原速回放，
+加 --headless 不开窗口不限帧数快进回放(再加 --profile 导出性能数据)
+"""
+import json
+import struct
+import zlib
+
+MAGIC = b'NJRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHQIII')
+# 每隔几步记一次状态哈希
+CHECK_INTERVAL = 60
+# 录像的时候每隔几步写一次文件，游戏崩了也留着大部分录像
+SAVE_EVERY = 600
+# 每个哈希存几个字节
+CHECK_BYTES = 8
+
+
+def encode_input(frame_input):
+    left, right, jump, dash = frame_input
+    return left | right << 1 | jump << 2 | dash << 3
+
+
+def decode_input(code):
+    return bool(code & 1), bool(code & 2), bool(code & 4), bool(code & 8)
+
+
+class Recorder:
+    """
+    录像：每模拟一步调用一次record
+    """
+
+    def __init__(self, path, seed, settings, check_interval=CHECK_INTERVAL):
+        """
+        :param seed: 游戏的随机种子，0到2^64-1，不能是None
+        :param settings: 读到的settings.json字典，回放的时候用同样的设置
+        """
+        if not 0 <= seed < 1 << 64:
+            raise ValueError('录像的种子要在0到2^64-1之间：%d' % seed)
+        self.path = path
+        self.seed = seed
+        self.settings = settings
+        self.check_interval = check_interval
+        self.inputs = bytearray()
+        self.checks = []
+
+    def record(self, game, frame_input):
+        """
+        :param frame_input: 这一步用的输入(左, 右, 跳, 冲刺)，game.update()已经跑完
+        """
+        self.inputs.append(encode_input(frame_input))
+        if len(self.inputs) % self.check_interval == 0:
+            self.checks.append(bytes.fromhex(game.state_hash())[:CHECK_BYTES])
+        if len(self.inputs) % SAVE_EVERY == 0:
+            self.save()
+
+    def save(self):
+        settings = json.dumps(self.settings).encode('utf-8')
+        f = open(self.path, 'wb')
+        f.write(HEADER.pack(MAGIC, VERSION, self.seed, len(self.inputs), self.check_interval, len(settings)))
+        f.write(settings)
+        f.write(b''.join(self.checks))
+        f.write(zlib.compress(bytes(self.inputs), 9))
+        f.close()
+
+
+class Replay:
+    """
+    读好的录像：input(帧号)拿到这一步的输入，verify在每一步模拟完以后对状态哈希
+    """
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+        if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+            raise ValueError(path + ' 不是录像文件')
+        magic, version, self.seed, self.steps, self.check_interval, settings_size = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(path + ' 的版本是%d，只支持%d' % (version, VERSION))
+        if not self.check_interval:
+            raise ValueError(path + ' 的哈希间隔是0')
+        offset = HEADER.size
+        check_count = self.steps // self.check_interval
+        if offset + settings_size + check_count * CHECK_BYTES > len(data):
+            raise ValueError(path + ' 被截断了')
+        self.settings = json.loads(data[offset:offset + settings_size].decode('utf-8'))
+        offset += settings_size
+        self.checks = [data[offset + i * CHECK_BYTES:offset + (i + 1) * CHECK_BYTES] for i in range(check_count)]
+        offset += check_count * CHECK_BYTES
+        try:
+            self.inputs = zlib.decompress(data[offset:])
+        except zlib.error:
+            raise ValueError(path + ' 被截断了')
+        if len(self.inputs) != self.steps:
+            raise ValueError(path + ' 被截断了')
+        # 对上了几个哈希，第一次对不上是第几步(None表示都对上了)
+        self.matched = 0
+        self.diverged = None
+
+    def input(self, frame):
+        """
+        :param frame: 模拟这一步之前的帧号，从0开始
+        :return: (左, 右, 跳, 冲刺)，录像放完了就是什么都不按
+        """
+        if frame < len(self.inputs):
+            return decode_input(self.inputs[frame])
+        return False, False, False, False
+
+    def finished(self, frame):
+        return frame >= self.steps
+
+    def verify(self, game):
+        """
+        模拟完一步以后调用，到了记哈希的帧就对一下
+        :return: 这一步对得上(或者这一步不用对)就是True
+        """
+        frame = game.frame
+        if not frame or frame % self.check_interval or frame // self.check_interval > len(self.checks):
+            return True
+        if bytes.fromhex(game.state_hash())[:CHECK_BYTES] == self.checks[frame // self.check_interval - 1]:
+            self.matched += 1
+            return True
+        if self.diverged is None:
+            self.diverged = frame
+            print('replay diverged at frame %d' % frame)
+        return False
+
+    def summary(self):
+        if self.diverged is None:
+            return 'replay ok: %d/%d checksums matched' % (self.matched, len(self.checks))
+        return 'replay DIVERGED at frame %d (%d checksums matched before that)' % (self.diverged, self.matched)
@@ -0,0 +1,196 @@
+import math
+
+import pygame
+
+# 默认的活跃档位：(离画面多远以内(像素), 每几步模拟一次)，按距离从小到大，超出最后一档的敌人睡觉不模拟
+DEFAULT_TIERS = [(64, 1), (320, 4)]
+# 睡着或者降频的敌人回到第一档时最多补跑多少步，睡得再久也只补这么多
+MAX_CATCH_UP = 120
+# 按位置把实体分到这么大的格子里(像素)，每步只看画面附近的格子
+LOD_CELL = 256
+LOC_MASK = 0xFFFFFFFF
+
+
+class ActivityScheduler:
+    """
+    按离画面的距离决定每个实体这一步要不要模拟。实体按位置放在格子里，每步只看画面附近格子里的实体，
+    睡着的实体不会被碰到，关卡再大、敌人再多每步的开销也差不多。
+    降频和睡着的实体少跑的步数在回到第一档的时候一次补跑(最多max_catch_up步)，计时器、重力这些都会接着走完
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, max_catch_up=MAX_CATCH_UP, cell_size=LOD_CELL):
+        """
+        :param tiers: [(距离, 间隔)]，None表示不分档，每个实体每步都模拟
+        :param max_catch_up: 最多补跑多少步
+        """
+        self.tiers = [tuple(tier) for tier in tiers] if tiers else None
+        self.max_catch_up = max_catch_up
+        self.cell_size = cell_size
+        # 实体 -> 序号，按加进来的顺序，同一步里按序号模拟，降频的实体按序号错开
+        self.slots = {}
+        # 实体 -> 上一次模拟是第几步
+        self.last = {}
+        # 降频的实体 -> 欠了多少步没跑，回到第一档的时候补上
+        self.owed = {}
+        # 格子key -> {实体: None}，实体 -> 它在的格子
+        self.cells = {}
+        self.cell_of = {}
+        # 上一步模拟过的实体，位置可能变了，下一次查询前重新放格子
+        self.moved = []
+        # 加进来过的实体最大的宽和高，按Rect查询的时候往左上多看这么多(实体的位置在左上角)
+        self.max_size = (0, 0)
+        # 上一次query_rect/query_point/query_radius比了几次Rect
+        self.checks = 0
+        # 上一次plan每一档各有多少个实体，最后一个是画面附近睡着的
+        self.counts = []
+        # 上一次plan有多少个实体要模拟
+        self.stepped = 0
+
+    def reset(self, entities, frame):
+        """
+        换关的时候把实体全换掉
+        :param frame: 现在是第几步，睡着的实体从这一步开始算少跑了多少步
+        """
+        self.slots = {}
+        self.last = {}
+        self.owed = {}
+        self.cells = {}
+        self.cell_of = {}
+        self.moved = []
+        self.max_size = (0, 0)
+        for entity in entities:
+            self.add(entity, frame)
+
+    def add(self, entity, frame):
+        self.slots[entity] = len(self.slots)
+        self.last[entity] = frame
+        self.max_size = (max(self.max_size[0], entity.size[0]), max(self.max_size[1], entity.size[1]))
+        self.place(entity)
+
+    def remove(self, entity):
+        # 实体死了
+        if entity in self.cell_of:
+            del self.cells[self.cell_of.pop(entity)][entity]
+        self.slots.pop(entity, None)
+        self.last.pop(entity, None)
+        self.owed.pop(entity, None)
+
+    def place(self, entity):
+        key = (int(entity.pos[0] // self.cell_size) << 32) | (int(entity.pos[1] // self.cell_size) & LOC_MASK)
+        old = self.cell_of.get(entity)
+        if old == key:
+            return
+        if old is not None:
+            del self.cells[old][entity]
+        self.cell_of[entity] = key
+        if key not in self.cells:
+            self.cells[key] = {}
+        self.cells[key][entity] = None
+
+    def near(self, area):
+        """
+        :param area: 世界里的Rect
+        :return: 位置在area里的实体，按序号排
+        """
+        if self.tiers is None:
+            return [entity for entity in self.slots if area.collidepoint(entity.pos)]
+        for entity in self.moved:
+            if entity in self.cell_of:
+                self.place(entity)
+        self.moved = []
+        size = self.cell_size
+        found = []
+        for x in range(area.left // size, (area.right - 1) // size + 1):
+            for y in range(area.top // size, (area.bottom - 1) // size + 1):
+                cell = self.cells.get((x << 32) | (y & LOC_MASK))
+                if cell:
+                    found.extend(entity for entity in cell if area.collidepoint(entity.pos))
+        found.sort(key=self.slots.__getitem__)
+        return found
+
+    def candidates(self, left, top, right, bottom):
+        """
+        :return: Rect可能和[left, right) x [top, bottom)重叠的实体，按序号排
+        """
+        # 位置往左上多看一个最大实体的大小，再多1像素，小数位置取整的时候不会漏
+        width, height = self.max_size
+        x = math.floor(left) - width - 1
+        y = math.floor(top) - height - 1
+        area = pygame.Rect(x, y, math.ceil(right) - x + 2, math.ceil(bottom) - y + 2)
+        found = self.near(area)
+        self.checks = len(found)
+        return found
+
+    def query_rect(self, rect):
+        """
+        :return: Rect和rect重叠的实体，按序号排
+        """
+        return [entity for entity in self.candidates(rect.left, rect.top, rect.right, rect.bottom)
+                if entity.rect().colliderect(rect)]
+
+    def query_point(self, pos):
+        """
+        :return: Rect包含这个点的实体
+        """
+        return [entity for entity in self.candidates(pos[0], pos[1], pos[0] + 1, pos[1] + 1)
+                if entity.rect().collidepoint(pos)]
+
+    def query_radius(self, center, radius):
+        """
+        :return: Rect和以center为圆心、radius为半径的圆相交的实体
+        """
+        entities = []
+        for entity in self.candidates(center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius):
+            rect = entity.rect()
+            # Rect上离圆心最近的点
+            dx = center[0] - max(rect.left, min(center[0], rect.right))
+            dy = center[1] - max(rect.top, min(center[1], rect.bottom))
+            if dx * dx + dy * dy <= radius * radius:
+                entities.append(entity)
+        return entities
+
+    def tier(self, pos, size, view):
+        """
+        :param pos: 实体的位置
+        :param size: 实体的大小
+        :param view: 画面在世界里的Rect
+        :return: 第几档，len(tiers)表示睡觉
+        """
+        distance = max(view.left - pos[0] - size[0], pos[0] - view.right,
+                       view.top - pos[1] - size[1], pos[1] - view.bottom, 0)
+        for i, tier in enumerate(self.tiers):
+            if distance <= tier[0]:
+                return i
+        return len(self.tiers)
+
+    def plan(self, view, frame):
+        """
+        :param view: 画面在世界里的Rect
+        :param frame: 第几步模拟
+        :return: [(实体, 这一步跑几次)]，只包括这一步要跑的，按序号排
+        """
+        if self.tiers is None:
+            self.stepped = len(self.slots)
+            return [(entity, 1) for entity in self.slots]
+        tiers = self.tiers
+        sleeping = len(tiers)
+        counts = [0] * (sleeping + 1)
+        # 实体的位置在左上角，多放一个格子把比位置更靠左上的身体也算进去
+        reach = tiers[-1][0] + self.cell_size
+        steps = []
+        for entity in self.near(view.inflate(reach * 2, reach * 2)):
+            tier = self.tier(entity.pos, entity.size, view)
+            counts[tier] += 1
+            if tier == sleeping or (frame + self.slots[entity]) % tiers[tier][1]:
+                continue
+            owed = self.owed.pop(entity, 0) + frame - self.last[entity] - 1
+            self.last[entity] = frame
+            if tier == 0:
+                steps.append((entity, 1 + min(owed, self.max_catch_up)))
+            else:
+                self.owed[entity] = owed
+                steps.append((entity, 1))
+        self.moved = [entity for entity, _ in steps]
+        self.counts = counts
+        self.stepped = len(steps)
+        return steps
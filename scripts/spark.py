@@ -1,31 +1,70 @@
 import math
+import operator
+from itertools import compress
 
 import pygame
+import pygame.gfxdraw
 
 
-class Spark:
-    def __init__(self, pos, angle, speed):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
+class Sparks:
+    """
+    所有火花放在一起管理，角度在生成的时候就算成方向向量，之后不用再算cos/sin
+    """
+
+    def __init__(self):
+        self.x = []
+        self.y = []
+        # 方向向量(cos, sin)
+        self.dx = []
+        self.dy = []
+        self.speed = []
+
+    def __len__(self):
+        return len(self.x)
+
+    def spawn(self, pos, angle, speed):
+        self.x.append(pos[0])
+        self.y.append(pos[1])
+        self.dx.append(math.cos(angle))
+        self.dy.append(math.sin(angle))
+        self.speed.append(speed)
+
+    def clear(self):
+        for values in [self.x, self.y, self.dx, self.dy, self.speed]:
+            values.clear()
 
     def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
-
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
-
-    def render(self, surf, offset=(0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0],
-             self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-
-        ]
-        pygame.draw.polygon(surf, (255, 255, 255), render_points)
+        # 上一步速度减到0的火花已经画过最后一次了，现在去掉
+        if not all(self.speed):
+            alive = list(self.speed)
+            self.x = list(compress(self.x, alive))
+            self.y = list(compress(self.y, alive))
+            self.dx = list(compress(self.dx, alive))
+            self.dy = list(compress(self.dy, alive))
+            self.speed = list(compress(self.speed, alive))
+        if not self.x:
+            return
+        self.x = list(map(operator.add, self.x, map(operator.mul, self.dx, self.speed)))
+        self.y = list(map(operator.add, self.y, map(operator.mul, self.dy, self.speed)))
+        # 和原来一样，速度减到0的这一帧还要再画一次
+        self.speed = [max(0, speed - 0.1) for speed in self.speed]
+
+    def render(self, surf, offset=(0, 0), outlines=None):
+        """
+        :param outlines: Outlines，不是None就在它的layer上画一个每边大1像素的半透明菱形当描边
+        """
+        # 菱形的四个点：前后各3倍速度，左右各0.5倍速度，转90度就是(-sin, cos)
+        polygon = pygame.draw.polygon
+        for x, y, dx, dy, speed in zip(self.x, self.y, self.dx, self.dy, self.speed):
+            x -= offset[0]
+            y -= offset[1]
+            long_x = dx * speed * 3
+            long_y = dy * speed * 3
+            side_x = -dy * speed * 0.5
+            side_y = dx * speed * 0.5
+            if outlines:
+                pygame.gfxdraw.filled_polygon(outlines.layer, [
+                    (x + long_x + dx, y + long_y + dy), (x + side_x - dy, y + side_y + dx),
+                    (x - long_x - dx, y - long_y - dy), (x - side_x + dy, y - side_y - dx)], outlines.color)
+            polygon(surf, (255, 255, 255), [(x + long_x, y + long_y), (x + side_x, y + side_y),
+                                            (x - long_x, y - long_y), (x - side_x, y - side_y)])
@@ -2,6 +2,9 @@ import json
 
 import pygame
 
+from scripts import mapfile
+from scripts.profiler import alloc_counter
+
 AUTOTILE_MAP = {
     # 这些值详情见我们的图片命名，0号图片就是专门
     tuple(sorted([(1, 0), (0, 1)])): 0,
@@ -16,10 +19,38 @@ AUTOTILE_MAP = {
 
 }
 
+# 邻居掩码：右1、左2、上4、下8，同一种tile的邻居才算
+AUTOTILE_SHIFTS = [((1, 0), 1), ((-1, 0), 2), ((0, -1), 4), ((0, 1), 8)]
+# 掩码 -> variant，AUTOTILE_MAP里没有的掩码是None，不改variant
+AUTOTILE_TABLE = [None] * 16
+for neighbours, autotile_variant in AUTOTILE_MAP.items():
+    AUTOTILE_TABLE[sum(bit for shift, bit in AUTOTILE_SHIFTS if shift in neighbours)] = autotile_variant
+
 # 取人物周边9个方块检测碰撞
 NEIGHBOUR_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone'}
 AUTOTILE_TYPES = {'grass', 'stone'}
+# 每个区块边长多少个tile，区块会被预先画成一张图片
+CHUNK_SIZE = 16
+# 每帧最多提前画几个画面外的区块
+PREFETCH_BUDGET = 2
+# 装饰物空间索引每个格子的边长(像素)
+OFFGRID_BUCKET = 64
+# 网格坐标压成一个整数当key，x放高32位，y放低32位
+LOC_MASK = 0xFFFFFFFF
+# key的y翻一下符号位，排序就是先按x再按y从小到大，y+1就是key+1
+Y_FLIP = 0x80000000
+
+
+def pack_loc(x, y):
+    return (x << 32) | (y & LOC_MASK)
+
+
+def unpack_loc(key):
+    y = key & LOC_MASK
+    if y > 0x7FFFFFFF:
+        y -= 0x100000000
+    return key >> 32, y
 
 
 class TileMap:
@@ -27,9 +58,57 @@ class TileMap:
         self.game = game
         self.tile_size = tile_size
         # 瓦片地图，网格地图，更容易实现物理碰撞那些
-        self.tilemap = {}
+        # key是pack_loc压好的坐标，value是 类型编号 << 8 | variant，不再每个tile存一个字典
+        self.grid = {}
+        # 类型编号表，类型字符串只存一份
+        self.tile_types = []
+        self.type_ids = {}
+        self.physics_ids = set()
+        # 实心格子的key，物理(sweep、is_solid、子弹)只要查在不在里面，改一格就是加一个或者去掉一个
+        self.solid = set()
+        # 合并好的碰撞体，按区块用到的时候才合并：区块坐标 -> {实心格子的key: 盖住它的那个大Rect}，
+        # 相邻的实心格子合并成尽量少的矩形，不跨区块，改一格只扔掉那个区块的。同一个Rect被很多格子共用，查到的Rect不要改
+        self.collider_chunks = {}
         # 非方块的tiles,不用乘tile_size,装饰物，放在tile后面
         self.offgrid_tiles = []
+        # 装饰物的空间索引，格子key -> {序号: tile}，序号保证查出来的顺序和offgrid_tiles一样
+        self.offgrid_buckets = {}
+        self.offgrid_seq = {}
+        self.next_offgrid_seq = 0
+        # 区块缓存，(cx, cy) -> 画好的Surface，空区块为None，没有的key说明要重新画
+        self.chunk_size = CHUNK_SIZE
+        self.chunks = {}
+        # 改过但还留着旧Surface的区块，下次用到的时候直接画在旧Surface上，不新建
+        self.dirty_chunks = set()
+        # 区块的描边，和chunks一起失效
+        self.chunk_outlines = {}
+        # 比tile大的图片会画到旁边的区块上，画区块的时候要往外多看几格
+        self.overdraw = 0
+        # 编辑器的撤销记录(EditJournal)，不是None的时候每改一格都记下来，游戏里不用
+        self.journal = None
+
+    def type_id(self, tile_type):
+        if tile_type not in self.type_ids:
+            self.type_ids[tile_type] = len(self.tile_types)
+            self.tile_types.append(tile_type)
+            if tile_type in PHYSICS_TILES:
+                self.physics_ids.add(self.type_ids[tile_type])
+            self.update_overdraw(tile_type)
+        return self.type_ids[tile_type]
+
+    def decode(self, key, code):
+        """
+        把grid里面的一项还原成原来的tile字典
+        :param key: 压好的坐标
+        :param code: 类型编号和variant
+        :return: {'type', 'variant', 'pos'}
+        """
+        return {'type': self.tile_types[code >> 8], 'variant': code & 0xFF, 'pos': list(unpack_loc(key))}
+
+    def get_tile(self, tile_pos):
+        key = pack_loc(tile_pos[0], tile_pos[1])
+        if key in self.grid:
+            return self.decode(key, self.grid[key])
 
     def extract(self, id_pairs, keep=False):
         """
@@ -39,22 +118,30 @@ class TileMap:
         :return:None
         """
         matches = []
-        for tile in self.offgrid_tiles.copy():
+        remaining = []
+        for tile in self.offgrid_tiles:
             if (tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
+                    self.unindex_offgrid(tile)
+                    self.invalidate(self.tile_rect(tile, ongrid=False))
+                    continue
+            remaining.append(tile)
+        self.offgrid_tiles = remaining
+        codes = {self.type_ids[t] << 8 | v for t, v in id_pairs if t in self.type_ids}
         # 因为涉及到删除这个tile,但是
-        for loc in self.tilemap.copy():
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                # tilemap里面存储的坐标都是正经坐标，我们要转换成pixel像素坐标，与render同理
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
+        for key, code in list(self.grid.items()):
+            if code in codes:
+                tile = self.decode(key, code)
                 if not keep:
-                    del self.tilemap[loc]
+                    del self.grid[key]
+                    self.invalidate(self.tile_rect(tile))
+                    if key in self.solid:
+                        self.solid_changed(key)
+                # tilemap里面存储的坐标都是正经坐标，我们要转换成pixel像素坐标，与render同理
+                tile['pos'][0] *= self.tile_size
+                tile['pos'][1] *= self.tile_size
+                matches.append(tile)
 
         return matches
 
@@ -62,76 +149,588 @@ class TileMap:
         tiles = []
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         for offset in NEIGHBOUR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
+            key = pack_loc(tile_loc[0] + offset[0], tile_loc[1] + offset[1])
+            if key in self.grid:
+                tiles.append(self.decode(key, self.grid[key]))
 
         return tiles
 
     def save(self, path):
+        # .map结尾存成二进制格式，否则还是原来的"x;y"字典，旧地图和新地图可以互相读
+        if path.endswith(mapfile.MAP_EXT):
+            locs = [unpack_loc(key) for key in self.grid]
+            offgrid = self.offgrid_tiles
+            # 先登记装饰物的类型，类型表才是全的
+            offgrid_codes = [self.type_id(tile['type']) << 8 | tile['variant'] for tile in offgrid]
+            mapfile.write(path, self.tile_size, self.tile_types,
+                          ([loc[0] for loc in locs], [loc[1] for loc in locs], list(self.grid.values())),
+                          ([tile['pos'][0] for tile in offgrid], [tile['pos'][1] for tile in offgrid], offgrid_codes))
+            return
+        tilemap = {}
+        for key, code in self.grid.items():
+            tile = self.decode(key, code)
+            tilemap[str(tile['pos'][0]) + ';' + str(tile['pos'][1])] = tile
         f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
+        json.dump({'tilemap': tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
         f.close()
 
+    def snapshot(self):
+        """
+        :return: 只有网格和装饰物的副本，可以拿到后台线程里save，之后再编辑也不会影响它
+        """
+        # 装饰物的字典编辑器不会原地改，复制列表就够了
+        copy = TileMap(self.game, self.tile_size)
+        copy.grid = dict(self.grid)
+        copy.tile_types = list(self.tile_types)
+        copy.type_ids = dict(self.type_ids)
+        copy.physics_ids = set(self.physics_ids)
+        copy.offgrid_tiles = list(self.offgrid_tiles)
+        return copy
+
     def load(self, path):
+        # 不管后缀，按文件开头判断是不是二进制地图
+        if mapfile.is_map_file(path):
+            self.load_binary(path)
+            return
         f = open(path, 'r')
         map_data = json.load(f)
         f.close()
 
-        self.tilemap = map_data['tilemap']
-        self.tile_size = map_data['tile_size']
+        self.load_data(map_data)
+
+    def reset(self, tile_size):
+        self.tile_size = tile_size
+        self.grid = {}
+        self.tile_types = []
+        self.type_ids = {}
+        self.physics_ids = set()
+        self.solid = set()
+        self.collider_chunks = {}
+        self.overdraw = 0
+        self.offgrid_tiles = []
+        self.offgrid_buckets = {}
+        self.offgrid_seq = {}
+        self.chunks = {}
+        self.dirty_chunks = set()
+        self.chunk_outlines = {}
+
+    def load_data(self, map_data):
+        self.reset(map_data['tile_size'])
+        for tile in map_data['tilemap'].values():
+            self.grid[pack_loc(tile['pos'][0], tile['pos'][1])] = self.type_id(tile['type']) << 8 | tile['variant']
         self.offgrid_tiles = map_data['offgrid']
+        for tile in self.offgrid_tiles:
+            self.index_offgrid(tile)
+        self.build_solid()
+
+    def load_binary(self, path):
+        """
+        读二进制地图，网格直接从mmap的数组一次建好，不经过每个tile一个字典
+        """
+        map_file = mapfile.MapFile(path)
+        self.reset(map_file.tile_size)
+        # 类型表按文件里的顺序登记，编号和文件里一样，code可以直接用
+        for name in map_file.types:
+            self.type_id(name)
+        self.grid = dict(zip(map(pack_loc, map_file.grid_x, map_file.grid_y), map_file.grid_code))
+        self.offgrid_tiles = map_file.offgrid()
+        map_file.close()
+        for tile in self.offgrid_tiles:
+            self.index_offgrid(tile)
+        self.build_solid()
+
+    def add_region(self, keys, codes, offgrid, rect):
+        """
+        流式关卡读进来一块
+        :param keys: 网格key列表
+        :param codes: 和keys对应的code
+        :param offgrid: 装饰物字典列表
+        :param rect: 这一块的世界像素范围
+        """
+        self.grid.update(zip(keys, codes))
+        physics_ids = self.physics_ids
+        self.solid.update(key for key, code in zip(keys, codes) if code >> 8 in physics_ids)
+        self.drop_colliders(rect)
+        for tile in offgrid:
+            self.offgrid_tiles.append(tile)
+            self.index_offgrid(tile)
+        # 比tile大的图片会画到右边和下面的区块上
+        extra = self.overdraw * self.tile_size
+        self.invalidate(pygame.Rect(rect.x, rect.y, rect.width + extra, rect.height + extra))
+
+    def remove_region(self, keys, offgrid, rect):
+        """
+        流式关卡丢掉一块，这一块的区块图片也一起扔掉，省内存，回来的时候重新画
+        :param keys: add_region时的网格key列表
+        :param offgrid: add_region时的装饰物列表
+        :param rect: 这一块的世界像素范围
+        """
+        grid = self.grid
+        solid = self.solid
+        for key in keys:
+            del grid[key]
+            solid.discard(key)
+        self.drop_colliders(rect)
+        if offgrid:
+            for tile in offgrid:
+                self.unindex_offgrid(tile)
+            removed = set(map(id, offgrid))
+            self.offgrid_tiles = [tile for tile in self.offgrid_tiles if id(tile) not in removed]
+        chunk_px = self.chunk_size * self.tile_size
+        extra = self.overdraw * self.tile_size
+        for cx in range(rect.left // chunk_px, (rect.right + extra - 1) // chunk_px + 1):
+            for cy in range(rect.top // chunk_px, (rect.bottom + extra - 1) // chunk_px + 1):
+                self.chunks.pop((cx, cy), None)
+                self.dirty_chunks.discard((cx, cy))
+                self.chunk_outlines.pop((cx, cy), None)
+
+    def tile_rect(self, tile, ongrid=True):
+        """
+        tile的图片在世界里占的像素范围
+        :param tile: tile字典
+        :param ongrid: 是否是网格上的tile，网格tile的pos要乘tile_size
+        :return: Rect
+        """
+        # 游戏里没有加载spawners这类图片，就当成一格大小
+        if tile['type'] in self.game.assets:
+            size = self.game.assets[tile['type']][tile['variant']].get_size()
+        else:
+            size = (self.tile_size, self.tile_size)
+        if ongrid:
+            return pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, size[0], size[1])
+        return pygame.Rect(tile['pos'][0], tile['pos'][1], size[0], size[1])
+
+    def update_overdraw(self, tile_type):
+        for img in self.game.assets.get(tile_type, []):
+            size = max(img.get_width(), img.get_height())
+            self.overdraw = max(self.overdraw, (size - 1) // self.tile_size)
+
+    def invalidate(self, rect=None):
+        """
+        让和rect重叠的区块下次render的时候重新画
+        :param rect: 世界像素坐标的Rect，None则全部重画
+        :return: None
+        """
+        if rect is None:
+            self.chunks = {}
+            self.dirty_chunks = set()
+            self.chunk_outlines = {}
+            return
+        chunk_px = self.chunk_size * self.tile_size
+        for cx in range(int(rect.left // chunk_px), int((rect.right - 1) // chunk_px) + 1):
+            for cy in range(int(rect.top // chunk_px), int((rect.bottom - 1) // chunk_px) + 1):
+                if self.chunks.get((cx, cy)) is not None:
+                    self.dirty_chunks.add((cx, cy))
+                else:
+                    self.chunks.pop((cx, cy), None)
+                self.chunk_outlines.pop((cx, cy), None)
+
+    def set_tile(self, tile_pos, tile_type, variant):
+        key = pack_loc(tile_pos[0], tile_pos[1])
+        code = self.type_id(tile_type) << 8 | variant
+        old = self.grid.get(key)
+        if old == code:
+            return False
+        if old is not None:
+            self.invalidate(self.tile_rect(self.decode(key, old)))
+        if self.journal is not None:
+            self.journal.cell(key, old, code)
+        self.grid[key] = code
+        self.invalidate(self.tile_rect(self.decode(key, code)))
+        if (key in self.solid) != (code >> 8 in self.physics_ids):
+            self.solid_changed(key)
+        return True
+
+    def remove_tile(self, tile_pos):
+        key = pack_loc(tile_pos[0], tile_pos[1])
+        if key not in self.grid:
+            return False
+        if self.journal is not None:
+            self.journal.cell(key, self.grid[key], None)
+        self.invalidate(self.tile_rect(self.decode(key, self.grid.pop(key))))
+        if key in self.solid:
+            self.solid_changed(key)
+        return True
+
+    def add_offgrid(self, tile, seq=None):
+        """
+        :param seq: 撤销删除的时候传原来的序号，放回原来画的顺序，None就放到最后
+        """
+        if seq is None:
+            self.offgrid_tiles.append(tile)
+        else:
+            i = len(self.offgrid_tiles)
+            while i and self.offgrid_seq[id(self.offgrid_tiles[i - 1])] > seq:
+                i -= 1
+            self.offgrid_tiles.insert(i, tile)
+        seq = self.index_offgrid(tile, seq)
+        self.invalidate(self.tile_rect(tile, ongrid=False))
+        if self.journal is not None:
+            self.journal.offgrid(tile, seq, True)
+
+    def remove_offgrid(self, tile):
+        # 按对象删，字典相等的两个装饰物不会删错
+        for i, other in enumerate(self.offgrid_tiles):
+            if other is tile:
+                del self.offgrid_tiles[i]
+                break
+        seq = self.unindex_offgrid(tile)
+        self.invalidate(self.tile_rect(tile, ongrid=False))
+        if self.journal is not None:
+            self.journal.offgrid(tile, seq, False)
+
+    def offgrid_buckets_of(self, rect):
+        for bx in range(int(rect.left // OFFGRID_BUCKET), int((rect.right - 1) // OFFGRID_BUCKET) + 1):
+            for by in range(int(rect.top // OFFGRID_BUCKET), int((rect.bottom - 1) // OFFGRID_BUCKET) + 1):
+                yield pack_loc(bx, by)
+
+    def index_offgrid(self, tile, seq=None):
+        if seq is None:
+            seq = self.next_offgrid_seq
+            self.next_offgrid_seq += 1
+        self.offgrid_seq[id(tile)] = seq
+        for key in self.offgrid_buckets_of(self.tile_rect(tile, ongrid=False)):
+            self.offgrid_buckets.setdefault(key, {})[seq] = tile
+        return seq
+
+    def unindex_offgrid(self, tile):
+        seq = self.offgrid_seq.pop(id(tile))
+        for key in self.offgrid_buckets_of(self.tile_rect(tile, ongrid=False)):
+            bucket = self.offgrid_buckets[key]
+            del bucket[seq]
+            if not bucket:
+                del self.offgrid_buckets[key]
+        return seq
+
+    def offgrid_in_rect(self, rect):
+        """
+        找出图片和rect重叠的装饰物，只看rect覆盖的索引格子
+        :param rect: 世界像素坐标的Rect
+        :return: 列表，顺序和offgrid_tiles一样(也就是画的顺序)
+        """
+        found = {}
+        for key in self.offgrid_buckets_of(rect):
+            if key in self.offgrid_buckets:
+                found.update(self.offgrid_buckets[key])
+        return [found[seq] for seq in sorted(found) if rect.colliderect(self.tile_rect(found[seq], ongrid=False))]
+
+    def offgrid_at(self, pos):
+        """
+        找出图片盖住pos这个点的装饰物
+        :param pos: 世界像素坐标
+        :return: 列表
+        """
+        key = pack_loc(int(pos[0] // OFFGRID_BUCKET), int(pos[1] // OFFGRID_BUCKET))
+        tiles = self.offgrid_buckets.get(key, {})
+        return [tiles[seq] for seq in sorted(tiles) if self.tile_rect(tiles[seq], ongrid=False).collidepoint(pos)]
 
     def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        key = pack_loc(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if key in self.solid:
+            return self.decode(key, self.grid[key])
 
-    # 过滤碰撞的tiles，有些东西我们不想让它有物理碰撞
-    def physics_rects_around(self, pos):
-        rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(
-                    pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size,
-                                self.tile_size))
+    def is_solid(self, pos):
+        # 和solid_check一样，但只返回True/False，不用拼tile字典，每帧调用很多次的地方用这个
+        return (int(pos[0] // self.tile_size) << 32) | (int(pos[1] // self.tile_size) & LOC_MASK) in self.solid
+
+    def build_solid(self):
+        """
+        读完地图以后找出所有实心格子，碰撞体等用到的时候再按区块合并
+        """
+        physics_ids = self.physics_ids
+        self.solid = {key for key, code in self.grid.items() if code >> 8 in physics_ids}
+        self.collider_chunks = {}
+
+    def solid_changed(self, key):
+        """
+        一格变成实心或者不再实心，只扔掉这一格所在区块合并好的碰撞体
+        """
+        code = self.grid.get(key)
+        if code is not None and code >> 8 in self.physics_ids:
+            self.solid.add(key)
+        else:
+            self.solid.discard(key)
+        x, y = unpack_loc(key)
+        self.collider_chunks.pop((x // self.chunk_size, y // self.chunk_size), None)
 
+    def drop_colliders(self, rect):
+        """
+        扔掉和rect(世界像素范围)重叠的区块合并好的碰撞体
+        """
+        chunk_px = self.chunk_size * self.tile_size
+        for cx in range(rect.left // chunk_px, (rect.right - 1) // chunk_px + 1):
+            for cy in range(rect.top // chunk_px, (rect.bottom - 1) // chunk_px + 1):
+                self.collider_chunks.pop((cx, cy), None)
+
+    def chunk_colliders(self, chunk_loc):
+        """
+        :return: 这个区块里 实心格子的key -> 合并好的Rect，第一次用到的时候合并
+        """
+        colliders = self.collider_chunks.get(chunk_loc)
+        if colliders is None:
+            solid = self.solid
+            x0 = chunk_loc[0] * self.chunk_size
+            y0 = chunk_loc[1] * self.chunk_size
+            keys = [pack_loc(x, y) for x in range(x0, x0 + self.chunk_size) for y in range(y0, y0 + self.chunk_size)]
+            colliders = self.mesh([key for key in keys if key in solid])
+            self.collider_chunks[chunk_loc] = colliders
+        return colliders
+
+    def colliders_in(self, rect):
+        """
+        :param rect: 世界像素范围
+        :return: 和rect重叠的合并碰撞体，几格共用一个碰撞体的只返回一次
+        """
+        tile_size = self.tile_size
+        chunk_size = self.chunk_size
+        solid = self.solid
+        collider_chunks = self.collider_chunks
+        rects = []
+        for x in range(rect.left // tile_size, (rect.right - 1) // tile_size + 1):
+            for y in range(rect.top // tile_size, (rect.bottom - 1) // tile_size + 1):
+                key = (x << 32) | (y & LOC_MASK)
+                if key in solid:
+                    colliders = collider_chunks.get((x // chunk_size, y // chunk_size))
+                    if colliders is None:
+                        colliders = self.chunk_colliders((x // chunk_size, y // chunk_size))
+                    collider = colliders[key]
+                    # 碰撞体互不重叠，值相等就是同一个
+                    if collider not in rects:
+                        rects.append(collider)
         return rects
 
+    def mesh(self, keys):
+        """
+        贪心合并：按先x后y的顺序找到还没合并的格子，先往下延伸成一竖条，再整条往右延伸，
+        盖住的格子都指向这个Rect
+        :param keys: 要合并的实心格子
+        :return: 格子的key -> Rect
+        """
+        tile_size = self.tile_size
+        colliders = {}
+        step = 1 << 32
+        flip = Y_FLIP.__xor__
+        remaining = set(map(flip, keys))
+        for start in sorted(remaining):
+            if start not in remaining:
+                continue
+            end = start + 1
+            while end in remaining:
+                end += 1
+            # 一整条都在才能往右延伸，issuperset在C里面一个个查
+            width = 1
+            while remaining.issuperset(range(start + width * step, end + width * step)):
+                width += 1
+            x, y = unpack_loc(start ^ Y_FLIP)
+            rect = pygame.Rect(x * tile_size, y * tile_size, width * tile_size, (end - start) * tile_size)
+            for offset in range(0, width * step, step):
+                column = range(start + offset, end + offset)
+                remaining.difference_update(column)
+                colliders.update(dict.fromkeys(map(flip, column), rect))
+        return colliders
+
+    def sweep(self, pos, size, axis, delta):
+        """
+        实体沿一个轴移动delta，从移动前占的格子开始，沿着移动方向一列(或一行)一列地查实心tile，
+        每列查实体在另一个轴上盖住的所有格子，碰到就停在那个tile旁边。速度多快都不会穿墙，也不新建Rect。
+        实体占的像素和pygame.Rect一样，浮点坐标直接截断
+        :param pos: 移动前的位置
+        :param size: 实体大小
+        :param axis: 0是x轴，1是y轴
+        :param delta: 这个轴上移动的距离
+        :return: (移动后这个轴上的坐标, 有没有撞到)
+        """
+        moved = pos[axis] + delta
+        if not delta:
+            return moved, False
+        tile_size = self.tile_size
+        length = size[axis]
+        start = int(pos[axis])
+        end = int(moved)
+        cross = int(pos[1 - axis])
+        first = cross // tile_size
+        last = (cross + size[1 - axis] - 1) // tile_size
+        if delta > 0:
+            lines = range(start // tile_size, (end + length - 1) // tile_size + 1)
+        else:
+            lines = range((start + length - 1) // tile_size, end // tile_size - 1, -1)
+        solid = self.solid
+        for line in lines:
+            for other in range(first, last + 1):
+                if axis:
+                    key = (other << 32) | (line & LOC_MASK)
+                else:
+                    key = (line << 32) | (other & LOC_MASK)
+                if key in solid:
+                    if delta > 0:
+                        return line * tile_size - length, True
+                    return (line + 1) * tile_size, True
+        return moved, False
+
+    def autotile_variant(self, key, code):
+        """
+        :return: 按上下左右邻居应该用的variant，不用补全就是None
+        """
+        tile_type = code >> 8
+        grid = self.grid
+        flipped = key ^ Y_FLIP
+        mask = ((grid.get(key + (1 << 32), -1) >> 8 == tile_type)
+                | (grid.get(key - (1 << 32), -1) >> 8 == tile_type) << 1
+                | (grid.get((flipped - 1) ^ Y_FLIP, -1) >> 8 == tile_type) << 2
+                | (grid.get((flipped + 1) ^ Y_FLIP, -1) >> 8 == tile_type) << 3)
+        return AUTOTILE_TABLE[mask]
+
     def auto_tile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            # 判断四个方向的邻居
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    # 同一种图片才补全
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
-
-    def render(self, surf, offset=(0, 0)):
-        # 先画装饰，当背景
+        """
+        整张地图补全一遍：每个tile查四个邻居拼成掩码，查表得到variant，只重画真的变了的区块
+        :return: 改了多少个tile
+        """
+        type_ids = {self.type_ids[t] for t in AUTOTILE_TYPES if t in self.type_ids}
+        get = self.grid.get
+        table = AUTOTILE_TABLE
+        step = 1 << 32
+        changed = []
+        # 和autotile_variant一样，展开写省掉每个tile一次函数调用
+        for key, code in self.grid.items():
+            tile_type = code >> 8
+            if tile_type not in type_ids:
+                continue
+            flipped = key ^ Y_FLIP
+            variant = table[(get(key + step, -1) >> 8 == tile_type)
+                            | (get(key - step, -1) >> 8 == tile_type) << 1
+                            | (get((flipped - 1) ^ Y_FLIP, -1) >> 8 == tile_type) << 2
+                            | (get((flipped + 1) ^ Y_FLIP, -1) >> 8 == tile_type) << 3]
+            if variant is not None and variant != code & 0xFF:
+                changed.append((key, (code & ~0xFF) | variant))
+        self.apply_autotile(changed)
+        return len(changed)
+
+    def auto_tile_at(self, tile_pos):
+        """
+        编辑器放下或者删掉一格以后，只补全这一格和上下左右四格
+        :return: 改了多少个tile
+        """
+        type_ids = {self.type_ids[t] for t in AUTOTILE_TYPES if t in self.type_ids}
+        changed = []
+        for shift in [(0, 0), (1, 0), (-1, 0), (0, -1), (0, 1)]:
+            key = pack_loc(tile_pos[0] + shift[0], tile_pos[1] + shift[1])
+            code = self.grid.get(key)
+            if code is not None and code >> 8 in type_ids:
+                variant = self.autotile_variant(key, code)
+                if variant is not None and variant != code & 0xFF:
+                    changed.append((key, (code & ~0xFF) | variant))
+        self.apply_autotile(changed)
+        return len(changed)
+
+    def apply_autotile(self, changed):
+        # 掩码只看邻居的类型不看variant，先全部算完再写回去和边算边写结果一样
+        chunk_locs = set()
+        for key, code in changed:
+            if self.journal is not None:
+                self.journal.cell(key, self.grid[key], code)
+            self.grid[key] = code
+            x, y = unpack_loc(key)
+            chunk_locs.add((x // self.chunk_size, y // self.chunk_size))
+        # 一个区块只失效一次，比tile大的图片会画到右边和下面的区块上，往外多算overdraw格
+        chunk_px = self.chunk_size * self.tile_size
+        extra = self.overdraw * self.tile_size
+        for cx, cy in chunk_locs:
+            self.invalidate(pygame.Rect(cx * chunk_px, cy * chunk_px, chunk_px + extra, chunk_px + extra))
+
+    def bake_chunk(self, chunk_loc, chunk_surf=None):
+        """
+        把一个区块里面的装饰和tile画到一张图片上，之后每帧只需要贴这张图
+        :param chunk_loc: 区块坐标
+        :param chunk_surf: 这个区块原来的Surface，不是None就清空了画在它上面
+        :return: Surface，区块是空的就返回None
+        """
+        chunk_px = self.chunk_size * self.tile_size
+        chunk_rect = pygame.Rect(chunk_loc[0] * chunk_px, chunk_loc[1] * chunk_px, chunk_px, chunk_px)
+        blits = []
+        # 和原来一样，先画装饰
+        for tile in self.offgrid_in_rect(chunk_rect):
+            blits.append((self.game.assets[tile['type']][tile['variant']],
+                          (tile['pos'][0] - chunk_rect.x, tile['pos'][1] - chunk_rect.y)))
+
+        # 左上方向多看overdraw格，大图片的tile会伸进这个区块，顺序和原来一样先x后y
+        x0 = chunk_loc[0] * self.chunk_size
+        y0 = chunk_loc[1] * self.chunk_size
+        for x in range(x0 - self.overdraw, x0 + self.chunk_size):
+            for y in range(y0 - self.overdraw, y0 + self.chunk_size):
+                code = self.grid.get((x << 32) | (y & LOC_MASK))
+                if code is not None:
+                    blits.append((self.game.assets[self.tile_types[code >> 8]][code & 0xFF],
+                                  (x * self.tile_size - chunk_rect.x, y * self.tile_size - chunk_rect.y)))
+
+        if not blits:
+            return None
+        if chunk_surf is None:
+            chunk_surf = pygame.Surface((chunk_px, chunk_px), pygame.SRCALPHA)
+            alloc_counter.add()
+        else:
+            chunk_surf.fill((0, 0, 0, 0))
+        chunk_surf.blits(blits, doreturn=False)
+        return chunk_surf
+
+    def chunk(self, chunk_loc):
+        """
+        :return: 这个区块画好的Surface，没画过或者改过就先画
+        """
+        if chunk_loc in self.dirty_chunks:
+            self.dirty_chunks.discard(chunk_loc)
+            self.chunks[chunk_loc] = self.bake_chunk(chunk_loc, self.chunks[chunk_loc])
+        elif chunk_loc not in self.chunks:
+            self.chunks[chunk_loc] = self.bake_chunk(chunk_loc)
+        return self.chunks[chunk_loc]
+
+    def prefetch(self, offset, size, budget=PREFETCH_BUDGET):
+        """
+        画面外一圈的区块趁空闲先画好，滚动的时候新露出来的区块就不用当场画
+        :param offset: 画面左上角的世界坐标
+        :param size: 画面大小
+        :param budget: 这一帧最多画几个
+        :return: 画了几个
+        """
+        chunk_px = self.chunk_size * self.tile_size
+        x0 = offset[0] // chunk_px - 1
+        x1 = (offset[0] + size[0]) // chunk_px + 1
+        y0 = offset[1] // chunk_px - 1
+        y1 = (offset[1] + size[1]) // chunk_px + 1
+        baked = 0
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                if baked >= budget:
+                    return baked
+                # 只看最外面一圈，里面的render已经画过了
+                if x0 < cx < x1 and y0 < cy < y1:
+                    continue
+                if (cx, cy) not in self.chunks or (cx, cy) in self.dirty_chunks:
+                    self.chunk((cx, cy))
+                    baked += 1
+        return baked
+
+    def render(self, surf, offset=(0, 0), outlines=None):
         """
         人物往左所有背景往右，往左偏移为负，往右偏移为正所以是减
+        只贴看得到的区块，区块没画过或者被改过才重新画
         :param surf: 背景
         :param offset: 偏移
+        :param outlines: Outlines，不是None就把区块的描边贴到它的layer上，描边和区块一起缓存
         :return: None
         """
-
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']],
-                      (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        # offset是摄像头的位置，除以物体大小就是物体最左上角的坐标，然后同样的右边，+1为了画出所有可能出现的，反正就是取上整
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']], (
-                        tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+        chunk_px = self.chunk_size * self.tile_size
+        blits = []
+        outline_blits = []
+        for cx in range(offset[0] // chunk_px, (offset[0] + surf.get_width()) // chunk_px + 1):
+            for cy in range(offset[1] // chunk_px, (offset[1] + surf.get_height()) // chunk_px + 1):
+                chunk_surf = self.chunk((cx, cy))
+                if chunk_surf is not None:
+                    blits.append((chunk_surf, (cx * chunk_px - offset[0], cy * chunk_px - offset[1])))
+                    if outlines:
+                        if (cx, cy) not in self.chunk_outlines:
+                            self.chunk_outlines[(cx, cy)] = outlines.make(chunk_surf)
+                        outline_blits.append((self.chunk_outlines[(cx, cy)],
+                                              (cx * chunk_px - offset[0] - 1, cy * chunk_px - offset[1] - 1)))
+        surf.blits(blits, doreturn=False)
+        if outline_blits:
+            outlines.layer.blits(outline_blits, doreturn=False)
@@ -1,8 +1,16 @@
+import json
 import os
 
 import pygame
 
+from scripts.profiler import alloc_counter
+
 BASE_IMG_PATH = 'assets/images/'
+# python -m scripts.build_atlas 把assets/images打包成这两个文件
+ATLAS_IMAGE_PATH = 'assets/atlas.png'
+ATLAS_INDEX_PATH = 'assets/atlas.json'
+# use_atlas之后load_image和load_images先从图集里取
+atlas = None
 
 
 def load_musics(path):
@@ -12,6 +20,48 @@ def load_musics(path):
     return music_list
 
 
+class Atlas:
+    """
+    所有图片拼成的一张大图，每张小图是它的subsurface，加载只要打开两个文件
+    """
+
+    def __init__(self, surface, index):
+        """
+        :param surface: 已经convert并设好colorkey的大图
+        :param index: build_atlas写的索引，images是路径->[x, y, w, h]，dirs是目录->排好序的路径
+        """
+        self.surface = surface
+        self.rects = index['images']
+        self.dirs = index['dirs']
+
+    def image(self, path):
+        alloc_counter.add()
+        return self.surface.subsurface(self.rects[path])
+
+    def images(self, path):
+        return [self.image(img_path) for img_path in self.dirs[path]]
+
+
+def use_atlas(image_path=ATLAS_IMAGE_PATH, index_path=ATLAS_INDEX_PATH):
+    """
+    读取打包好的图集，之后的load_image/load_images都从图集里取，图集里没有的还是读散文件
+    要在set_mode之后调用
+    :param image_path: None表示不用图集
+    :return: 图集文件不存在返回False，这时候照常读散文件
+    """
+    global atlas
+    if image_path is None or not (os.path.exists(image_path) and os.path.exists(index_path)):
+        atlas = None
+        return False
+    f = open(index_path, 'r')
+    index = json.load(f)
+    f.close()
+    surface = pygame.image.load(image_path).convert()
+    surface.set_colorkey((0, 0, 0))
+    atlas = Atlas(surface, index)
+    return True
+
+
 def load_image(path):
     # convert能让图片更好粘贴，提高性能
     """
@@ -19,12 +69,18 @@ def load_image(path):
     :param path: 文件路径
     :return: 图片
     """
+    if atlas is not None and path in atlas.rects:
+        return atlas.image(path)
     img = pygame.image.load(BASE_IMG_PATH + path).convert()
+    # 读出来一张，convert又是一张
+    alloc_counter.add(2)
     img.set_colorkey((0, 0, 0))
     return img
 
 
 def load_images(path):
+    if atlas is not None and path in atlas.dirs:
+        return atlas.images(path)
     images = []
     # listdir会返回那个目录所有的文件
     # Windows系统自动排序文件为字典序，但是LINUX可能不同，所以使用sorted来排个序
@@ -34,9 +90,25 @@ def load_images(path):
     return images
 
 
+def lerp(a, b, t):
+    """
+    a和b之间插值，t >= 1时直接返回b，避免浮点误差
+    """
+    if t >= 1:
+        return b
+    return a + (b - a) * t
+
+
 class Animation:
-    def __init__(self, images: list, img_dur=5, loop=True):
+    def __init__(self, images: list, img_dur=5, loop=True, flipped=None):
+        """
+        :param flipped: 左右翻转后的每一帧，None就在这里算好，copy出来的动画共用同一份
+        """
         self.images = images
+        if flipped is None:
+            flipped = [pygame.transform.flip(img, True, False) for img in images]
+            alloc_counter.add(len(flipped))
+        self.flipped = flipped
         self.loop = loop
         self.img_duration = img_dur
         self.frame = 0
@@ -44,7 +116,7 @@ class Animation:
         self.done = False
 
     def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
+        return Animation(self.images, self.img_duration, self.loop, self.flipped)
 
     def update(self):
         if self.loop:
@@ -55,5 +127,82 @@ class Animation:
             if self.frame >= self.img_duration * len(self.images) - 1:
                 self.done = True
 
-    def img(self):
+    def img(self, flip=False):
+        """
+        :param flip: 是否要左右翻转过的那一帧
+        """
+        if flip:
+            return self.flipped[int(self.frame / self.img_duration)]
         return self.images[int(self.frame / self.img_duration)]
+
+
+class SilentSound:
+    """
+    无声模式下代替pygame.mixer.Sound，接口一样但什么都不做
+    """
+
+    def play(self, *args, **kwargs):
+        pass
+
+    def stop(self):
+        pass
+
+    def set_volume(self, value):
+        pass
+
+
+class Outlines:
+    """
+    每张图片的描边(黑色半透明剪影往上下左右各偏移1像素)提前算好存起来，
+    画东西的时候顺便把描边贴到背后的layer上，代替每帧对整个屏幕做mask
+    """
+
+    def __init__(self, layer, color=(0, 0, 0, 180)):
+        """
+        :param layer: 描边画在哪个surface上，要在画精灵的surface下面
+        :param color: 剪影颜色
+        """
+        self.layer = layer
+        self.color = color
+        self.cache = {}
+
+    def make(self, img):
+        """
+        :param img: 图片
+        :return: 比图片大一圈的描边图片，贴的时候位置减1
+        """
+        silhouette = pygame.mask.from_surface(img).to_surface(setcolor=self.color, unsetcolor=(0, 0, 0, 0))
+        outline = pygame.Surface((img.get_width() + 2, img.get_height() + 2), pygame.SRCALPHA)
+        # mask、剪影、描边各一个
+        alloc_counter.add(3)
+        for offset in [(0, 1), (1, 0), (2, 1), (1, 2)]:
+            outline.blit(silhouette, offset)
+        return outline
+
+    def get(self, img, flip=False):
+        key = (img, flip)
+        if key not in self.cache:
+            if flip:
+                self.cache[key] = pygame.transform.flip(self.get(img), True, False)
+                alloc_counter.add()
+            else:
+                self.cache[key] = self.make(img)
+        return self.cache[key]
+
+    def preload(self, assets):
+        """
+        加载的时候把assets里面所有图片(包括动画每一帧，两个朝向)的描边都算好
+        """
+        for asset in assets.values():
+            if isinstance(asset, Animation):
+                images = asset.images
+            elif isinstance(asset, list):
+                images = asset
+            else:
+                images = [asset]
+            for img in images:
+                self.get(img)
+                self.get(img, flip=True)
+
+    def draw(self, img, pos, flip=False):
+        self.layer.blit(self.get(img, flip), (int(pos[0]) - 1, int(pos[1]) - 1))
@@ -0,0 +1,409 @@
+"""
+流式关卡(.world)：地图切成一块一块存，玩的时候只把画面附近的块读进内存，远的块按最久没用先丢，
+关卡再大内存也差不多，读关卡也不用一次读完
+文件结构(小端)：
+  头    : magic b'NJWD', 版本 u16, tile_size u16, 每块边长多少格 u16, 类型数 u16, 块数 u32, 出生点数 u32
+  类型表: 和.map一样
+  块索引: 块x int32 * c, 块y int32 * c, 网格开始 u32 * (c+1), 装饰物开始 u32 * (c+1)
+  出生点: x float64 * s, y float64 * s, code u16 * s    玩家和敌人的出生点，很少，单独存一份
+  网格  : x int32 * n, y int32 * n, code u16 * n        按块排好，第i块是[网格开始[i], 网格开始[i+1])
+  装饰物: x float64 * m, y float64 * m, code u16 * m    按块排好，装饰物按左上角算在哪一块
+每一段都从8字节对齐的位置开始，读的时候用mmap，只有读到的块才会真的从文件里读出来
+用法(在项目根目录)：
+python -m scripts.world to-world assets/maps/0.json [out.world] [--chunk 32]
+python -m scripts.world check assets/maps/*.json     json -> world -> json 来回转换，内容不一样就返回1
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+import pygame
+
+from scripts.mapfile import align, as_array, to_bytes
+from scripts.tilemap import pack_loc
+
+MAGIC = b'NJWD'
+VERSION = 1
+WORLD_EXT = '.world'
+HEADER = struct.Struct('<4sHHHHII')
+# 每块边长多少格，最好是TileMap区块缓存CHUNK_SIZE的整数倍
+WORLD_CHUNK = 32
+# 画面外多远以内的块要读进来(像素)，要比敌人降频档位最远的距离远，醒着的敌人脚下总是有地
+STREAM_MARGIN = 512
+# 内存里最多留多少块，超了先丢最久没用的(画面附近要用的块不丢)
+STREAM_CAPACITY = 48
+# 每步最多读几块画面外的块，画面和玩家所在的块不受限制，马上读
+STREAM_BUDGET = 2
+
+
+def is_world_file(path):
+    f = open(path, 'rb')
+    magic = f.read(len(MAGIC))
+    f.close()
+    return magic == MAGIC
+
+
+class WorldFile:
+    """
+    mmap打开的流式关卡，chunk(块坐标)拿到一块的网格和装饰物，用完要close
+    """
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.close()
+        self.view = memoryview(self.buffer)
+        self.arrays = []
+        if len(self.buffer) < HEADER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(path + ' 不是流式关卡文件')
+        (magic, version, self.tile_size, self.chunk_tiles, type_count, chunk_count,
+         spawner_count) = HEADER.unpack_from(self.buffer)
+        if version != VERSION:
+            self.close()
+            raise ValueError(path + ' 的版本是%d，只支持%d' % (version, VERSION))
+        self.size = len(self.buffer)
+        try:
+            offset = HEADER.size
+            self.types = []
+            for _ in range(type_count):
+                if offset >= self.size or offset + 1 + self.buffer[offset] > self.size:
+                    raise ValueError(path + ' 被截断了')
+                length = self.buffer[offset]
+                self.types.append(bytes(self.view[offset + 1:offset + 1 + length]).decode('utf-8'))
+                offset += 1 + length
+            offset = align(offset)
+            chunk_x, offset = self.block(path, offset, chunk_count, 'i')
+            chunk_y, offset = self.block(path, offset, chunk_count, 'i')
+            self.grid_start, offset = self.block(path, offset, chunk_count + 1, 'I')
+            self.offgrid_start, offset = self.block(path, offset, chunk_count + 1, 'I')
+            # 每块的起点要从0开始不往回走，不然chunk切出来的范围不对
+            for starts in [self.grid_start, self.offgrid_start]:
+                if starts[0] != 0 or any(a > b for a, b in zip(starts, starts[1:])):
+                    raise ValueError(path + ' 的块索引不对')
+            self.spawner_x, offset = self.block(path, offset, spawner_count, 'd')
+            self.spawner_y, offset = self.block(path, offset, spawner_count, 'd')
+            self.spawner_code, offset = self.block(path, offset, spawner_count, 'H')
+            grid_count = self.grid_start[chunk_count]
+            offgrid_count = self.offgrid_start[chunk_count]
+            self.grid_x, offset = self.block(path, offset, grid_count, 'i')
+            self.grid_y, offset = self.block(path, offset, grid_count, 'i')
+            self.grid_code, offset = self.block(path, offset, grid_count, 'H')
+            self.offgrid_x, offset = self.block(path, offset, offgrid_count, 'd')
+            self.offgrid_y, offset = self.block(path, offset, offgrid_count, 'd')
+            self.offgrid_code, offset = self.block(path, offset, offgrid_count, 'H')
+        except ValueError:
+            self.close()
+            raise
+        # 块坐标 -> 第几块，文件里没有的块是空的
+        self.index = {loc: i for i, loc in enumerate(zip(chunk_x, chunk_y))}
+
+    def block(self, path, offset, count, typecode):
+        """
+        :return: (从offset开始count个typecode的数组, 下一块的位置)，文件不够长就抛ValueError
+        """
+        end = offset + count * array(typecode).itemsize
+        if end > self.size:
+            raise ValueError(path + ' 被截断了')
+        values = as_array(self.view[offset:end], typecode)
+        self.arrays.append(values)
+        return values, align(end)
+
+    def spawners(self):
+        """
+        :return: 出生点字典列表，pos是像素坐标
+        """
+        types = self.types
+        return [{'type': types[code >> 8], 'variant': code & 0xFF, 'pos': [x, y]}
+                for x, y, code in zip(self.spawner_x, self.spawner_y, self.spawner_code)]
+
+    def chunk(self, chunk_loc):
+        """
+        :return: (网格key列表, code列表, 装饰物字典列表)
+        """
+        i = self.index[chunk_loc]
+        start, end = self.grid_start[i], self.grid_start[i + 1]
+        keys = list(map(pack_loc, self.grid_x[start:end], self.grid_y[start:end]))
+        codes = list(self.grid_code[start:end])
+        start, end = self.offgrid_start[i], self.offgrid_start[i + 1]
+        types = self.types
+        offgrid = [{'type': types[code >> 8], 'variant': code & 0xFF, 'pos': [x, y]}
+                   for x, y, code in zip(self.offgrid_x[start:end], self.offgrid_y[start:end],
+                                         self.offgrid_code[start:end])]
+        return keys, codes, offgrid
+
+    def close(self):
+        # cast出来的数组也引用着mmap，要先释放
+        for values in self.arrays:
+            if isinstance(values, memoryview):
+                values.release()
+        self.arrays = []
+        self.view.release()
+        self.buffer.close()
+
+
+def write_world(path, map_data, chunk_tiles=WORLD_CHUNK):
+    """
+    把json格式的地图字典切成块写成流式关卡，spawners类型的tile单独存成出生点
+    """
+    types = []
+    type_ids = {}
+
+    def code(tile):
+        if tile['type'] not in type_ids:
+            type_ids[tile['type']] = len(types)
+            types.append(tile['type'])
+        return type_ids[tile['type']] << 8 | tile['variant']
+
+    tile_size = map_data['tile_size']
+    chunk_px = chunk_tiles * tile_size
+    # 块坐标 -> ([网格tile], [装饰物])
+    chunks = {}
+    spawners = []
+    for tile in map_data['tilemap'].values():
+        if tile['type'] == 'spawners':
+            spawners.append((tile['pos'][0] * tile_size, tile['pos'][1] * tile_size, code(tile)))
+            continue
+        loc = (tile['pos'][0] // chunk_tiles, tile['pos'][1] // chunk_tiles)
+        chunks.setdefault(loc, ([], []))[0].append(tile)
+    for tile in map_data['offgrid']:
+        if tile['type'] == 'spawners':
+            spawners.append((tile['pos'][0], tile['pos'][1], code(tile)))
+            continue
+        loc = (int(tile['pos'][0] // chunk_px), int(tile['pos'][1] // chunk_px))
+        chunks.setdefault(loc, ([], []))[1].append(tile)
+
+    locs = sorted(chunks)
+    grid_start = [0]
+    offgrid_start = [0]
+    for loc in locs:
+        grid_start.append(grid_start[-1] + len(chunks[loc][0]))
+        offgrid_start.append(offgrid_start[-1] + len(chunks[loc][1]))
+    grid = [tile for loc in locs for tile in chunks[loc][0]]
+    offgrid = [tile for loc in locs for tile in chunks[loc][1]]
+    blocks = [([loc[0] for loc in locs], 'i'), ([loc[1] for loc in locs], 'i'),
+              (grid_start, 'I'), (offgrid_start, 'I'),
+              ([spawner[0] for spawner in spawners], 'd'), ([spawner[1] for spawner in spawners], 'd'),
+              ([spawner[2] for spawner in spawners], 'H'),
+              ([tile['pos'][0] for tile in grid], 'i'), ([tile['pos'][1] for tile in grid], 'i'),
+              ([code(tile) for tile in grid], 'H'),
+              ([tile['pos'][0] for tile in offgrid], 'd'), ([tile['pos'][1] for tile in offgrid], 'd'),
+              ([code(tile) for tile in offgrid], 'H')]
+
+    chunks_out = [HEADER.pack(MAGIC, VERSION, tile_size, chunk_tiles, len(types), len(locs), len(spawners))]
+    for name in types:
+        encoded = name.encode('utf-8')
+        chunks_out.append(bytes([len(encoded)]) + encoded)
+    size = sum(len(chunk) for chunk in chunks_out)
+    for values, typecode in blocks:
+        chunks_out.append(b'\0' * (align(size) - size))
+        size = align(size)
+        data = to_bytes(values, typecode)
+        chunks_out.append(data)
+        size += len(data)
+    f = open(path, 'wb')
+    f.write(b''.join(chunks_out))
+    f.close()
+
+
+def read_world_data(path):
+    """
+    :return: 和json格式一样的地图字典，出生点放回装饰物里
+    """
+    world = WorldFile(path)
+    types = world.types
+    tilemap = {}
+    offgrid = []
+    for x, y, code in zip(world.grid_x, world.grid_y, world.grid_code):
+        tilemap[str(x) + ';' + str(y)] = {'type': types[code >> 8], 'variant': code & 0xFF, 'pos': [x, y]}
+    for x, y, code in zip(world.offgrid_x, world.offgrid_y, world.offgrid_code):
+        offgrid.append({'type': types[code >> 8], 'variant': code & 0xFF, 'pos': [x, y]})
+    offgrid.extend(world.spawners())
+    map_data = {'tilemap': tilemap, 'tile_size': world.tile_size, 'offgrid': offgrid}
+    world.close()
+    return map_data
+
+
+class WorldStream:
+    """
+    流式关卡读进TileMap的部分：每步按画面和玩家的位置读进附近的块，超过容量就丢最久没用的块。
+    每一块的碰撞体只在块里合并，丢块的时候整块拿掉；块和块挨着的地方碰撞、画图都和一整张地图一样
+    """
+
+    def __init__(self, tilemap, path, capacity=STREAM_CAPACITY, margin=STREAM_MARGIN, budget=STREAM_BUDGET):
+        """
+        :param tilemap: 空的TileMap，块读进来加到它里面
+        :param capacity: 内存里最多留多少块
+        :param margin: 画面外多远以内的块要读进来(像素)
+        :param budget: 每步最多读几块画面外的块
+        """
+        self.tilemap = tilemap
+        self.world = WorldFile(path)
+        self.capacity = capacity
+        self.margin = margin
+        self.budget = budget
+        self.chunk_px = self.world.chunk_tiles * self.world.tile_size
+        tilemap.reset(self.world.tile_size)
+        # 类型表按文件里的顺序登记，编号和文件里一样，code可以直接用
+        for name in self.world.types:
+            tilemap.type_id(name)
+        # 读进来的块 -> (网格key列表, 装饰物列表)，按最近一次用到的顺序排，最前面的最久没用
+        self.loaded = {}
+        # 块坐标 -> 还没生成的敌人出生点，块第一次读进来的时候拿走，之后再读进来不会再生成
+        self.spawners = {}
+        self.player_spawners = []
+        for spawner in self.world.spawners():
+            if spawner['variant'] == 0:
+                self.player_spawners.append(spawner)
+            else:
+                self.spawners.setdefault(self.chunk_of(spawner['pos']), []).append(spawner)
+        # 还没生成的敌人有多少个，都生成完并且打完了才算过关
+        self.unspawned = sum(len(spawners) for spawners in self.spawners.values())
+
+    def chunk_of(self, pos):
+        return int(pos[0] // self.chunk_px), int(pos[1] // self.chunk_px)
+
+    def chunks_in(self, rect):
+        size = self.chunk_px
+        return [(cx, cy) for cx in range(rect.left // size, (rect.right - 1) // size + 1)
+                for cy in range(rect.top // size, (rect.bottom - 1) // size + 1)]
+
+    def chunk_rect(self, chunk_loc):
+        return pygame.Rect(chunk_loc[0] * self.chunk_px, chunk_loc[1] * self.chunk_px, self.chunk_px, self.chunk_px)
+
+    def covers(self, rect):
+        """
+        :return: rect碰到的块是不是都已经读进来了(文件里没有的块是空的，也算)
+        """
+        index = self.world.index
+        for chunk_loc in self.chunks_in(rect):
+            if chunk_loc not in self.loaded and chunk_loc in index:
+                return False
+        return True
+
+    def covers_point(self, x, y):
+        chunk_loc = int(x // self.chunk_px), int(y // self.chunk_px)
+        return chunk_loc in self.loaded or chunk_loc not in self.world.index
+
+    def update(self, view, core, budget=None):
+        """
+        :param view: 画面在世界里的Rect
+        :param core: 必须马上读进来的范围(画面加玩家)
+        :param budget: 这一步最多读几块core以外的块，None用self.budget，-1不限
+        :return: (这一步新读进来的块, 丢掉的块)
+        """
+        if budget is None:
+            budget = self.budget
+        # 左上方块里比tile大的图片会画进core，也要马上读
+        extra = self.tilemap.overdraw * self.tilemap.tile_size
+        core = pygame.Rect(core.x - extra, core.y - extra, core.width + extra, core.height + extra)
+        area = view.inflate(self.margin * 2, self.margin * 2).union(core)
+        needed = [loc for loc in self.chunks_in(area) if loc in self.world.index]
+        required = set(self.chunks_in(core))
+        center = view.center
+        half = self.chunk_px // 2
+        # 先读core里的，再按离画面中心由近到远
+        missing = sorted((loc for loc in needed if loc not in self.loaded),
+                         key=lambda loc: (loc not in required, abs(loc[0] * self.chunk_px + half - center[0])
+                                          + abs(loc[1] * self.chunk_px + half - center[1])))
+        loaded = []
+        for loc in missing:
+            if loc not in required:
+                if budget == 0:
+                    break
+                budget -= 1
+            self.load(loc)
+            loaded.append(loc)
+        # 这一步用到的块挪到最后，丢的时候从最前面丢
+        for loc in needed:
+            if loc in self.loaded:
+                self.loaded[loc] = self.loaded.pop(loc)
+        evicted = []
+        needed = set(needed)
+        while len(self.loaded) > self.capacity:
+            loc = next(iter(self.loaded))
+            # 最久没用的也是这一步要用的，说明剩下的都要用
+            if loc in needed:
+                break
+            self.evict(loc)
+            evicted.append(loc)
+        return loaded, evicted
+
+    def load(self, chunk_loc):
+        keys, codes, offgrid = self.world.chunk(chunk_loc)
+        self.tilemap.add_region(keys, codes, offgrid, self.chunk_rect(chunk_loc))
+        self.loaded[chunk_loc] = (keys, offgrid)
+
+    def evict(self, chunk_loc):
+        keys, offgrid = self.loaded.pop(chunk_loc)
+        self.tilemap.remove_region(keys, offgrid, self.chunk_rect(chunk_loc))
+
+    def offgrid_of(self, chunk_loc):
+        return self.loaded[chunk_loc][1]
+
+    def take_spawners(self, chunk_loc):
+        """
+        :return: 这一块里还没生成的敌人出生点，拿走以后就没有了
+        """
+        spawners = self.spawners.pop(chunk_loc, [])
+        self.unspawned -= len(spawners)
+        return spawners
+
+    def close(self):
+        self.world.close()
+
+
+def check(path, chunk_tiles=WORLD_CHUNK):
+    """
+    json -> world -> json，比较内容是否一样(装饰物的顺序会变，不比顺序)
+    :return: 一样返回True
+    """
+    f = open(path, 'r')
+    map_data = json.load(f)
+    f.close()
+    fd, tmp = tempfile.mkstemp(suffix=WORLD_EXT)
+    os.close(fd)
+    try:
+        write_world(tmp, map_data, chunk_tiles)
+        size = os.path.getsize(tmp)
+        back = read_world_data(tmp)
+    finally:
+        os.remove(tmp)
+
+    def order(tile):
+        return tile['type'], tile['variant'], tile['pos'][0], tile['pos'][1]
+
+    same = (back['tilemap'] == map_data['tilemap'] and back['tile_size'] == map_data['tile_size']
+            and sorted(back['offgrid'], key=order) == sorted(map_data['offgrid'], key=order))
+    print('%s %s: %d -> %d bytes' % ('ok  ' if same else 'FAIL', path, os.path.getsize(path), size))
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('to-world')
+    p.add_argument('src')
+    p.add_argument('dst', nargs='?')
+    p.add_argument('--chunk', type=int, default=WORLD_CHUNK, help='每块边长多少格')
+    p = sub.add_parser('check')
+    p.add_argument('paths', nargs='+')
+    p.add_argument('--chunk', type=int, default=WORLD_CHUNK, help='每块边长多少格')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        results = [check(path, args.chunk) for path in args.paths]
+        sys.exit(0 if all(results) else 1)
+    f = open(args.src, 'r')
+    map_data = json.load(f)
+    f.close()
+    write_world(args.dst or args.src.rsplit('.', 1)[0] + WORLD_EXT, map_data, args.chunk)
+
+
+if __name__ == '__main__':
+    main()
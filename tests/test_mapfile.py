@@ -0,0 +1,124 @@
+"""
+二进制地图(.map)来回转换：json -> map -> json 内容要一样，TileMap存成.map再读回来网格和装饰物也要一样
+在项目根目录运行：python -m pytest tests
+"""
+import glob
+import json
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import mapfile
+from scripts.tilemap import TileMap, pack_loc
+
+
+def shipped_maps():
+    return sorted(glob.glob('assets/maps/*.json'))
+
+
+def load_json(path):
+    f = open(path, 'r')
+    map_data = json.load(f)
+    f.close()
+    return map_data
+
+
+def synthetic_map():
+    """
+    负坐标、很大的坐标、variant到255、只在装饰物里出现的类型、负的小数位置
+    """
+    tiles = [('stone', 0, 0, 1), ('grass', -1, -1, 0), ('stone', -70000, 3, 8), ('grass', 5, -123456, 255),
+             ('spawners', 2147483647, -2147483648, 1), ('stone', 1, 0, 2)]
+    return {
+        'tilemap': {str(x) + ';' + str(y): {'type': tile_type, 'variant': variant, 'pos': [x, y]}
+                    for tile_type, x, y, variant in tiles},
+        'tile_size': 16,
+        'offgrid': [{'type': 'large_decor', 'variant': 2, 'pos': [-35.5, -0.25]},
+                    {'type': 'decor', 'variant': 0, 'pos': [1e9, -1e9]},
+                    {'type': 'spawners', 'variant': 0, 'pos': [0.1, 0.2]},
+                    {'type': 'large_decor', 'variant': 2, 'pos': [-35.5, -0.25]}],
+    }
+
+
+def round_trip(map_data, tmp_path):
+    path = str(tmp_path / ('map' + mapfile.MAP_EXT))
+    mapfile.write_map_data(path, map_data)
+    assert mapfile.is_map_file(path)
+    return mapfile.read_map_data(path)
+
+
+@pytest.mark.parametrize('path', shipped_maps())
+def test_shipped_map_round_trip(path, tmp_path):
+    map_data = load_json(path)
+    result = round_trip(map_data, tmp_path)
+    assert result == map_data
+    # 转回来的json和原来的json文本解析出来一样(key的顺序也一样)
+    assert json.loads(json.dumps(result)) == map_data
+    assert list(result['tilemap']) == list(map_data['tilemap'])
+
+
+def test_synthetic_map_round_trip(tmp_path):
+    map_data = synthetic_map()
+    result = round_trip(map_data, tmp_path)
+    assert result == map_data
+    # 装饰物的顺序决定画的顺序，要保持
+    assert result['offgrid'] == map_data['offgrid']
+
+
+def test_empty_map_round_trip(tmp_path):
+    map_data = {'tilemap': {}, 'tile_size': 8, 'offgrid': []}
+    assert round_trip(map_data, tmp_path) == map_data
+
+
+@pytest.mark.parametrize('map_data', [synthetic_map()] + [load_json(path) for path in shipped_maps()])
+def test_tilemap_save_load(map_data, tmp_path):
+    game = SimpleNamespace(assets={})
+    original = TileMap(game)
+    original.load_data(map_data)
+    path = str(tmp_path / ('saved' + mapfile.MAP_EXT))
+    original.save(path)
+
+    loaded = TileMap(game)
+    loaded.load(path)
+    assert loaded.tile_size == original.tile_size
+    decoded = {key: (original.tile_types[code >> 8], code & 0xFF) for key, code in original.grid.items()}
+    assert {key: (loaded.tile_types[code >> 8], code & 0xFF) for key, code in loaded.grid.items()} == decoded
+    assert loaded.offgrid_tiles == original.offgrid_tiles
+    for tile in map_data['tilemap'].values():
+        assert pack_loc(tile['pos'][0], tile['pos'][1]) in loaded.grid
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'map.json'
+    path.write_text('{}')
+    assert not mapfile.is_map_file(str(path))
+    with pytest.raises(ValueError):
+        mapfile.MapFile(str(path))
+
+
+def test_rejects_other_versions(tmp_path):
+    path = str(tmp_path / ('map' + mapfile.MAP_EXT))
+    mapfile.write_map_data(path, synthetic_map())
+    f = open(path, 'r+b')
+    f.seek(len(mapfile.MAGIC))
+    f.write(struct.pack('<H', mapfile.VERSION + 1))
+    f.close()
+    with pytest.raises(ValueError):
+        mapfile.MapFile(path)
+
+
+def test_rejects_truncated_body(tmp_path):
+    path = str(tmp_path / ('map' + mapfile.MAP_EXT))
+    mapfile.write_map_data(path, synthetic_map())
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    cut_path = str(tmp_path / ('cut' + mapfile.MAP_EXT))
+    # 头完整，类型表或者后面任何一块少了都要报错，不能少读几个tile
+    for size in range(mapfile.HEADER.size, len(data)):
+        f = open(cut_path, 'wb')
+        f.write(data[:size])
+        f.close()
+        with pytest.raises(ValueError):
+            mapfile.MapFile(cut_path)
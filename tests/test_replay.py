@@ -0,0 +1,50 @@
+"""
+录像(.rep)：存下来再读回来种子、设置、哈希、输入要一样，不是录像的文件和被截断的文件要报错
+在项目根目录运行：python -m pytest tests
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import replay
+
+
+def write_replay(tmp_path, steps=150):
+    path = str(tmp_path / 'session.rep')
+    game = SimpleNamespace(state_hash=lambda: '0123456789abcdef' * 4)
+    recorder = replay.Recorder(path, 2 ** 64 - 1, {'outline': 'screen'}, check_interval=10)
+    for i in range(steps):
+        recorder.record(game, (i % 2 == 0, i % 3 == 0, i % 5 == 0, i % 7 == 0))
+    recorder.save()
+    return path, recorder
+
+
+def test_round_trip(tmp_path):
+    path, recorder = write_replay(tmp_path)
+    loaded = replay.Replay(path)
+    assert loaded.seed == recorder.seed
+    assert loaded.settings == recorder.settings
+    assert loaded.steps == len(recorder.inputs)
+    assert loaded.checks == recorder.checks
+    assert [loaded.input(i) for i in range(loaded.steps)] == [replay.decode_input(code) for code in recorder.inputs]
+
+
+@pytest.mark.parametrize('data', [b'', b'{}', b'NJRP', b'NJMP' + bytes(64)])
+def test_rejects_other_files(data, tmp_path):
+    path = tmp_path / 'other.rep'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        replay.Replay(str(path))
+
+
+def test_rejects_truncated_file(tmp_path):
+    path, _ = write_replay(tmp_path)
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    cut_path = tmp_path / 'cut.rep'
+    # 头、设置、哈希、压缩的输入，哪里少了都要报错，不能少放几步
+    for size in range(len(data)):
+        cut_path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            replay.Replay(str(cut_path))
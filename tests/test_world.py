@@ -0,0 +1,64 @@
+"""
+流式关卡(.world)：json -> world -> json 内容要一样(装饰物的顺序按块排，不比顺序)，不是.world的文件、被截断的文件、块索引坏了的文件都要报错
+在项目根目录运行：python -m pytest tests
+"""
+import glob
+import json
+import struct
+
+import pytest
+
+from scripts import world
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob('assets/maps/*.json')))
+@pytest.mark.parametrize('chunk_tiles', [4, world.WORLD_CHUNK])
+def test_shipped_map_round_trip(path, chunk_tiles):
+    assert world.check(path, chunk_tiles)
+
+
+@pytest.mark.parametrize('data', [b'', b'{}', b'NJWD', b'NJMP' + bytes(64)])
+def test_rejects_other_files(data, tmp_path):
+    path = tmp_path / ('map' + world.WORLD_EXT)
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        world.WorldFile(str(path))
+
+
+def write_shipped(tmp_path):
+    f = open('assets/maps/0.json', 'r')
+    map_data = json.load(f)
+    f.close()
+    path = str(tmp_path / ('map' + world.WORLD_EXT))
+    world.write_world(path, map_data, 4)
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    return path, data
+
+
+def test_rejects_truncated_body(tmp_path):
+    path, data = write_shipped(tmp_path)
+    cut_path = tmp_path / ('cut' + world.WORLD_EXT)
+    # 头完整，块索引或者后面任何一块少了都要报错，不能少读几个装饰物
+    for size in list(range(world.HEADER.size, len(data), 17)) + [len(data) - 1]:
+        cut_path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            world.WorldFile(str(cut_path))
+
+
+def test_rejects_bad_chunk_index(tmp_path):
+    path, data = write_shipped(tmp_path)
+    type_count, chunk_count = world.HEADER.unpack_from(data)[4:6]
+    offset = world.HEADER.size
+    for _ in range(type_count):
+        offset += 1 + data[offset]
+    # 跳过块的x、y两块，到每块网格tile的起点，让第二块的起点比最后一块还大
+    offset = world.align(world.align(world.align(offset) + 4 * chunk_count) + 4 * chunk_count)
+    starts = struct.unpack_from('<%dI' % (chunk_count + 1), data, offset)
+    bad = bytearray(data)
+    struct.pack_into('<I', bad, offset + 4, starts[-1] + 1)
+    bad_path = tmp_path / ('bad' + world.WORLD_EXT)
+    bad_path.write_bytes(bytes(bad))
+    with pytest.raises(ValueError):
+        world.WorldFile(str(bad_path))